@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def migrar_contadores(apps, schema_editor):
+    """
+    Traslada los contadores de gasto al registro diario.
+
+    El gasto diario se asigna a hoy y el resto del gasto mensual al primer
+    día del mes, de modo que los totales del día y del mes se conservan.
+    """
+    Cliente = apps.get_model('clientes', 'Cliente')
+    GastoDiarioCliente = apps.get_model('clientes', 'GastoDiarioCliente')
+
+    hoy = timezone.localdate()
+    inicio_mes = hoy.replace(day=1)
+    registros = []
+    clientes = Cliente.objects.filter(
+        models.Q(gasto_diario__gt=0) | models.Q(gasto_mensual__gt=0)
+    ).values_list('id', 'gasto_diario', 'gasto_mensual')
+    for cliente_id, diario, mensual in clientes.iterator():
+        resto = mensual - diario
+        if resto > 0 and inicio_mes != hoy:
+            registros.append(GastoDiarioCliente(cliente_id=cliente_id, fecha=inicio_mes, monto=resto))
+        else:
+            diario = max(diario, mensual)
+        if diario > 0:
+            registros.append(GastoDiarioCliente(cliente_id=cliente_id, fecha=hoy, monto=diario))
+    GastoDiarioCliente.objects.bulk_create(registros, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0010_cliente_is_contribuyente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GastoDiarioCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('monto', models.DecimalField(decimal_places=10, default=0, max_digits=30)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gastos_diarios', to='clientes.cliente')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cliente', 'fecha'), name='uq_gasto_cliente_fecha')],
+            },
+        ),
+        migrations.RunPython(migrar_contadores, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='cliente',
+            name='gasto_diario',
+        ),
+        migrations.RemoveField(
+            model_name='cliente',
+            name='gasto_mensual',
+        ),
+    ]
@@ -48,8 +48,6 @@ class Cliente(models.Model):
     is_active = models.BooleanField(default=True)
     ruc = models.CharField(max_length=20, unique=True, null=True, blank=True)
     stripe_customer_id = models.CharField(max_length=100, null=True)
-    gasto_diario = models.DecimalField(max_digits=30, decimal_places=10, default=0.00, help_text="Gasto diario acumulado en divisa base")
-    gasto_mensual = models.DecimalField(max_digits=30, decimal_places=10, default=0.00, help_text="Gasto mensualacumulado en divisa base")
 
     def __str__(self):
         return self.nombre
@@ -62,3 +60,28 @@ class Cliente(models.Model):
     #     blank=True
     # )
 
+
+class GastoDiarioCliente(models.Model):
+    """
+    Gasto acumulado de un cliente en un día, en divisa base.
+
+    Cada operación pagada suma su monto al registro (cliente, fecha). El
+    gasto mensual es la suma de los registros del mes en curso, por lo que
+    no es necesario reiniciar contadores al cambiar de día o de mes.
+
+    Atributos:
+        cliente (ForeignKey): Cliente al que corresponde el gasto.
+        fecha (date): Día del gasto (zona horaria local).
+        monto (Decimal): Gasto acumulado del día en divisa base.
+    """
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name="gastos_diarios")
+    fecha = models.DateField()
+    monto = models.DecimalField(max_digits=30, decimal_places=10, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cliente", "fecha"], name="uq_gasto_cliente_fecha"),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente} - {self.fecha}: {self.monto}"
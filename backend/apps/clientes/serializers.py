@@ -1,5 +1,10 @@
+import logging
+
 from rest_framework import serializers
 from .models import Cliente, CategoriaCliente
+from .service import obtener_gastos
+
+logger = logging.getLogger(__name__)
 # from django.contrib.auth import get_user_model
 
 # User = get_user_model()
@@ -35,6 +40,11 @@ class ClienteSerializer(serializers.ModelSerializer):
     Campos:
         nombreCategoria: Campo calculado de solo lectura que obtiene
                         el nombre de la categoría asociada al cliente.
+        gasto_diario, gasto_mensual: Gasto del día y del mes en divisa
+                        base, de solo lectura. Se toman de la anotación
+                        ``anotar_gastos`` del queryset; sin ella se
+                        consultan por cliente, y en un listado eso se
+                        registra como error (consulta N+1).
                         
     Características:
         - Incluye todos los campos del modelo Cliente
@@ -42,10 +52,33 @@ class ClienteSerializer(serializers.ModelSerializer):
         - Campo nombreCategoria es de solo lectura para evitar inconsistencias
     """
     categoria= CategoriaClienteSerializer(source='id_categoria', read_only=True)
+    gasto_diario = serializers.SerializerMethodField()
+    gasto_mensual = serializers.SerializerMethodField()
+
     class Meta:
         model = Cliente
         fields = "__all__"
 
+    def _gasto(self, obj, periodo):
+        valor = getattr(obj, f"gasto_{periodo}", None)
+        if valor is None:
+            # En listados el queryset debe anotarlos (o prefetchar el cliente
+            # anotado); se avisa una vez por respuesta y se consulta por fila
+            root = self.root
+            if isinstance(root, serializers.ListSerializer) and not getattr(root, "_sin_gastos", False):
+                root._sin_gastos = True
+                logger.error(
+                    f"{type(root.child).__name__} serializa clientes sin anotar_gastos; "
+                    f"los gastos se consultan por fila")
+            valor = obtener_gastos(obj.pk)[periodo]
+        return f"{valor:.10f}"
+
+    def get_gasto_diario(self, obj):
+        return self._gasto(obj, "diario")
+
+    def get_gasto_mensual(self, obj):
+        return self._gasto(obj, "mensual")
+
 class ClientePaginatedResponseSerializer(serializers.Serializer):
     count    = serializers.IntegerField()
     next     = serializers.CharField(allow_null=True)
@@ -0,0 +1,214 @@
+"""
+Service layer para el registro y la consulta del gasto de los clientes.
+
+El gasto se guarda por cliente y por día en ``GastoDiarioCliente``. El gasto
+diario es el registro del día y el mensual la suma de los registros del mes,
+ambos leídos con una única consulta sobre el índice (cliente, fecha).
+
+Los pagos reservan su monto con ``reservar_gasto``, que verifica los límites
+de ``LimiteConfig`` y suma el gasto en la misma sentencia.
+"""
+import hashlib
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, OuterRef, Prefetch, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.divisas.models import LimiteConfig
+
+from .models import Cliente, GastoDiarioCliente
+
+CERO = Decimal("0")
+
+LIMITE_DIARIO = "diario"
+LIMITE_MENSUAL = "mensual"
+
+MENSAJES_LIMITE = {
+    LIMITE_DIARIO: "Límite diario alcanzado para este cliente.",
+    LIMITE_MENSUAL: "Límite mensual alcanzado para este cliente.",
+}
+
+
+def _rango_mes(fecha=None):
+    """
+    Retorna (fecha, primer día del mes, primer día del mes siguiente) para la
+    fecha dada o el día actual.
+    """
+    fecha = fecha or timezone.localdate()
+    inicio_mes = fecha.replace(day=1)
+    fin_mes = (inicio_mes + timedelta(days=32)).replace(day=1)
+    return fecha, inicio_mes, fin_mes
+
+
+def registrar_gasto(cliente_id, monto, fecha=None) -> None:
+    """
+    Suma ``monto`` al gasto del cliente en el día indicado (por defecto, hoy).
+
+    Se resuelve con un único ``INSERT ... ON CONFLICT DO UPDATE``, por lo que
+    registros concurrentes del mismo cliente no pierden actualizaciones.
+    """
+    fecha = fecha or timezone.localdate()
+    tabla = GastoDiarioCliente._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {tabla} (cliente_id, fecha, monto)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (cliente_id, fecha)
+            DO UPDATE SET monto = {tabla}.monto + EXCLUDED.monto
+            """,
+            [cliente_id, fecha, monto],
+        )
+
+
+def liberar_gasto(cliente_id, monto, fecha) -> None:
+    """Descuenta ``monto`` del gasto reservado por el cliente en ``fecha``."""
+    GastoDiarioCliente.objects.filter(cliente_id=cliente_id, fecha=fecha).update(
+        monto=F("monto") - monto)
+
+
+def limite_excedido(gastos, monto, limite_cfg=None):
+    """
+    Indica qué límite se excedería al sumar ``monto`` a los gastos dados.
+
+    Args:
+        gastos: dict retornado por ``obtener_gastos``.
+        monto: Monto a sumar, en divisa base.
+        limite_cfg: LimiteConfig a usar; por defecto, la configuración vigente.
+
+    Returns:
+        str | None: LIMITE_MENSUAL, LIMITE_DIARIO o None si ninguno se excede.
+            El límite mensual se verifica primero.
+    """
+    limite_cfg = limite_cfg or LimiteConfig.get_solo()
+    if limite_cfg.limite_mensual is not None and gastos["mensual"] + monto > limite_cfg.limite_mensual:
+        return LIMITE_MENSUAL
+    if limite_cfg.limite_diario is not None and gastos["diario"] + monto > limite_cfg.limite_diario:
+        return LIMITE_DIARIO
+    return None
+
+
+def _clave_bloqueo(cliente_id) -> int:
+    """Clave bigint del advisory lock de gasto de un cliente."""
+    texto = f"gasto:{cliente_id}".encode()
+    return int.from_bytes(hashlib.blake2b(texto, digest_size=8).digest(), "big", signed=True)
+
+
+@transaction.atomic
+def reservar_gasto(cliente_id, monto, fecha=None):
+    """
+    Suma ``monto`` al gasto del cliente sólo si no excede sus límites.
+
+    La verificación y la suma se hacen en un único ``INSERT ... ON CONFLICT
+    DO UPDATE ... WHERE ... RETURNING``: si la sentencia no retorna fila, el
+    gasto no se registró. Un advisory lock por cliente, tomado dentro de
+    esta transacción corta, ordena las reservas concurrentes del mismo
+    cliente para que la suma del mes se lea después de las anteriores; no
+    se mantiene ningún lock mientras se procesa el pago.
+
+    Args:
+        cliente_id: ID del cliente.
+        monto: Monto a reservar, en divisa base.
+        fecha: Día del gasto; por defecto, hoy. Debe usarse la misma fecha
+            para ``liberar_gasto`` si el pago se rechaza.
+
+    Returns:
+        str | None: None si se reservó; LIMITE_MENSUAL o LIMITE_DIARIO con
+            el límite que se excedería en caso contrario.
+    """
+    fecha, inicio_mes, fin_mes = _rango_mes(fecha)
+    limite_cfg = LimiteConfig.get_solo()
+    tabla = GastoDiarioCliente._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [_clave_bloqueo(cliente_id)])
+        cursor.execute(
+            f"""
+            WITH mes AS (
+                SELECT COALESCE(SUM(monto), 0) AS total
+                FROM {tabla}
+                WHERE cliente_id = %(cliente)s
+                  AND fecha >= %(inicio_mes)s AND fecha < %(fin_mes)s
+            )
+            INSERT INTO {tabla} (cliente_id, fecha, monto)
+            SELECT %(cliente)s, %(fecha)s, %(monto)s
+            FROM mes
+            WHERE (%(limite_mensual)s::numeric IS NULL
+                   OR mes.total + %(monto)s <= %(limite_mensual)s)
+              AND (%(limite_diario)s::numeric IS NULL
+                   OR %(monto)s <= %(limite_diario)s)
+            ON CONFLICT (cliente_id, fecha)
+            DO UPDATE SET monto = {tabla}.monto + EXCLUDED.monto
+            WHERE %(limite_diario)s::numeric IS NULL
+               OR {tabla}.monto + EXCLUDED.monto <= %(limite_diario)s
+            RETURNING monto
+            """,
+            {
+                "cliente": cliente_id,
+                "fecha": fecha,
+                "inicio_mes": inicio_mes,
+                "fin_mes": fin_mes,
+                "monto": monto,
+                "limite_diario": limite_cfg.limite_diario,
+                "limite_mensual": limite_cfg.limite_mensual,
+            },
+        )
+        if cursor.fetchone() is not None:
+            return None
+
+    # Rechazada: sólo aquí se lee el gasto para informar qué límite se excede
+    return limite_excedido(obtener_gastos(cliente_id, fecha), monto, limite_cfg) or LIMITE_DIARIO
+
+
+def obtener_gastos(cliente_id, fecha=None) -> dict:
+    """
+    Gasto diario y mensual del cliente en divisa base.
+
+    Returns:
+        dict: {'diario': Decimal, 'mensual': Decimal}
+    """
+    fecha, inicio_mes, fin_mes = _rango_mes(fecha)
+    totales = GastoDiarioCliente.objects.filter(
+        cliente_id=cliente_id, fecha__gte=inicio_mes, fecha__lt=fin_mes
+    ).aggregate(
+        diario=Sum("monto", filter=Q(fecha=fecha)),
+        mensual=Sum("monto"),
+    )
+    return {
+        "diario": totales["diario"] or CERO,
+        "mensual": totales["mensual"] or CERO,
+    }
+
+
+def anotar_gastos(queryset, fecha=None):
+    """Anota ``gasto_diario`` y ``gasto_mensual`` en un queryset de clientes."""
+    fecha, inicio_mes, fin_mes = _rango_mes(fecha)
+
+    def total(**filtros):
+        suma = (
+            GastoDiarioCliente.objects.filter(cliente=OuterRef("pk"), **filtros)
+            .values("cliente")
+            .annotate(total=Sum("monto"))
+            .values("total")
+        )
+        return Coalesce(
+            Subquery(suma),
+            Value(CERO),
+            output_field=DecimalField(max_digits=30, decimal_places=10),
+        )
+
+    return queryset.annotate(
+        gasto_diario=total(fecha=fecha),
+        gasto_mensual=total(fecha__gte=inicio_mes, fecha__lt=fin_mes),
+    )
+
+
+def prefetch_cliente_con_gastos(lookup="cliente", fecha=None):
+    """
+    Prefetch del cliente de cada fila con ``anotar_gastos``, para serializar
+    ``ClienteSerializer`` anidado en un listado con una sola consulta extra.
+    """
+    return Prefetch(lookup, queryset=anotar_gastos(Cliente.objects.all(), fecha))
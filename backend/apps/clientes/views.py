@@ -6,6 +6,7 @@ from apps.operaciones.models import Transaccion
 from apps.operaciones.serializers import TransaccionDetalleSerializer
 from django.contrib.auth import get_user_model
 from .serializers import ClienteSerializer, CategoriaClienteSerializer, CategoriaCliente, ClientePaginatedResponseSerializer
+from .service import anotar_gastos, prefetch_cliente_con_gastos
 from apps.usuarios.serializers import UserSerializer
 from rest_framework.permissions import DjangoModelPermissions
 from rest_framework.pagination import PageNumberPagination
@@ -27,6 +28,9 @@ class ClienteViewSet(viewsets.ModelViewSet):
     search_fields = ["nombre", "cedula", "ruc"]
     pagination_class = ClientePagination
 
+    def get_queryset(self):
+        return anotar_gastos(super().get_queryset())
+
     @swagger_auto_schema(
     operation_summary="Listar clientes",
     operation_description="""Obtiene un listado paginado de todos los clientes registrados en el sistema.
@@ -106,10 +110,11 @@ class ClienteViewSet(viewsets.ModelViewSet):
         estado = request.query_params.get('estado', None)
 
         # Filtramos las transacciones por cliente y estado si se proporciona
+        transacciones = Transaccion.objects.filter(cliente=_cliente).select_related(
+            'id_user', 'divisa_origen', 'divisa_destino', 'metodo_financiero', 'tauser'
+        ).prefetch_related(prefetch_cliente_con_gastos())
         if estado:
-            transacciones = Transaccion.objects.filter(cliente=_cliente, estado=estado)
-        else:
-            transacciones = Transaccion.objects.filter(cliente=_cliente)    
+            transacciones = transacciones.filter(estado=estado)
         serializer = TransaccionDetalleSerializer(transacciones, many=True)
         return Response(serializer.data)
 
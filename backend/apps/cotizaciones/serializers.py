@@ -2,13 +2,17 @@
 Módulo de serializers para la gestión de tasas.
 
 Define el serializer principal para el modelo Tasa, incluyendo
-validaciones personalizadas, cálculo dinámico de tasas de compra/venta,
-y manejo automático del historial asociado.
+validaciones personalizadas, cálculo dinámico de tasas de compra/venta
+y manejo automático del historial asociado, además del serializer para
+actualizar varias tasas en lote.
 """
+from collections import defaultdict
 from decimal import Decimal
 from rest_framework import serializers
+from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils import timezone
-from apps.cotizaciones.models import Tasa
+from apps.cotizaciones.models import Tasa, HistorialTasa
 from apps.cotizaciones.service import TasaService
 from apps.notificaciones.notification_service import NotificationService
 from apps.notificaciones.models import (
@@ -18,9 +22,10 @@ from apps.notificaciones.models import (
 )
 from apps.divisas.models import Divisa
 from apps.operaciones.models import Transaccion
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 import logging
 
+logger = logging.getLogger(__name__)
 notification_service = NotificationService()
 
 
@@ -178,7 +183,6 @@ class TasaSerializer(serializers.ModelSerializer):
                     old_tasa_compra=old_tasa_compra
                 )
             except Exception as e:
-                logger = logging.getLogger(__name__)
                 logger.error(
                     f"Error enviando notificación de tasa: {e}", exc_info=True)
 
@@ -186,108 +190,299 @@ class TasaSerializer(serializers.ModelSerializer):
 
     def _notificar_cambio_tasa(self, divisa, new_tasa_venta, old_tasa_venta, new_tasa_compra, old_tasa_compra):
         """
-        Envía notificaciones de cambio de tasa filtrando por preferencias.
+        Envía las notificaciones del cambio de tasa de una divisa.
 
-    Lógica:
-    1. Obtiene usuarios con notificaciones de tasa activas y divisa suscrita
-    2. Obtiene clientes con notificaciones de tasa activas y divisa suscrita
-    3. Identifica usuarios con transacciones pendientes sobre la divisa
-    4. Genera notificaciones visuales (toast) para los usuarios detectados
-    5. Elimina correos duplicados y envía notificaciones por email
+        Ver ``notificar_cambios_tasa``.
         """
+        notificar_cambios_tasa([{
+            "divisa": divisa,
+            "tasa_compra_anterior": old_tasa_compra,
+            "tasa_compra_nueva": new_tasa_compra,
+            "tasa_venta_anterior": old_tasa_venta,
+            "tasa_venta_nueva": new_tasa_venta,
+        }])
 
-        recipient_list = set()  # Usar set para evitar duplicados
-        usuarios_eventos = {}
-        usuarios_cache = {}
-
-        def registrar_usuario(usuario, tipo_evento):
-            if not usuario or not usuario.is_active:
-                return
-            evento_actual = usuarios_eventos.get(usuario.id)
-            if evento_actual == NotificacionCambioTasa.TipoEvento.TRANSACCION_PENDIENTE:
-                return
-            if evento_actual is None or tipo_evento == NotificacionCambioTasa.TipoEvento.TRANSACCION_PENDIENTE:
-                usuarios_eventos[usuario.id] = tipo_evento
-                usuarios_cache[usuario.id] = usuario
-
-        # ===================================================
-        # 1. NOTIFICACIONES DE TASA DE USUARIO
-        # ===================================================
-        preferencias_usuario = NotificacionTasaUsuario.objects.filter(
-            is_active=True,
-            divisas_suscritas=divisa,
-            usuario__is_active=True,
-            usuario__email_verified=True
-        ).select_related('usuario')
-
-        for pref in preferencias_usuario:
-            if pref.usuario.email:
-                recipient_list.add(pref.usuario.email)
-            registrar_usuario(pref.usuario, NotificacionCambioTasa.TipoEvento.SUSCRIPCION)
-
-        # ===================================================
-        # 2. NOTIFICACIONES DE TASA DE CLIENTE
-        # ===================================================
-        preferencias_cliente = NotificacionTasaCliente.objects.filter(
-            is_active=True,
-            divisas_suscritas=divisa,
-            cliente__is_active=True
-        ).select_related('cliente').prefetch_related('cliente__usuarios')
-
-        for pref in preferencias_cliente:
-            # Obtener todos los correos de clientes
-            if pref.cliente.correo:
-                recipient_list.add(pref.cliente.correo)
-            for usuario in pref.cliente.usuarios.filter(is_active=True, email_verified=True):
-                registrar_usuario(usuario, NotificacionCambioTasa.TipoEvento.SUSCRIPCION)
-
-        # ===================================================
-        # 3. TRANSACCIONES PENDIENTES
-        # ===================================================
-        transacciones_pendientes = Transaccion.objects.filter(
-            Q(divisa_origen=divisa) | Q(divisa_destino=divisa),
-            estado='pendiente'
-        ).select_related('id_user')
-
-        for transaccion in transacciones_pendientes:
-            usuario_transaccion = transaccion.id_user
-            registrar_usuario(
-                usuario_transaccion,
-                NotificacionCambioTasa.TipoEvento.TRANSACCION_PENDIENTE
-            )
 
-            if (
-                usuario_transaccion
-                and usuario_transaccion.is_active
-                and getattr(usuario_transaccion, "email_verified", False)
-                and usuario_transaccion.email
-            ):
-                recipient_list.add(usuario_transaccion.email)
-
-        # ===================================================
-        # 4. CREAR NOTIFICACIONES TOAST
-        # ===================================================
-        tiene_toasts = bool(usuarios_eventos)
-        if tiene_toasts:
-            base_codigo = Divisa.objects.filter(es_base=True).values_list('codigo', flat=True).first() or 'BASE'
-
-            def _format_decimal(value):
-                return f"{value:.2f}".rstrip('0').rstrip('.') if value is not None else "0"
-
-            compra_nueva_str = _format_decimal(new_tasa_compra)
-            compra_anterior_str = _format_decimal(old_tasa_compra)
-            venta_nueva_str = _format_decimal(new_tasa_venta)
-            venta_anterior_str = _format_decimal(old_tasa_venta)
-            par_divisa = f"{divisa.codigo}/{base_codigo}"
-
-            notificaciones_bulk = []
-
-            for usuario_id, tipo_evento in usuarios_eventos.items():
-                usuario = usuarios_cache.get(usuario_id)
-                if not usuario:
+class TasaLoteSerializer(serializers.Serializer):
+    """
+    Serializer para actualizar varias tasas en una sola operación.
+
+    Body:
+        {"tasas": [{"id": 1, "precioBase": "7400"}, {"id": 2, "comisionBaseVenta": "90"}]}
+
+    Cada elemento se valida con ``TasaSerializer`` en modo parcial. Todas las
+    tasas se guardan en una misma transacción con un único ``bulk_update``, el
+    historial se inserta con un único ``bulk_create`` y las notificaciones se
+    envían al final en una sola pasada (``notificar_cambios_tasa``).
+    """
+    MAXIMO_TASAS = 200
+    CAMPOS_ACTUALIZABLES = ("precioBase", "comisionBaseCompra", "comisionBaseVenta", "activo")
+
+    tasas = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=MAXIMO_TASAS)
+
+    def validate_tasas(self, items):
+        """
+        Valida los ids del lote y los datos de cada tasa.
+
+        Returns:
+            list: Pares (Tasa, datos validados) en el orden recibido.
+        """
+        ids = []
+        for item in items:
+            try:
+                ids.append(int(item.get("id")))
+            except (TypeError, ValueError):
+                raise serializers.ValidationError(
+                    "Cada tasa del lote debe incluir su 'id'.")
+
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                "El lote contiene tasas repetidas.")
+
+        instancias = Tasa.objects.select_related("divisa").in_bulk(ids)
+        faltantes = [tasa_id for tasa_id in ids if tasa_id not in instancias]
+        if faltantes:
+            raise serializers.ValidationError(
+                f"No existen las tasas: {', '.join(map(str, faltantes))}.")
+
+        validados, errores = [], {}
+        for tasa_id, item in zip(ids, items):
+            datos = {campo: valor for campo, valor in item.items() if campo != "id"}
+            serializer = TasaSerializer(instancias[tasa_id], data=datos, partial=True)
+            if serializer.is_valid():
+                validados.append((instancias[tasa_id], serializer.validated_data))
+            else:
+                errores[str(tasa_id)] = serializer.errors
+
+        if errores:
+            raise serializers.ValidationError(errores)
+        return validados
+
+    def create(self, validated_data):
+        """
+        Aplica el lote y registra el historial de las tasas cuyo precio o
+        comisiones cambiaron.
+
+        Las filas se bloquean en orden de id para que dos lotes concurrentes
+        no se bloqueen mutuamente. ``fechaActualizacion`` se asigna a mano
+        porque ``bulk_update`` no aplica ``auto_now``.
+
+        Returns:
+            list[Tasa]: Tasas actualizadas, ordenadas por id.
+        """
+        datos_por_id = {tasa.pk: datos for tasa, datos in validated_data["tasas"]}
+        ahora = timezone.now()
+        historiales, cambios = [], []
+
+        with transaction.atomic():
+            tasas = list(
+                Tasa.objects.select_for_update(of=("self",))
+                .select_related("divisa")
+                .filter(pk__in=datos_por_id)
+                .order_by("pk")
+            )
+            for tasa in tasas:
+                datos = datos_por_id[tasa.pk]
+                base_anterior = (tasa.precioBase, tasa.comisionBaseCompra, tasa.comisionBaseVenta)
+                compra_anterior = TasaService.calcular_tasa_compra(tasa)
+                venta_anterior = TasaService.calcular_tasa_venta(tasa)
+
+                for campo in self.CAMPOS_ACTUALIZABLES:
+                    if campo in datos:
+                        setattr(tasa, campo, datos[campo])
+                tasa.fechaActualizacion = ahora
+
+                if (tasa.precioBase, tasa.comisionBaseCompra, tasa.comisionBaseVenta) == base_anterior:
                     continue
 
-                if tipo_evento == NotificacionCambioTasa.TipoEvento.TRANSACCION_PENDIENTE:
+                compra_nueva = TasaService.calcular_tasa_compra(tasa)
+                venta_nueva = TasaService.calcular_tasa_venta(tasa)
+                historiales.append(HistorialTasa(
+                    tasa=tasa, tasaCompra=compra_nueva, tasaVenta=venta_nueva))
+                cambios.append({
+                    "divisa": tasa.divisa,
+                    "tasa_compra_anterior": compra_anterior,
+                    "tasa_compra_nueva": compra_nueva,
+                    "tasa_venta_anterior": venta_anterior,
+                    "tasa_venta_nueva": venta_nueva,
+                })
+
+            Tasa.objects.bulk_update(
+                tasas, [*self.CAMPOS_ACTUALIZABLES, "fechaActualizacion"])
+            HistorialTasa.objects.bulk_create(historiales)
+
+        if cambios:
+            try:
+                notificar_cambios_tasa(cambios)
+            except Exception as e:
+                logger.error(
+                    f"Error enviando notificación de tasas: {e}", exc_info=True)
+
+        return tasas
+
+
+def _formatear_decimal(valor):
+    return f"{valor:.2f}".rstrip('0').rstrip('.') if valor is not None else "0"
+
+
+def _contexto_email_cambio(cambio):
+    """Datos de un cambio de tasa con el formato de la plantilla de email."""
+    old_tasa_compra = cambio["tasa_compra_anterior"]
+    new_tasa_compra = cambio["tasa_compra_nueva"]
+    old_tasa_venta = cambio["tasa_venta_anterior"]
+    new_tasa_venta = cambio["tasa_venta_nueva"]
+
+    variacion_compra = new_tasa_compra - old_tasa_compra
+    variacion_venta = new_tasa_venta - old_tasa_venta
+    porcentaje_variacion_compra = (
+        (variacion_compra / old_tasa_compra) * 100
+        if old_tasa_compra > 0 else 0
+    )
+    porcentaje_variacion_venta = (
+        (variacion_venta / old_tasa_venta) * 100
+        if old_tasa_venta > 0 else 0
+    )
+
+    return {
+        'divisa': cambio["divisa"].nombre,
+        'codigo_divisa': cambio["divisa"].codigo,
+        'tasa_anterior_compra': f"{old_tasa_compra:.2f}",
+        'tasa_nueva_compra': f"{new_tasa_compra:.2f}",
+        'variacion_compra': f"{variacion_compra:+.2f}",
+        'porcentaje_variacion_compra': f"{porcentaje_variacion_compra:+.2f}",
+        'tasa_anterior_venta': f"{old_tasa_venta:.2f}",
+        'tasa_nueva_venta': f"{new_tasa_venta:.2f}",
+        'variacion_venta': f"{variacion_venta:+.2f}",
+        'porcentaje_variacion_venta': f"{porcentaje_variacion_venta:+.2f}",
+    }
+
+
+def notificar_cambios_tasa(cambios):
+    """
+    Envía las notificaciones de uno o varios cambios de tasa en una sola pasada.
+
+    Args:
+        cambios (list[dict]): Un elemento por divisa con las claves ``divisa``,
+            ``tasa_compra_anterior``, ``tasa_compra_nueva``,
+            ``tasa_venta_anterior`` y ``tasa_venta_nueva``.
+
+    Lógica:
+    1. Obtiene usuarios con notificaciones de tasa activas y alguna de las divisas suscrita
+    2. Obtiene clientes con notificaciones de tasa activas y alguna de las divisas suscrita
+    3. Identifica usuarios con transacciones pendientes sobre las divisas
+    4. Genera una notificación visual (toast) por usuario y divisa afectada
+    5. Agrupa los correos según las divisas que afectan a cada destinatario y
+       envía un único email por grupo, combinando todas sus divisas
+    """
+    cambios_por_divisa = {cambio["divisa"].id: cambio for cambio in cambios}
+    divisa_ids = list(cambios_por_divisa)
+    pendiente = NotificacionCambioTasa.TipoEvento.TRANSACCION_PENDIENTE
+    suscripcion = NotificacionCambioTasa.TipoEvento.SUSCRIPCION
+
+    destinatarios = defaultdict(set)  # email -> ids de divisas que le afectan
+    usuarios_eventos = defaultdict(dict)  # usuario_id -> {divisa_id: tipo_evento}
+    usuarios_cache = {}
+
+    def registrar_usuario(usuario, divisa_id, tipo_evento):
+        if not usuario or not usuario.is_active:
+            return
+        eventos = usuarios_eventos[usuario.id]
+        if eventos.get(divisa_id) == pendiente:
+            return
+        eventos[divisa_id] = tipo_evento
+        usuarios_cache[usuario.id] = usuario
+
+    def divisas_cambiadas():
+        return Prefetch(
+            "divisas_suscritas",
+            queryset=Divisa.objects.filter(id__in=divisa_ids).only("id"),
+            to_attr="divisas_cambiadas",
+        )
+
+    # ===================================================
+    # 1. NOTIFICACIONES DE TASA DE USUARIO
+    # ===================================================
+    preferencias_usuario = NotificacionTasaUsuario.objects.filter(
+        is_active=True,
+        divisas_suscritas__in=divisa_ids,
+        usuario__is_active=True,
+        usuario__email_verified=True
+    ).distinct().select_related('usuario').prefetch_related(divisas_cambiadas())
+
+    for pref in preferencias_usuario:
+        for divisa in pref.divisas_cambiadas:
+            if pref.usuario.email:
+                destinatarios[pref.usuario.email].add(divisa.id)
+            registrar_usuario(pref.usuario, divisa.id, suscripcion)
+
+    # ===================================================
+    # 2. NOTIFICACIONES DE TASA DE CLIENTE
+    # ===================================================
+    preferencias_cliente = NotificacionTasaCliente.objects.filter(
+        is_active=True,
+        divisas_suscritas__in=divisa_ids,
+        cliente__is_active=True
+    ).distinct().select_related('cliente').prefetch_related(
+        divisas_cambiadas(),
+        Prefetch(
+            'cliente__usuarios',
+            queryset=get_user_model().objects.filter(is_active=True, email_verified=True),
+            to_attr='usuarios_notificables',
+        ),
+    )
+
+    for pref in preferencias_cliente:
+        for divisa in pref.divisas_cambiadas:
+            if pref.cliente.correo:
+                destinatarios[pref.cliente.correo].add(divisa.id)
+            for usuario in pref.cliente.usuarios_notificables:
+                registrar_usuario(usuario, divisa.id, suscripcion)
+
+    # ===================================================
+    # 3. TRANSACCIONES PENDIENTES
+    # ===================================================
+    transacciones_pendientes = Transaccion.objects.filter(
+        Q(divisa_origen_id__in=divisa_ids) | Q(divisa_destino_id__in=divisa_ids),
+        estado='pendiente'
+    ).select_related('id_user').order_by()
+
+    for transaccion in transacciones_pendientes:
+        usuario_transaccion = transaccion.id_user
+        recibe_email = bool(
+            usuario_transaccion
+            and usuario_transaccion.is_active
+            and getattr(usuario_transaccion, "email_verified", False)
+            and usuario_transaccion.email
+        )
+        for divisa_id in {transaccion.divisa_origen_id, transaccion.divisa_destino_id}:
+            if divisa_id not in cambios_por_divisa:
+                continue
+            registrar_usuario(usuario_transaccion, divisa_id, pendiente)
+            if recibe_email:
+                destinatarios[usuario_transaccion.email].add(divisa_id)
+
+    # ===================================================
+    # 4. CREAR NOTIFICACIONES TOAST
+    # ===================================================
+    if usuarios_cache:
+        base_codigo = Divisa.objects.filter(es_base=True).values_list('codigo', flat=True).first() or 'BASE'
+        notificaciones_bulk = []
+
+        for usuario_id, eventos in usuarios_eventos.items():
+            usuario = usuarios_cache.get(usuario_id)
+            if not usuario:
+                continue
+
+            for divisa_id, tipo_evento in eventos.items():
+                cambio = cambios_por_divisa[divisa_id]
+                compra_nueva_str = _formatear_decimal(cambio["tasa_compra_nueva"])
+                compra_anterior_str = _formatear_decimal(cambio["tasa_compra_anterior"])
+                venta_nueva_str = _formatear_decimal(cambio["tasa_venta_nueva"])
+                venta_anterior_str = _formatear_decimal(cambio["tasa_venta_anterior"])
+                par_divisa = f"{cambio['divisa'].codigo}/{base_codigo}"
+
+                if tipo_evento == pendiente:
                     titulo = f"Transacción pendiente actualizada - {par_divisa}"
                     descripcion = (
                         "Tasa actualizada. "
@@ -304,75 +499,59 @@ class TasaSerializer(serializers.ModelSerializer):
                 notificaciones_bulk.append(
                     NotificacionCambioTasa(
                         usuario=usuario,
-                        divisa=divisa,
+                        divisa=cambio["divisa"],
                         tipo_evento=tipo_evento,
                         titulo=titulo,
                         descripcion=descripcion,
-                        tasa_compra_anterior=old_tasa_compra,
-                        tasa_compra_nueva=new_tasa_compra,
-                        tasa_venta_anterior=old_tasa_venta,
-                        tasa_venta_nueva=new_tasa_venta,
+                        tasa_compra_anterior=cambio["tasa_compra_anterior"],
+                        tasa_compra_nueva=cambio["tasa_compra_nueva"],
+                        tasa_venta_anterior=cambio["tasa_venta_anterior"],
+                        tasa_venta_nueva=cambio["tasa_venta_nueva"],
                     )
                 )
 
-            if notificaciones_bulk:
-                NotificacionCambioTasa.objects.bulk_create(notificaciones_bulk)
-
-        # ===================================================
-        # 5. PREPARAR Y ENVIAR NOTIFICACIÓN POR EMAIL
-        # ===================================================
-        if not recipient_list and not tiene_toasts:
-            return
-
-        recipient_list = list(recipient_list)
-
-        if not recipient_list:
-            return
-
-        variacion_compra = new_tasa_compra - old_tasa_compra
-        variacion_venta = new_tasa_venta - old_tasa_venta
-        porcentaje_variacion_compra = (
-            (variacion_compra / old_tasa_compra) * 100
-            if old_tasa_compra > 0 else 0
-        )
-        porcentaje_variacion_venta = (
-            (variacion_venta / old_tasa_venta) * 100
-            if old_tasa_venta > 0 else 0
-        )
-
-        context = {
-            'divisa': divisa.nombre,
-            'codigo_divisa': divisa.codigo,
-            'tasa_anterior_compra': f"{old_tasa_compra:.2f}",
-            'tasa_nueva_compra': f"{new_tasa_compra:.2f}",
-            'variacion_compra': f"{variacion_compra:+.2f}",
-            'porcentaje_variacion_compra': f"{porcentaje_variacion_compra:+.2f}",
-            'tasa_anterior_venta': f"{old_tasa_venta:.2f}",
-            'tasa_nueva_venta': f"{new_tasa_venta:.2f}",
-            'variacion_venta': f"{variacion_venta:+.2f}",
-            'porcentaje_variacion_venta': f"{porcentaje_variacion_venta:+.2f}",
-            'fecha_actualizacion': timezone.now().strftime("%d/%m/%Y %H:%M"),
-        }
+        if notificaciones_bulk:
+            NotificacionCambioTasa.objects.bulk_create(notificaciones_bulk)
+
+    # ===================================================
+    # 5. PREPARAR Y ENVIAR NOTIFICACIÓN POR EMAIL
+    # ===================================================
+    # Un email por conjunto de divisas: quien está afectado por varias recibe
+    # un único correo con todas ellas.
+    grupos = defaultdict(list)
+    for email, ids in destinatarios.items():
+        grupos[frozenset(ids)].append(email)
+
+    fecha_actualizacion = timezone.now().strftime("%d/%m/%Y %H:%M")
+    for ids, recipient_list in grupos.items():
+        detalles = [
+            _contexto_email_cambio(cambios_por_divisa[divisa_id])
+            for divisa_id in divisa_ids if divisa_id in ids
+        ]
+        codigos = ", ".join(detalle['codigo_divisa'] for detalle in detalles)
+
+        if len(detalles) == 1:
+            subject = f"Cambio en la tasa de {codigos}"
+            template_name = "emails/cambio_tasa.html"
+            context = {**detalles[0], 'fecha_actualizacion': fecha_actualizacion}
+        else:
+            subject = f"Cambios en las tasas de {codigos}"
+            template_name = "emails/cambio_tasas.html"
+            context = {'cambios': detalles, 'fecha_actualizacion': fecha_actualizacion}
 
         try:
             notification_service.send_notification(
                 channel="email",
-                subject=f"Cambio en la tasa de {divisa.codigo}",
-                template_name="emails/cambio_tasa.html",
+                subject=subject,
+                template_name=template_name,
                 context=context,
-                recipient_list=recipient_list,
+                recipient_list=sorted(recipient_list),
             )
-
-            import logging
-            logger = logging.getLogger(__name__)
             logger.info(
                 f"Notificaciones de cambio de tasa enviadas a "
-                f"{len(recipient_list)} destinatarios para {divisa.codigo}"
+                f"{len(recipient_list)} destinatarios para {codigos}"
             )
-
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
             logger.error(
                 f"Error enviando notificación de cambio de tasa: {e}",
                 exc_info=True
@@ -1,8 +1,10 @@
 from decimal import Decimal
 from apps.cotizaciones.models import Tasa, HistorialTasa
 from decimal import Decimal, ROUND_HALF_UP
+from django.db.models import Case, DecimalField, F, Q, When
+from django.db.models.functions import Coalesce
 from apps.divisas.models import Divisa
-from apps.operaciones.models import MetodoFinanciero
+from apps.operaciones.models import MetodoFinanciero, Transaccion
 from apps.clientes.models import Cliente
 
 
@@ -27,13 +29,29 @@ class TasaService:
         """
         Calcula la tasa de compra final
         """
-        precio_base = tasa.precioBase
-        comision_base = tasa.comisionBaseCompra
+        return TasaService.aplicar_tasa_compra(
+            tasa.precioBase, tasa.comisionBaseCompra, com_metodo,
+            cliente.id_categoria.descuento if cliente else None)
 
+    @staticmethod
+    def calcular_tasa_venta(tasa: Tasa, com_metodo: Decimal = None, cliente: Cliente = None) -> Decimal:
+        """
+        Calcula la tasa de venta final
+        """
+        return TasaService.aplicar_tasa_venta(
+            tasa.precioBase, tasa.comisionBaseVenta, com_metodo,
+            cliente.id_categoria.descuento if cliente else None)
+
+    @staticmethod
+    def aplicar_tasa_compra(precio_base: Decimal, comision_base: Decimal,
+                            com_metodo: Decimal = None, descuento: Decimal = None) -> Decimal:
+        """
+        Tasa de compra a partir de valores sueltos, sin instancias de Tasa ni Cliente.
+        """
         tasa_compra = precio_base - comision_base
 
-        if cliente:
-            categ_descuento = cliente.id_categoria.descuento / Decimal('100')
+        if descuento is not None:
+            categ_descuento = descuento / Decimal('100')
             tasa_compra = tasa_compra + tasa_compra * categ_descuento
 
         if com_metodo:
@@ -43,17 +61,15 @@ class TasaService:
         return tasa_compra.to_integral_value(rounding=ROUND_HALF_UP)
 
     @staticmethod
-    def calcular_tasa_venta(tasa: Tasa, com_metodo: Decimal = None, cliente: Cliente = None) -> Decimal:
+    def aplicar_tasa_venta(precio_base: Decimal, comision_base: Decimal,
+                           com_metodo: Decimal = None, descuento: Decimal = None) -> Decimal:
         """
-        Calcula la tasa de venta final
+        Tasa de venta a partir de valores sueltos, sin instancias de Tasa ni Cliente.
         """
-        precio_base = tasa.precioBase
-        comision_base = tasa.comisionBaseVenta
-
         tasa_venta = precio_base + comision_base
 
-        if cliente:
-            categ_descuento = cliente.id_categoria.descuento / Decimal('100')
+        if descuento is not None:
+            categ_descuento = descuento / Decimal('100')
             tasa_venta = tasa_venta - tasa_venta * categ_descuento
 
         if com_metodo:
@@ -61,3 +77,110 @@ class TasaService:
             tasa_venta = tasa_venta + tasa_venta * com_metodo
 
         return tasa_venta.to_integral_value(rounding=ROUND_HALF_UP)
+
+    @staticmethod
+    def previsualizar_reprecio(tasa: Tasa, precio_base: Decimal = None,
+                               comision_compra: Decimal = None,
+                               comision_venta: Decimal = None) -> dict:
+        """
+        Simula el efecto de nuevos valores de la tasa sobre las transacciones
+        pendientes de su divisa, sin guardar nada.
+
+        Las comisiones del método (o de su catálogo) y el descuento de la
+        categoría de cada transacción se leen en una sola consulta, y las tasas
+        se recalculan con la misma aritmética que ``calcular_operacion``.
+
+        Una transacción se mueve si su nueva tasa difiere de ``tasa_aplicada``,
+        igual que en la reconfirmación. Los deltas están en divisa base y desde
+        la perspectiva del cliente: positivo si recibe más o paga menos.
+
+        Args:
+            tasa: Tasa actual.
+            precio_base, comision_compra, comision_venta: Valores propuestos;
+                los omitidos conservan el valor actual.
+        """
+        precio_base = tasa.precioBase if precio_base is None else precio_base
+        comision_compra = tasa.comisionBaseCompra if comision_compra is None else comision_compra
+        comision_venta = tasa.comisionBaseVenta if comision_venta is None else comision_venta
+
+        pendientes = afectadas = 0
+        delta_total = Decimal('0')
+        peor = None
+        for fila in _proyectar_pendientes(tasa.divisa_id).iterator(chunk_size=2000):
+            pendientes += 1
+            if fila['operacion'] == 'compra':
+                # La casa compra: el cliente recibe monto_origen * tc en divisa base
+                tc = TasaService.aplicar_tasa_compra(
+                    precio_base, comision_compra, fila['comision_compra'], fila['descuento'])
+                nuevo = (fila['monto_origen'] * tc).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+                delta = nuevo - fila['monto_destino']
+            else:
+                # La casa vende: el cliente paga monto_destino * tc en divisa base
+                tc = TasaService.aplicar_tasa_venta(
+                    precio_base, comision_venta, fila['comision_venta'], fila['descuento'])
+                nuevo = (fila['monto_destino'] * tc).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+                delta = fila['monto_origen'] - nuevo
+
+            if tc == fila['tasa_aplicada']:
+                continue
+            afectadas += 1
+            delta_total += delta
+            if peor is None or delta < peor['delta']:
+                peor = {'transaccion_id': fila['id'], 'delta': delta}
+
+        return {
+            'tasa': tasa.id,
+            'divisa': tasa.divisa.codigo,
+            'tasa_compra_actual': TasaService.calcular_tasa_compra(tasa),
+            'tasa_compra_nueva': TasaService.aplicar_tasa_compra(precio_base, comision_compra),
+            'tasa_venta_actual': TasaService.calcular_tasa_venta(tasa),
+            'tasa_venta_nueva': TasaService.aplicar_tasa_venta(precio_base, comision_venta),
+            'pendientes': pendientes,
+            'afectadas': afectadas,
+            'delta_total_base': delta_total,
+            'peor_delta_cliente': peor,
+        }
+
+
+CENTAVO = Decimal('0.01')
+
+# Catálogos cuya comisión personalizada reemplaza a la del método financiero
+CATALOGOS_COMISION = (
+    'metodo_financiero_detalle__cuenta_bancaria__banco',
+    'metodo_financiero_detalle__billetera_digital__plataforma',
+    'metodo_financiero_detalle__tarjeta__marca',
+)
+
+
+def _comision_efectiva(tipo, campo_metodo):
+    """
+    Expresión SQL de la comisión que ``MetodoFinancieroDetalle.get_comision``
+    resolvería para cada transacción (``tipo`` es 'compra' o 'venta').
+    """
+    return Coalesce(
+        *(
+            Case(When(**{f'{catalogo}__comision_personalizada_{tipo}': True},
+                      then=F(f'{catalogo}__comision_{tipo}')))
+            for catalogo in CATALOGOS_COMISION
+        ),
+        F(f'metodo_financiero_detalle__metodo_financiero__{campo_metodo}'),
+        F(f'metodo_financiero__{campo_metodo}'),
+        output_field=DecimalField(max_digits=5, decimal_places=2),
+    )
+
+
+def _proyectar_pendientes(divisa_id):
+    """Montos, comisiones y descuento de las transacciones pendientes de la divisa."""
+    return Transaccion.objects.filter(
+        Q(divisa_origen_id=divisa_id) | Q(divisa_destino_id=divisa_id),
+        estado='pendiente',
+    ).order_by().values(
+        'id',
+        'operacion',
+        'monto_origen',
+        'monto_destino',
+        'tasa_aplicada',
+        descuento=F('cliente__id_categoria__descuento'),
+        comision_compra=_comision_efectiva('compra', 'comision_pago_porcentaje'),
+        comision_venta=_comision_efectiva('venta', 'comision_cobro_porcentaje'),
+    )
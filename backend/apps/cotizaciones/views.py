@@ -8,9 +8,9 @@ historial.
 from datetime import datetime, time
 
 from django.utils import timezone
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions, filters, status
 from apps.cotizaciones.models import Tasa, HistorialTasa
-from apps.cotizaciones.serializers import TasaSerializer
+from apps.cotizaciones.serializers import TasaLoteSerializer, TasaSerializer
 
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -32,6 +32,10 @@ class TasaViewSet(viewsets.ModelViewSet):
     Endpoints personalizados:
         - public_rates: Retorna las tasas activas en formato simplificado
           para su uso en vistas públicas (ej. landing page).
+        - previsualizar_cambio: Simula el efecto de nuevos valores de la tasa
+          sobre las transacciones pendientes de la divisa.
+        - actualizar_lote: Actualiza varias tasas en una sola transacción y
+          notifica todos los cambios en una sola pasada.
     """
     queryset = Tasa.objects.select_related("divisa").all()
     serializer_class = TasaSerializer
@@ -226,3 +230,91 @@ class TasaViewSet(viewsets.ModelViewSet):
                 "points": puntos,
             }
         )
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="previsualizar-cambio",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def previsualizar_cambio(self, request, pk=None):
+        """
+        Simula el cambio de la tasa sobre las transacciones pendientes de su
+        divisa, sin guardarlo.
+
+        Body (todos opcionales, los omitidos conservan el valor actual):
+            {"precioBase": "7400", "comisionBaseCompra": "100", "comisionBaseVenta": "150"}
+
+        Response:
+            {
+                "tasa": 1,
+                "divisa": "USD",
+                "tasa_compra_actual": "7200", "tasa_compra_nueva": "7300",
+                "tasa_venta_actual": "7450", "tasa_venta_nueva": "7550",
+                "pendientes": 12,
+                "afectadas": 10,
+                "delta_total_base": "-150000.00",
+                "peor_delta_cliente": {"transaccion_id": 34, "delta": "-50000.00"}
+            }
+
+        Los deltas están en divisa base y desde la perspectiva del cliente:
+        negativo si recibiría menos o pagaría más.
+        """
+        if not request.user.has_perm("cotizaciones.change_tasa"):
+            return Response(
+                {"detail": "No tienes permiso para modificar cotizaciones."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        tasa = self.get_object()
+        serializer = self.get_serializer(tasa, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+
+        resultado = TasaService.previsualizar_reprecio(
+            tasa,
+            precio_base=datos.get("precioBase"),
+            comision_compra=datos.get("comisionBaseCompra"),
+            comision_venta=datos.get("comisionBaseVenta"),
+        )
+        for campo in ("tasa_compra_actual", "tasa_compra_nueva", "tasa_venta_actual",
+                      "tasa_venta_nueva", "delta_total_base"):
+            resultado[campo] = str(resultado[campo])
+        if resultado["peor_delta_cliente"]:
+            resultado["peor_delta_cliente"]["delta"] = str(resultado["peor_delta_cliente"]["delta"])
+        return Response(resultado)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="actualizar-lote",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def actualizar_lote(self, request):
+        """
+        Actualiza varias tasas a la vez.
+
+        Body:
+            {
+                "tasas": [
+                    {"id": 1, "precioBase": "7400", "comisionBaseVenta": "150"},
+                    {"id": 2, "precioBase": "8100"}
+                ]
+            }
+
+        Se guardan todas o ninguna. Cada suscriptor recibe un único email con
+        todas las divisas que le afectan.
+
+        Response:
+            Lista de las tasas actualizadas, con el formato de TasaSerializer.
+        """
+        if not request.user.has_perm("cotizaciones.change_tasa"):
+            return Response(
+                {"detail": "No tienes permiso para modificar cotizaciones."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        serializer = TasaLoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tasas = serializer.save()
+        return Response(TasaSerializer(tasas, many=True).data)
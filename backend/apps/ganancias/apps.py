@@ -5,3 +5,6 @@ class GananciasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.ganancias'
     verbose_name = 'Ganancias'
+
+    def ready(self):
+        import apps.ganancias.signals
@@ -0,0 +1,127 @@
+"""
+Cache de resultados de los reportes de ganancias.
+
+Cada resultado se guarda bajo una clave formada por el nombre del reporte,
+el hash de los filtros normalizados y una marca de agua de los datos. La
+marca es una versión explícita que se incrementa al confirmarse cada cambio
+de ganancias o del resumen diario (``ReporteCache.invalidar``), de modo que
+las entradas viejas dejan de usarse sin necesidad de borrarlas.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+# Secuencia de PostgreSQL con la versión de los datos de ganancias
+SECUENCIA_VERSION = 'ganancias_reportes_version'
+
+
+class ReporteCache:
+    """
+    Cache de reportes con contadores de aciertos y fallos.
+
+    Un acierto no ejecuta las consultas del reporte: sólo se lee la marca de
+    agua. La versión vive en la base de datos y no en la cache, así la cache
+    es correcta aunque cada proceso tenga su propia instancia (LocMemCache).
+    """
+
+    PREFIJO = 'ganancias:reportes'
+    TIMEOUT = 300
+    CLAVE_ACIERTOS = f'{PREFIJO}:aciertos'
+    CLAVE_FALLOS = f'{PREFIJO}:fallos'
+
+    @staticmethod
+    def watermark() -> str:
+        """
+        Versión actual de los datos de ganancias.
+
+        Crece en uno con cada ``nextval`` de la secuencia; leer
+        ``last_value`` no la modifica.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT last_value + is_called::int FROM {SECUENCIA_VERSION}")
+            version, = cursor.fetchone()
+        return str(version)
+
+    @classmethod
+    def invalidar(cls) -> None:
+        """
+        Incrementa la versión al confirmarse la transacción en curso (o en
+        el acto, fuera de una transacción).
+
+        Incrementarla antes del commit permitiría guardar bajo la versión
+        nueva un resultado calculado con los datos viejos.
+        """
+        transaction.on_commit(cls._incrementar_version)
+
+    @staticmethod
+    def _incrementar_version() -> None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s)", [SECUENCIA_VERSION])
+
+    @staticmethod
+    def hash_parametros(parametros) -> str:
+        """SHA-256 de los parámetros normalizados."""
+        contenido = json.dumps(parametros, sort_keys=True, default=str)
+        return hashlib.sha256(contenido.encode()).hexdigest()
+
+    @classmethod
+    def clave(cls, nombre, parametros, watermark=None) -> str:
+        """Clave de cache de un reporte para los parámetros dados."""
+        return '{}:{}:{}:{}'.format(
+            cls.PREFIJO,
+            nombre,
+            cls.hash_parametros(parametros),
+            watermark if watermark is not None else cls.watermark(),
+        )
+
+    @classmethod
+    def obtener(cls, nombre, parametros, calcular):
+        """
+        Retorna el resultado cacheado del reporte o lo calcula y lo guarda.
+
+        La marca de agua se lee antes de calcular, de modo que un resultado
+        nunca se guarda bajo una marca más nueva que los datos que leyó.
+
+        Args:
+            nombre: Nombre del reporte.
+            parametros: dict de filtros normalizados.
+            calcular: Función sin argumentos que calcula el reporte.
+        """
+        clave = cls.clave(nombre, parametros)
+        resultado = cache.get(clave)
+        if resultado is not None:
+            cls._incrementar(cls.CLAVE_ACIERTOS)
+            return resultado
+
+        cls._incrementar(cls.CLAVE_FALLOS)
+        resultado = calcular()
+        cache.set(clave, resultado, cls.TIMEOUT)
+        return resultado
+
+    @classmethod
+    def estadisticas(cls) -> dict:
+        """Aciertos, fallos y tasa de aciertos de la cache."""
+        aciertos = cache.get(cls.CLAVE_ACIERTOS, 0)
+        fallos = cache.get(cls.CLAVE_FALLOS, 0)
+        total = aciertos + fallos
+        return {
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'tasa_aciertos': round(aciertos / total, 4) if total else None,
+        }
+
+    @classmethod
+    def reiniciar_estadisticas(cls) -> None:
+        cache.delete_many([cls.CLAVE_ACIERTOS, cls.CLAVE_FALLOS])
+
+    @staticmethod
+    def _incrementar(clave) -> None:
+        cache.add(clave, 0, timeout=None)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            # La clave expiró o fue desalojada entre add e incr
+            cache.set(clave, 1, timeout=None)
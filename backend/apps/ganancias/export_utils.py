@@ -1,13 +1,17 @@
 """
-Utilidades para exportación de reportes de ganancias a Excel y PDF.
+Utilidades para exportación de reportes de ganancias a Excel, PDF y CSV.
 
 Genera archivos descargables con los datos de los diferentes reportes.
 """
-from io import BytesIO
+import csv
+import tempfile
+import zlib
 from decimal import Decimal
-from datetime import datetime
+from datetime import date, datetime
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.utils import get_column_letter
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, landscape
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -31,6 +35,13 @@ def format_number(value, decimals=2):
     return format_str.format(Decimal(value)).replace(",", ".")
 
 
+def format_fecha(value):
+    """Formatea una fecha como YYYY-MM-DD (acepta date o str)."""
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
 def format_filtros(filtros):
     """
     Formatea los filtros aplicados para mostrar en los reportes.
@@ -73,79 +84,115 @@ def format_filtros(filtros):
 
 # ==================== EXCEL EXPORTS ====================
 
-def export_comparativa_to_excel(data):
+# Filas leídas por bloque del cursor al exportar listados
+EXPORT_CHUNK_SIZE = 2000
+
+EXCEL_HEADER_FILL = PatternFill(start_color="2F5496", end_color="2F5496", fill_type="solid")
+EXCEL_HEADER_FONT = Font(bold=True, color="FFFFFF", size=12)
+EXCEL_TITLE_FONT = Font(bold=True, size=14)
+
+
+def _celda(ws, value, font=None, fill=None, alignment=None):
+    """Crea una celda con estilo para una hoja en modo write-only."""
+    cell = WriteOnlyCell(ws, value=value)
+    if font:
+        cell.font = font
+    if fill:
+        cell.fill = fill
+    if alignment:
+        cell.alignment = alignment
+    return cell
+
+
+def _crear_hoja_excel(nombre_hoja, titulo, headers, anchos):
     """
-    Exporta el reporte de comparativa de operaciones a Excel.
-    
+    Crea un libro en modo write-only con título, fecha de generación y headers.
+
+    En este modo openpyxl escribe cada fila a disco al agregarla, por lo que
+    la memoria no crece con la cantidad de filas del reporte.
+
     Args:
-        data: dict con estructura de ComparativaOperaciones
-        
+        nombre_hoja: Título de la hoja
+        titulo: Título del reporte (fila 1)
+        headers: Lista de encabezados de columna (fila 4)
+        anchos: Lista de anchos de columna
+
     Returns:
-        BytesIO con el archivo Excel
+        tuple (Workbook, WriteOnlyWorksheet)
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Comparativa Operaciones"
-    
-    # Estilos
-    header_fill = PatternFill(start_color="2F5496", end_color="2F5496", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    title_font = Font(bold=True, size=14)
-    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(nombre_hoja)
+
+    # El ancho y las celdas combinadas deben definirse antes de escribir filas
+    for indice, ancho in enumerate(anchos, start=1):
+        ws.column_dimensions[get_column_letter(indice)].width = ancho
+    ultima_columna = get_column_letter(len(headers))
+    ws.merged_cells.add(f'A1:{ultima_columna}1')
+    ws.merged_cells.add(f'A2:{ultima_columna}2')
+
+    centrado = Alignment(horizontal='center')
+
     # Título
-    ws.merge_cells('A1:E1')
-    ws['A1'] = "REPORTE DE COMPARATIVA DE OPERACIONES"
-    ws['A1'].font = title_font
-    ws['A1'].alignment = Alignment(horizontal='center')
-    
+    ws.append([_celda(ws, titulo, font=EXCEL_TITLE_FONT, alignment=centrado)])
+
     # Fecha de generación
-    ws.merge_cells('A2:E2')
-    ws['A2'] = f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-    ws['A2'].alignment = Alignment(horizontal='center')
-    
+    ws.append([_celda(
+        ws, f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", alignment=centrado)])
+
     # Espacio
     ws.append([])
-    
+
     # Headers
-    headers = ['Tipo Operación', 'Total Ganancia', 'Cantidad Operaciones', 'Ganancia Promedio', 'Porcentaje del Total']
-    ws.append(headers)
-    
-    for cell in ws[4]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Datos de compra
-    compra = data.get('compra', {})
-    ws.append([
-        'COMPRA',
-        format_currency(compra.get('total_ganancia', 0)),
-        compra.get('cantidad_operaciones', 0),
-        format_currency(compra.get('ganancia_promedio', 0)),
-        f"{compra.get('porcentaje_total', 0):.2f}%"
-    ])
-    
-    # Datos de venta
-    venta = data.get('venta', {})
     ws.append([
-        'VENTA',
-        format_currency(venta.get('total_ganancia', 0)),
-        venta.get('cantidad_operaciones', 0),
-        format_currency(venta.get('ganancia_promedio', 0)),
-        f"{venta.get('porcentaje_total', 0):.2f}%"
+        _celda(ws, header, font=EXCEL_HEADER_FONT, fill=EXCEL_HEADER_FILL, alignment=centrado)
+        for header in headers
     ])
+
+    return wb, ws
+
+
+def _guardar_excel(wb):
+    """
+    Guarda el libro en un archivo temporal listo para transmitirse.
+
+    Returns:
+        Archivo temporal posicionado al inicio
+    """
+    archivo = tempfile.TemporaryFile()
+    wb.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+def export_comparativa_to_excel(data):
+    """
+    Exporta el reporte de comparativa de operaciones a Excel.
     
-    # Ajustar ancho de columnas
-    ws.column_dimensions['A'].width = 20
-    ws.column_dimensions['B'].width = 20
-    ws.column_dimensions['C'].width = 25
-    ws.column_dimensions['D'].width = 20
-    ws.column_dimensions['E'].width = 22
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    return buffer
+    Args:
+        data: dict con estructura de ComparativaOperaciones
+        
+    Returns:
+        Archivo temporal con el Excel
+    """
+    wb, ws = _crear_hoja_excel(
+        "Comparativa Operaciones",
+        "REPORTE DE COMPARATIVA DE OPERACIONES",
+        ['Tipo Operación', 'Total Ganancia', 'Cantidad Operaciones',
+         'Ganancia Promedio', 'Porcentaje del Total'],
+        [20, 20, 25, 20, 22],
+    )
+
+    for etiqueta, operacion in (('COMPRA', 'compra'), ('VENTA', 'venta')):
+        item = data.get(operacion, {})
+        ws.append([
+            etiqueta,
+            format_currency(item.get('total_ganancia', 0)),
+            item.get('cantidad_operaciones', 0),
+            format_currency(item.get('ganancia_promedio', 0)),
+            f"{item.get('porcentaje_total', 0):.2f}%"
+        ])
+
+    return _guardar_excel(wb)
 
 
 def export_por_divisa_to_excel(data):
@@ -156,41 +203,16 @@ def export_por_divisa_to_excel(data):
         data: lista de GananciaPorDivisa
         
     Returns:
-        BytesIO con el archivo Excel
+        Archivo temporal con el Excel
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Ganancias por Divisa"
-    
-    # Estilos
-    header_fill = PatternFill(start_color="2F5496", end_color="2F5496", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    title_font = Font(bold=True, size=14)
-    
-    # Título
-    ws.merge_cells('A1:F1')
-    ws['A1'] = "REPORTE DE GANANCIAS POR DIVISA"
-    ws['A1'].font = title_font
-    ws['A1'].alignment = Alignment(horizontal='center')
-    
-    # Fecha de generación
-    ws.merge_cells('A2:F2')
-    ws['A2'] = f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-    ws['A2'].alignment = Alignment(horizontal='center')
-    
-    # Espacio
-    ws.append([])
-    
-    # Headers
-    headers = ['Código Divisa', 'Nombre Divisa', 'Total Ganancia', 'Cantidad Operaciones', 'Ganancia Promedio', 'Monto Total Operado']
-    ws.append(headers)
-    
-    for cell in ws[4]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Datos
+    wb, ws = _crear_hoja_excel(
+        "Ganancias por Divisa",
+        "REPORTE DE GANANCIAS POR DIVISA",
+        ['Código Divisa', 'Nombre Divisa', 'Total Ganancia',
+         'Cantidad Operaciones', 'Ganancia Promedio', 'Monto Total Operado'],
+        [15, 25, 20, 22, 20, 22],
+    )
+
     for item in data:
         ws.append([
             item['divisa_codigo'],
@@ -200,64 +222,28 @@ def export_por_divisa_to_excel(data):
             format_currency(item['ganancia_promedio']),
             format_number(item['monto_total_operado'], 2)
         ])
-    
-    # Ajustar ancho de columnas
-    ws.column_dimensions['A'].width = 15
-    ws.column_dimensions['B'].width = 25
-    ws.column_dimensions['C'].width = 20
-    ws.column_dimensions['D'].width = 22
-    ws.column_dimensions['E'].width = 20
-    ws.column_dimensions['F'].width = 22
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    return buffer
+
+    return _guardar_excel(wb)
 
 
 def export_evolucion_to_excel(data):
     """
-    Exporta el reporte de evolución temporal a Excel con gráfico.
+    Exporta el reporte de evolución temporal a Excel.
     
     Args:
         data: lista de GananciaEvolucionTemporal
         
     Returns:
-        BytesIO con el archivo Excel
+        Archivo temporal con el Excel
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Evolución Temporal"
-    
-    # Estilos
-    header_fill = PatternFill(start_color="2F5496", end_color="2F5496", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    title_font = Font(bold=True, size=14)
-    
-    # Título
-    ws.merge_cells('A1:F1')
-    ws['A1'] = "REPORTE DE EVOLUCIÓN TEMPORAL DE GANANCIAS"
-    ws['A1'].font = title_font
-    ws['A1'].alignment = Alignment(horizontal='center')
-    
-    # Fecha de generación
-    ws.merge_cells('A2:F2')
-    ws['A2'] = f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-    ws['A2'].alignment = Alignment(horizontal='center')
-    
-    # Espacio
-    ws.append([])
-    
-    # Headers
-    headers = ['Periodo', 'Año', 'Mes', 'Total Ganancia', 'Cantidad Operaciones', 'Ganancia Promedio']
-    ws.append(headers)
-    
-    for cell in ws[4]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Datos
+    wb, ws = _crear_hoja_excel(
+        "Evolución Temporal",
+        "REPORTE DE EVOLUCIÓN TEMPORAL DE GANANCIAS",
+        ['Periodo', 'Año', 'Mes', 'Total Ganancia',
+         'Cantidad Operaciones', 'Ganancia Promedio'],
+        [15, 10, 10, 20, 22, 20],
+    )
+
     for item in data:
         ws.append([
             item['periodo'],
@@ -267,69 +253,36 @@ def export_evolucion_to_excel(data):
             item['cantidad_operaciones'],
             format_currency(item['ganancia_promedio'])
         ])
-    
-    # Ajustar ancho de columnas
-    ws.column_dimensions['A'].width = 15
-    ws.column_dimensions['B'].width = 10
-    ws.column_dimensions['C'].width = 10
-    ws.column_dimensions['D'].width = 20
-    ws.column_dimensions['E'].width = 22
-    ws.column_dimensions['F'].width = 20
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    return buffer
+
+    return _guardar_excel(wb)
 
 
 def export_transacciones_to_excel(data):
     """
     Exporta el listado de transacciones a Excel.
+
+    Las filas se consumen de a una, por lo que ``data`` puede ser un
+    iterador sobre un queryset (``.values().iterator()``) sin cargar el
+    listado completo en memoria.
     
     Args:
-        data: lista de transacciones con sus ganancias
+        data: iterable de transacciones con sus ganancias
         
     Returns:
-        BytesIO con el archivo Excel
+        Archivo temporal con el Excel
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Transacciones"
-    
-    # Estilos
-    header_fill = PatternFill(start_color="2F5496", end_color="2F5496", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    title_font = Font(bold=True, size=14)
-    
-    # Título
-    ws.merge_cells('A1:I1')
-    ws['A1'] = "LISTADO DE TRANSACCIONES DEL PERIODO"
-    ws['A1'].font = title_font
-    ws['A1'].alignment = Alignment(horizontal='center')
-    
-    # Fecha de generación
-    ws.merge_cells('A2:I2')
-    ws['A2'] = f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-    ws['A2'].alignment = Alignment(horizontal='center')
-    
-    # Espacio
-    ws.append([])
-    
-    # Headers
-    headers = ['ID Transacción', 'Fecha', 'Cliente', 'Divisa', 'Operación', 
-               'Monto Divisa', 'Tasa Aplicada', 'Método de Pago', 'Ganancia Neta']
-    ws.append(headers)
-    
-    for cell in ws[4]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Datos
+    wb, ws = _crear_hoja_excel(
+        "Transacciones",
+        "LISTADO DE TRANSACCIONES DEL PERIODO",
+        ['ID Transacción', 'Fecha', 'Cliente', 'Divisa', 'Operación',
+         'Monto Divisa', 'Tasa Aplicada', 'Método de Pago', 'Ganancia Neta'],
+        [15, 12, 25, 10, 12, 15, 15, 18, 18],
+    )
+
     for item in data:
         ws.append([
             item['transaccion_id'],
-            item['fecha'],
+            format_fecha(item['fecha']),
             item['cliente_nombre'],
             item['divisa_codigo'],
             item['operacion'].upper(),
@@ -338,113 +291,197 @@ def export_transacciones_to_excel(data):
             item['metodo_nombre'] or 'N/A',
             format_currency(item['ganancia_neta'])
         ])
-    
-    # Ajustar ancho de columnas
-    ws.column_dimensions['A'].width = 15
-    ws.column_dimensions['B'].width = 12
-    ws.column_dimensions['C'].width = 25
-    ws.column_dimensions['D'].width = 10
-    ws.column_dimensions['E'].width = 12
-    ws.column_dimensions['F'].width = 15
-    ws.column_dimensions['G'].width = 15
-    ws.column_dimensions['H'].width = 18
-    ws.column_dimensions['I'].width = 18
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    return buffer
+
+    return _guardar_excel(wb)
 
 
 # ==================== PDF EXPORTS ====================
 
-def export_comparativa_to_pdf(data, filtros=None):
+PDF_HEADER_COLOR = colors.HexColor('#2F5496')
+
+
+class _FlowablesPerezosos(list):
     """
-    Exporta el reporte de comparativa de operaciones a PDF.
-    
-    Args:
-        data: dict con estructura de ComparativaOperaciones
-        filtros: dict con los filtros aplicados (opcional)
-        
-    Returns:
-        BytesIO con el archivo PDF
+    Lista de flowables que se completa bajo demanda desde un iterador.
+
+    ReportLab consume los flowables desde el inicio de la lista, de modo que
+    alcanza con mantener un par de elementos adelantados. Así sólo el bloque
+    en curso permanece en memoria, en lugar de todas las tablas del reporte.
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=letter,
-        title='Reporte de Comparativa de Operaciones',
-        author='Global Exchange'
-    )
-    elements = []
+
+    def __init__(self, iniciales, pendientes):
+        super().__init__(iniciales)
+        self._pendientes = iter(pendientes)
+
+    def _completar(self):
+        while list.__len__(self) < 2:
+            siguiente = next(self._pendientes, None)
+            if siguiente is None:
+                break
+            self.append(siguiente)
+
+    def __len__(self):
+        self._completar()
+        return list.__len__(self)
+
+    def __getitem__(self, indice):
+        self._completar()
+        return list.__getitem__(self, indice)
+
+
+def _encabezado_pdf(titulo, filtros):
+    """Flowables de título, fecha de generación y filtros aplicados."""
     styles = getSampleStyleSheet()
-    
+    elements = []
+
     # Título
     title_style = ParagraphStyle(
         'CustomTitle',
         parent=styles['Heading1'],
         fontSize=16,
-        textColor=colors.HexColor('#2F5496'),
+        textColor=PDF_HEADER_COLOR,
         spaceAfter=30,
         alignment=TA_CENTER
     )
-    title = Paragraph("REPORTE DE COMPARATIVA DE OPERACIONES", title_style)
-    elements.append(title)
-    
+    elements.append(Paragraph(titulo, title_style))
+
     # Fecha
     date_style = ParagraphStyle('DateStyle', parent=styles['Normal'], alignment=TA_CENTER)
-    date_text = Paragraph(f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style)
-    elements.append(date_text)
-    
+    elements.append(Paragraph(
+        f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style))
+
     # Filtros aplicados
     if filtros:
         filtros_text = format_filtros(filtros)
         filtros_style = ParagraphStyle('FiltrosStyle', parent=styles['Normal'], alignment=TA_CENTER, fontSize=9, textColor=colors.HexColor('#666666'))
-        filtros_para = Paragraph(f"<b>Filtros:</b> {filtros_text}", filtros_style)
         elements.append(Spacer(1, 10))
-        elements.append(filtros_para)
-    
+        elements.append(Paragraph(f"<b>Filtros:</b> {filtros_text}", filtros_style))
+
     elements.append(Spacer(1, 20))
-    
-    # Tabla
-    compra = data.get('compra', {})
-    venta = data.get('venta', {})
-    
-    table_data = [
-        ['Tipo Operación', 'Total Ganancia', 'Cantidad\nOperaciones', 'Ganancia\nPromedio', 'Porcentaje\ndel Total'],
-        [
-            'COMPRA',
-            format_currency(compra.get('total_ganancia', 0)),
-            str(compra.get('cantidad_operaciones', 0)),
-            format_currency(compra.get('ganancia_promedio', 0)),
-            f"{compra.get('porcentaje_total', 0):.2f}%"
-        ],
-        [
-            'VENTA',
-            format_currency(venta.get('total_ganancia', 0)),
-            str(venta.get('cantidad_operaciones', 0)),
-            format_currency(venta.get('ganancia_promedio', 0)),
-            f"{venta.get('porcentaje_total', 0):.2f}%"
-        ]
-    ]
-    
-    table = Table(table_data, colWidths=[1.2*inch, 1.5*inch, 1.2*inch, 1.5*inch, 1.2*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2F5496')),
+    return elements
+
+
+def _tabla_pdf_por_bloques(doc, headers, filas, anchos, fuente=10,
+                           fuente_encabezado=None, padding_encabezado=12, grilla=1):
+    """
+    Genera la tabla de un reporte como bloques de tamaño fijo.
+
+    Cada bloque es una tabla independiente con su propio encabezado y tantas
+    filas como entran en una página, con alto de fila fijo. ReportLab sólo
+    calcula el layout de un bloque a la vez, por lo que el tiempo de render
+    crece linealmente con la cantidad de filas.
+
+    Args:
+        doc: Documento destino (define el alto disponible por página)
+        headers: Lista de encabezados de columna
+        filas: Iterable de filas ya formateadas
+        anchos: Lista de anchos de columna
+        fuente: Tamaño de fuente del cuerpo
+        fuente_encabezado: Tamaño de fuente del encabezado (por defecto, el del cuerpo)
+        padding_encabezado: Padding inferior del encabezado
+        grilla: Grosor de las líneas de la grilla
+
+    Yields:
+        Table con un bloque de filas
+    """
+    fuente_encabezado = fuente_encabezado or fuente
+    lineas_encabezado = max(str(header).count('\n') + 1 for header in headers)
+    alto_encabezado = lineas_encabezado * fuente_encabezado * 1.2 + 3 + padding_encabezado
+    alto_fila = fuente * 1.2 + 6
+
+    # Alto útil del frame (SimpleDocTemplate agrega 6pt de padding por lado)
+    filas_por_bloque = max(1, int((doc.height - 12 - alto_encabezado) // alto_fila))
+
+    estilo = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), PDF_HEADER_COLOR),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
         ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('FONTSIZE', (0, 0), (-1, 0), fuente_encabezado),
+        ('FONTSIZE', (0, 1), (-1, -1), fuente),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), padding_encabezado),
         ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('GRID', (0, 0), (-1, -1), grilla, colors.black),
         ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
+    ])
+
+    def crear_bloque(bloque):
+        table = Table(
+            [headers, *bloque],
+            colWidths=anchos,
+            rowHeights=[alto_encabezado] + [alto_fila] * len(bloque),
+            repeatRows=1,
+        )
+        table.setStyle(estilo)
+        return table
+
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) == filas_por_bloque:
+            yield crear_bloque(bloque)
+            bloque = []
+
+    if bloque:
+        yield crear_bloque(bloque)
+
+
+def _generar_pdf(pagesize, titulo_documento, titulo, filtros, headers, filas,
+                 anchos, **estilo_tabla):
+    """
+    Construye un reporte PDF con encabezado y tabla por bloques.
+
+    Los bloques se generan a medida que ReportLab los consume y el resultado
+    se escribe en un archivo temporal, de modo que la memoria no depende de
+    la cantidad de filas.
+
+    Returns:
+        Archivo temporal posicionado al inicio
+    """
+    archivo = tempfile.TemporaryFile()
+    doc = SimpleDocTemplate(
+        archivo,
+        pagesize=pagesize,
+        title=titulo_documento,
+        author='Global Exchange'
+    )
+    bloques = _tabla_pdf_por_bloques(doc, headers, filas, anchos, **estilo_tabla)
+    doc.build(_FlowablesPerezosos(_encabezado_pdf(titulo, filtros), bloques))
+    archivo.seek(0)
+    return archivo
+
+
+def export_comparativa_to_pdf(data, filtros=None):
+    """
+    Exporta el reporte de comparativa de operaciones a PDF.
     
-    elements.append(table)
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    Args:
+        data: dict con estructura de ComparativaOperaciones
+        filtros: dict con los filtros aplicados (opcional)
+        
+    Returns:
+        Archivo temporal con el PDF
+    """
+    filas = []
+    for operacion in ('compra', 'venta'):
+        item = data.get(operacion, {})
+        filas.append([
+            operacion.upper(),
+            format_currency(item.get('total_ganancia', 0)),
+            str(item.get('cantidad_operaciones', 0)),
+            format_currency(item.get('ganancia_promedio', 0)),
+            f"{item.get('porcentaje_total', 0):.2f}%"
+        ])
+
+    return _generar_pdf(
+        letter,
+        'Reporte de Comparativa de Operaciones',
+        "REPORTE DE COMPARATIVA DE OPERACIONES",
+        filtros,
+        ['Tipo Operación', 'Total Ganancia', 'Cantidad\nOperaciones', 'Ganancia\nPromedio', 'Porcentaje\ndel Total'],
+        filas,
+        [1.2*inch, 1.5*inch, 1.2*inch, 1.5*inch, 1.2*inch],
+    )
 
 
 def export_por_divisa_to_pdf(data, filtros=None):
@@ -456,75 +493,30 @@ def export_por_divisa_to_pdf(data, filtros=None):
         filtros: dict con los filtros aplicados (opcional)
         
     Returns:
-        BytesIO con el archivo PDF
+        Archivo temporal con el PDF
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=landscape(letter),
-        title='Reporte de Ganancias por Divisa',
-        author='Global Exchange'
-    )
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Título
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#2F5496'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    title = Paragraph("REPORTE DE GANANCIAS POR DIVISA", title_style)
-    elements.append(title)
-    
-    # Fecha
-    date_style = ParagraphStyle('DateStyle', parent=styles['Normal'], alignment=TA_CENTER)
-    date_text = Paragraph(f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style)
-    elements.append(date_text)
-    
-    # Filtros aplicados
-    if filtros:
-        filtros_text = format_filtros(filtros)
-        filtros_style = ParagraphStyle('FiltrosStyle', parent=styles['Normal'], alignment=TA_CENTER, fontSize=9, textColor=colors.HexColor('#666666'))
-        filtros_para = Paragraph(f"<b>Filtros:</b> {filtros_text}", filtros_style)
-        elements.append(Spacer(1, 10))
-        elements.append(filtros_para)
-    
-    elements.append(Spacer(1, 20))
-    
-    # Tabla
-    table_data = [['Código', 'Nombre Divisa', 'Total Ganancia', 'Cantidad\nOperaciones', 'Ganancia\nPromedio', 'Monto Total\nOperado']]
-    
-    for item in data:
-        table_data.append([
+    filas = (
+        [
             item['divisa_codigo'],
             item['divisa_nombre'],
             format_currency(item['total_ganancia']),
             str(item['cantidad_operaciones']),
             format_currency(item['ganancia_promedio']),
             format_number(item['monto_total_operado'], 2)
-        ])
-    
-    table = Table(table_data, colWidths=[0.8*inch, 2*inch, 1.5*inch, 1.2*inch, 1.5*inch, 1.5*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2F5496')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+        ]
+        for item in data
+    )
+
+    return _generar_pdf(
+        landscape(letter),
+        'Reporte de Ganancias por Divisa',
+        "REPORTE DE GANANCIAS POR DIVISA",
+        filtros,
+        ['Código', 'Nombre Divisa', 'Total Ganancia', 'Cantidad\nOperaciones', 'Ganancia\nPromedio', 'Monto Total\nOperado'],
+        filas,
+        [0.8*inch, 2*inch, 1.5*inch, 1.2*inch, 1.5*inch, 1.5*inch],
+        fuente=8,
+    )
 
 
 def export_evolucion_to_pdf(data, filtros=None):
@@ -536,133 +528,50 @@ def export_evolucion_to_pdf(data, filtros=None):
         filtros: dict con los filtros aplicados (opcional)
         
     Returns:
-        BytesIO con el archivo PDF
+        Archivo temporal con el PDF
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=letter,
-        title='Reporte de Evolución Temporal',
-        author='Global Exchange'
-    )
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Título
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#2F5496'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    title = Paragraph("REPORTE DE EVOLUCIÓN TEMPORAL", title_style)
-    elements.append(title)
-    
-    # Fecha
-    date_style = ParagraphStyle('DateStyle', parent=styles['Normal'], alignment=TA_CENTER)
-    date_text = Paragraph(f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style)
-    elements.append(date_text)
-    
-    # Filtros aplicados
-    if filtros:
-        filtros_text = format_filtros(filtros)
-        filtros_style = ParagraphStyle('FiltrosStyle', parent=styles['Normal'], alignment=TA_CENTER, fontSize=9, textColor=colors.HexColor('#666666'))
-        filtros_para = Paragraph(f"<b>Filtros:</b> {filtros_text}", filtros_style)
-        elements.append(Spacer(1, 10))
-        elements.append(filtros_para)
-    
-    elements.append(Spacer(1, 20))
-    
-    # Tabla
-    table_data = [['Periodo', 'Año', 'Mes', 'Total Ganancia', 'Cantidad\nOperaciones', 'Ganancia\nPromedio']]
-    
-    for item in data:
-        table_data.append([
+    filas = (
+        [
             item['periodo'],
             str(item['anio']),
             str(item['mes']),
             format_currency(item['total_ganancia']),
             str(item['cantidad_operaciones']),
             format_currency(item['ganancia_promedio'])
-        ])
-    
-    table = Table(table_data, colWidths=[1*inch, 0.8*inch, 0.8*inch, 1.5*inch, 1.2*inch, 1.5*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2F5496')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    
-    elements.append(table)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+        ]
+        for item in data
+    )
+
+    return _generar_pdf(
+        letter,
+        'Reporte de Evolución Temporal',
+        "REPORTE DE EVOLUCIÓN TEMPORAL",
+        filtros,
+        ['Periodo', 'Año', 'Mes', 'Total Ganancia', 'Cantidad\nOperaciones', 'Ganancia\nPromedio'],
+        filas,
+        [1*inch, 0.8*inch, 0.8*inch, 1.5*inch, 1.2*inch, 1.5*inch],
+        fuente=9,
+    )
 
 
 def export_transacciones_to_pdf(data, filtros=None):
     """
     Exporta el listado de transacciones a PDF.
+
+    Las filas se consumen de a una, por lo que ``data`` puede ser un
+    iterador sobre el queryset.
     
     Args:
-        data: lista de transacciones con sus ganancias
+        data: iterable de transacciones con sus ganancias
         filtros: dict con los filtros aplicados (opcional)
         
     Returns:
-        BytesIO con el archivo PDF
+        Archivo temporal con el PDF
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=landscape(letter),
-        title='Listado de Transacciones',
-        author='Global Exchange'
-    )
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Título
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#2F5496'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    title = Paragraph("LISTADO DE TRANSACCIONES DEL PERIODO", title_style)
-    elements.append(title)
-    
-    # Fecha
-    date_style = ParagraphStyle('DateStyle', parent=styles['Normal'], alignment=TA_CENTER)
-    date_text = Paragraph(f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style)
-    elements.append(date_text)
-    
-    # Filtros aplicados
-    if filtros:
-        filtros_text = format_filtros(filtros)
-        filtros_style = ParagraphStyle('FiltrosStyle', parent=styles['Normal'], alignment=TA_CENTER, fontSize=9, textColor=colors.HexColor('#666666'))
-        filtros_para = Paragraph(f"<b>Filtros:</b> {filtros_text}", filtros_style)
-        elements.append(Spacer(1, 10))
-        elements.append(filtros_para)
-    
-    elements.append(Spacer(1, 20))
-    
-    # Tabla
-    table_data = [['ID', 'Fecha', 'Cliente', 'Divisa', 'Operación', 'Monto', 'Tasa', 'Método', 'Ganancia']]
-    
-    for item in data:
-        table_data.append([
+    filas = (
+        [
             str(item['transaccion_id']),
-            item['fecha'],
+            format_fecha(item['fecha']),
             item['cliente_nombre'][:25],  # Limitar longitud
             item['divisa_codigo'],
             item['operacion'].upper(),
@@ -670,23 +579,75 @@ def export_transacciones_to_pdf(data, filtros=None):
             format_number(item['tasa_aplicada'], 2),
             (item['metodo_nombre'] or 'N/A')[:15],
             format_currency(item['ganancia_neta'])
-        ])
-    
-    table = Table(table_data, colWidths=[0.5*inch, 0.7*inch, 1.4*inch, 0.5*inch, 0.7*inch, 
-                                          0.9*inch, 0.9*inch, 1*inch, 1.1*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2F5496')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 7),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+        ]
+        for item in data
+    )
+
+    return _generar_pdf(
+        landscape(letter),
+        'Listado de Transacciones',
+        "LISTADO DE TRANSACCIONES DEL PERIODO",
+        filtros,
+        ['ID', 'Fecha', 'Cliente', 'Divisa', 'Operación', 'Monto', 'Tasa', 'Método', 'Ganancia'],
+        filas,
+        [0.5*inch, 0.7*inch, 1.4*inch, 0.5*inch, 0.7*inch,
+         0.9*inch, 0.9*inch, 1*inch, 1.1*inch],
+        fuente=7,
+        padding_encabezado=8,
+        grilla=0.5,
+    )
+
+
+# ==================== CSV EXPORTS ====================
+
+# Bytes acumulados antes de entregar un bloque de la respuesta
+CSV_CHUNK_BYTES = 64 * 1024
+
+
+class _LineaCSV:
+    """Pseudo-buffer para ``csv.writer``: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def stream_csv(headers, filas, comprimir=False):
+    """
+    Genera un CSV en bloques de bytes a partir de un iterable de filas.
+
+    Pensado para ``StreamingHttpResponse``: las filas se consumen de a una,
+    por lo que ``filas`` puede venir de ``queryset.values_list().iterator()``
+    sin cargar el resultado en memoria. El contenido se codifica en UTF-8 con
+    BOM para que Excel reconozca los acentos.
+
+    Args:
+        headers: Nombres de las columnas
+        filas: iterable de secuencias con los valores de cada fila
+        comprimir: Si es True, el flujo se comprime con gzip al vuelo
+
+    Yields:
+        bytes del archivo, en bloques de aproximadamente ``CSV_CHUNK_BYTES``
+    """
+    writer = csv.writer(_LineaCSV())
+    # wbits=31: formato gzip (encabezado y CRC) en lugar de zlib
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+
+    bloque = ['\ufeff' + writer.writerow(headers)]
+    tamanio = len(bloque[0])
+    for fila in filas:
+        linea = writer.writerow(fila)
+        bloque.append(linea)
+        tamanio += len(linea)
+        if tamanio >= CSV_CHUNK_BYTES:
+            datos = ''.join(bloque).encode('utf-8')
+            if compresor:
+                datos = compresor.compress(datos)
+            if datos:
+                yield datos
+            bloque, tamanio = [], 0
+
+    datos = ''.join(bloque).encode('utf-8')
+    if compresor:
+        datos = compresor.compress(datos) + compresor.flush()
+    if datos:
+        yield datos
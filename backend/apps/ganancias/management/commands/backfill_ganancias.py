@@ -0,0 +1,130 @@
+"""
+Comando para registrar en lote las ganancias faltantes.
+
+Uso:
+    python manage.py backfill_ganancias [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD]
+        [--batch-size N] [--recalcular] [--procesos N]
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+
+from apps.ganancias.models import Ganancia
+from apps.ganancias.service import GananciaService
+
+
+def _procesar_rango(desde, hasta, batch_size, recalcular):
+    """Procesa un rango de fechas en un proceso hijo."""
+    return GananciaService.backfill_ganancias(
+        desde, hasta, batch_size=batch_size, recalcular=recalcular,
+        reconstruir_resumen=False,
+    )
+
+
+def dividir_rango(desde, hasta, partes):
+    """Divide [desde, hasta] en hasta ``partes`` rangos contiguos de días."""
+    dias = (hasta - desde).days + 1
+    partes = max(1, min(partes, dias))
+    tamanio, resto = divmod(dias, partes)
+
+    rangos = []
+    inicio = desde
+    for i in range(partes):
+        fin = inicio + timedelta(days=tamanio + (1 if i < resto else 0) - 1)
+        rangos.append((inicio, fin))
+        inicio = fin + timedelta(days=1)
+    return rangos
+
+
+class Command(BaseCommand):
+    help = (
+        "Registra las ganancias de transacciones completadas que no la tienen "
+        "y, con --recalcular, recalcula las existentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial inclusive (YYYY-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final inclusive (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Filas por lote (por defecto 1000)')
+        parser.add_argument('--recalcular', action='store_true',
+                            help='Recalcula también las ganancias ya registradas')
+        parser.add_argument('--procesos', type=int, default=1,
+                            help='Procesos en paralelo, repartiendo el rango de fechas')
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for campo in ('desde', 'hasta'):
+            valor = options.get(campo)
+            if valor:
+                fechas[campo] = parse_date(valor)
+                if not fechas[campo]:
+                    raise CommandError(f"Fecha inválida para --{campo}: {valor}")
+
+        batch_size = options['batch_size']
+        recalcular = options['recalcular']
+        procesos = options['procesos']
+        if batch_size < 1 or procesos < 1:
+            raise CommandError("--batch-size y --procesos deben ser mayores a cero")
+
+        if procesos == 1:
+            resultado = GananciaService.backfill_ganancias(
+                fechas.get('desde'), fechas.get('hasta'),
+                batch_size=batch_size, recalcular=recalcular,
+            )
+        else:
+            resultado = self._backfill_en_paralelo(
+                fechas.get('desde'), fechas.get('hasta'),
+                batch_size, recalcular, procesos,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ganancias creadas: {resultado['creadas']}, "
+            f"actualizadas: {resultado['actualizadas']}."))
+
+    def _backfill_en_paralelo(self, desde, hasta, batch_size, recalcular, procesos):
+        """Reparte el rango de fechas entre procesos y reconstruye el resumen al final."""
+        desde = desde or self._fecha_limite(Min, recalcular)
+        hasta = hasta or self._fecha_limite(Max, recalcular)
+        resultado = {'creadas': 0, 'actualizadas': 0}
+        if not desde or not hasta:
+            return resultado
+
+        # Cada proceso hijo debe abrir su propia conexión
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            futuros = [
+                pool.submit(_procesar_rango, inicio, fin, batch_size, recalcular)
+                for inicio, fin in dividir_rango(desde, hasta, procesos)
+            ]
+            for futuro in futuros:
+                parcial = futuro.result()
+                resultado['creadas'] += parcial['creadas']
+                resultado['actualizadas'] += parcial['actualizadas']
+
+        if resultado['creadas'] or resultado['actualizadas']:
+            GananciaService.reconstruir_ganancia_diaria(desde, hasta)
+        return resultado
+
+    def _fecha_limite(self, agregado, recalcular):
+        """Primera (Min) o última (Max) fecha con datos a procesar."""
+        limite = (
+            GananciaService.transacciones_sin_ganancia()
+            .aggregate(limite=agregado(Coalesce('fecha_fin', 'fecha_inicio')))['limite']
+        )
+        candidatas = [limite.date()] if limite else []
+        if recalcular:
+            registrada = Ganancia.objects.aggregate(limite=agregado('fecha'))['limite']
+            if registrada:
+                candidatas.append(registrada)
+
+        if not candidatas:
+            return None
+        return min(candidatas) if agregado is Min else max(candidatas)
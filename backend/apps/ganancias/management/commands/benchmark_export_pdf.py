@@ -0,0 +1,59 @@
+"""
+Comando para medir el render del PDF de transacciones con datos sintéticos.
+
+Uso:
+    python manage.py benchmark_export_pdf [--filas 10000 100000]
+"""
+import resource
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from apps.ganancias.export_utils import export_transacciones_to_pdf
+
+
+def filas_sinteticas(cantidad):
+    """Genera filas con la misma forma que ``proyectar_transacciones``."""
+    inicio = date(2025, 1, 1)
+    for i in range(cantidad):
+        yield {
+            'transaccion_id': i + 1,
+            'fecha': inicio + timedelta(days=i % 365),
+            'cliente_nombre': f'Cliente {i % 500}',
+            'divisa_codigo': 'USD',
+            'operacion': 'venta' if i % 2 else 'compra',
+            'monto_divisa': Decimal('100.00') + i % 1000,
+            'tasa_aplicada': Decimal('7350.00'),
+            'metodo_nombre': 'Efectivo',
+            'ganancia_neta': Decimal('15000.00') + i % 100,
+        }
+
+
+class Command(BaseCommand):
+    help = "Mide tiempo y memoria del export PDF de transacciones por bloques."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--filas', type=int, nargs='+', default=[10_000, 100_000],
+            help='Cantidades de filas a renderizar')
+
+    def handle(self, *args, **options):
+        for cantidad in options['filas']:
+            inicio = time.perf_counter()
+            archivo = export_transacciones_to_pdf(filas_sinteticas(cantidad))
+            segundos = time.perf_counter() - inicio
+            # Pico de memoria residente del proceso (KiB en Linux)
+            pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            archivo.seek(0, 2)
+            tamanio = archivo.tell()
+            archivo.close()
+
+            self.stdout.write(
+                f"{cantidad:>9} filas: {segundos:7.2f} s, "
+                f"{segundos / cantidad * 1e6:6.1f} µs/fila, "
+                f"RSS máximo {pico / 2**10:7.1f} MiB, "
+                f"PDF {tamanio / 2**20:6.1f} MiB"
+            )
@@ -0,0 +1,31 @@
+"""
+Comando para reconstruir el resumen diario de ganancias.
+
+Uso:
+    python manage.py reconstruir_ganancia_diaria [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.ganancias.service import GananciaService
+
+
+class Command(BaseCommand):
+    help = "Recalcula la tabla GananciaDiaria a partir de los registros de Ganancia."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial inclusive (YYYY-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final inclusive (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for campo in ('desde', 'hasta'):
+            valor = options.get(campo)
+            if valor:
+                fechas[campo] = parse_date(valor)
+                if not fechas[campo]:
+                    raise CommandError(f"Fecha inválida para --{campo}: {valor}")
+
+        filas = GananciaService.reconstruir_ganancia_diaria(**fechas)
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumen diario reconstruido: {filas} filas generadas."))
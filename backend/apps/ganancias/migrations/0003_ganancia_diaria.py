@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+POBLAR_RESUMEN = """
+    INSERT INTO ganancias_gananciadiaria
+        (fecha, divisa_extranjera_id, operacion, metodo_financiero_id,
+         total_ganancia, cantidad_operaciones, monto_total_operado,
+         ganancia_maxima, ganancia_minima)
+    SELECT fecha, divisa_extranjera_id, operacion, metodo_financiero_id,
+           SUM(ganancia_neta), COUNT(*), SUM(monto_divisa),
+           MAX(ganancia_neta), MIN(ganancia_neta)
+    FROM ganancias_ganancia
+    GROUP BY fecha, divisa_extranjera_id, operacion, metodo_financiero_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('divisas', '0009_alter_limiteconfig_limite_diario_and_more'),
+        ('ganancias', '0002_remove_ganancia_descuento_categoria_and_more'),
+        ('metodos_financieros', '0002_cheque_transaccion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GananciaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('operacion', models.CharField(choices=[('compra', 'Compra'), ('venta', 'Venta')], max_length=10, verbose_name='Tipo de Operación')),
+                ('total_ganancia', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('cantidad_operaciones', models.IntegerField()),
+                ('monto_total_operado', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('ganancia_maxima', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('ganancia_minima', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('divisa_extranjera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ganancias_diarias', to='divisas.divisa', verbose_name='Divisa Extranjera')),
+                ('metodo_financiero', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ganancias_diarias', to='metodos_financieros.metodofinanciero', verbose_name='Método Financiero')),
+            ],
+            options={
+                'verbose_name': 'Ganancia Diaria',
+                'verbose_name_plural': 'Ganancias Diarias',
+                'ordering': ['-fecha'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'divisa_extranjera', 'operacion', 'metodo_financiero'), name='uniq_ganancia_diaria', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunSQL(POBLAR_RESUMEN, migrations.RunSQL.noop),
+    ]
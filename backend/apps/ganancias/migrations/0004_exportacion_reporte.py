@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganancias', '0003_ganancia_diaria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportacionReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('formato', models.CharField(choices=[('excel', 'Excel'), ('pdf', 'PDF')], max_length=10, verbose_name='Formato')),
+                ('reporte', models.CharField(max_length=20, verbose_name='Tipo de Reporte')),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('filtro_hash', models.CharField(db_index=True, max_length=64)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('filas_procesadas', models.IntegerField(default=0)),
+                ('filas_totales', models.IntegerField(blank=True, null=True)),
+                ('archivo', models.FileField(blank=True, upload_to='exportaciones/ganancias/')),
+                ('hash_contenido', models.CharField(blank=True, max_length=64)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='exportaciones_ganancias', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Exportación de Reporte',
+                'verbose_name_plural': 'Exportaciones de Reportes',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'procesando'])), fields=('filtro_hash',), name='uniq_exportacion_en_curso')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('divisas', '0009_alter_limiteconfig_limite_diario_and_more'),
+        ('ganancias', '0004_exportacion_reporte'),
+        ('metodos_financieros', '0002_cheque_transaccion'),
+        ('operaciones', '0005_transaccion_precio_base'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ganancia',
+            index=models.Index(fields=['-fecha', '-ganancia_neta', '-id'], include=('transaccion', 'operacion', 'monto_divisa', 'tasa_aplicada', 'divisa_extranjera', 'metodo_financiero'), name='idx_ganancia_listado'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganancias', '0005_ganancia_listado_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='exportacionreporte',
+            name='uniq_exportacion_en_curso',
+        ),
+        migrations.AddField(
+            model_name='exportacionreporte',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddConstraint(
+            model_name='exportacionreporte',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'procesando'])), fields=('solicitado_por', 'filtro_hash'), name='uniq_exportacion_en_curso'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganancias', '0006_exportacion_por_usuario'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE SEQUENCE IF NOT EXISTS ganancias_reportes_version",
+            reverse_sql="DROP SEQUENCE IF EXISTS ganancias_reportes_version",
+        ),
+    ]
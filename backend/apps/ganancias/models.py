@@ -4,6 +4,7 @@ Módulo de modelos para la gestión de ganancias del negocio.
 Define el modelo Ganancia que registra y analiza las ganancias generadas
 por cada transacción completada en el sistema GlobalExchange.
 """
+from django.conf import settings
 from django.db import models
 from apps.operaciones.models import Transaccion
 from apps.divisas.models import Divisa
@@ -140,6 +141,12 @@ class Ganancia(models.Model):
                          name='idx_operacion_fecha'),
             models.Index(
                 fields=['divisa_extranjera', 'operacion', 'fecha'], name='idx_div_op_fecha'),
+            # Índice cubriente para el listado paginado por cursor
+            models.Index(
+                fields=['-fecha', '-ganancia_neta', '-id'],
+                include=['transaccion', 'operacion', 'monto_divisa', 'tasa_aplicada',
+                         'divisa_extranjera', 'metodo_financiero'],
+                name='idx_ganancia_listado'),
         ]
 
     def __str__(self):
@@ -159,3 +166,161 @@ class Ganancia(models.Model):
         if self.monto_divisa and self.monto_divisa != 0:
             return self.ganancia_neta / self.monto_divisa
         return 0
+
+
+class GananciaDiaria(models.Model):
+    """
+    Resumen diario de ganancias usado por los reportes agregados.
+
+    Cada fila acumula las ganancias de un día para una combinación de
+    divisa, tipo de operación y método financiero. Se actualiza con un
+    upsert al registrar cada ganancia y puede reconstruirse desde la tabla
+    Ganancia con el comando ``reconstruir_ganancia_diaria``.
+
+    Atributos:
+        fecha (Date): Día de las operaciones.
+        divisa_extranjera (FK): Divisa extranjera de las operaciones.
+        operacion (str): Tipo de operación (compra/venta).
+        metodo_financiero (FK): Método de pago (puede ser nulo).
+        total_ganancia (Decimal): Suma de ganancia_neta del día.
+        cantidad_operaciones (int): Cantidad de ganancias acumuladas.
+        monto_total_operado (Decimal): Suma de monto_divisa del día.
+        ganancia_maxima (Decimal): Mayor ganancia_neta del día.
+        ganancia_minima (Decimal): Menor ganancia_neta del día.
+    """
+
+    fecha = models.DateField(verbose_name='Fecha')
+    divisa_extranjera = models.ForeignKey(
+        Divisa,
+        on_delete=models.CASCADE,
+        related_name='ganancias_diarias',
+        verbose_name='Divisa Extranjera'
+    )
+    operacion = models.CharField(
+        max_length=10,
+        choices=[('compra', 'Compra'), ('venta', 'Venta')],
+        verbose_name='Tipo de Operación'
+    )
+    metodo_financiero = models.ForeignKey(
+        MetodoFinanciero,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ganancias_diarias',
+        verbose_name='Método Financiero'
+    )
+
+    total_ganancia = models.DecimalField(max_digits=20, decimal_places=2)
+    cantidad_operaciones = models.IntegerField()
+    monto_total_operado = models.DecimalField(max_digits=20, decimal_places=2)
+    ganancia_maxima = models.DecimalField(max_digits=15, decimal_places=2)
+    ganancia_minima = models.DecimalField(max_digits=15, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Ganancia Diaria'
+        verbose_name_plural = 'Ganancias Diarias'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'divisa_extranjera',
+                        'operacion', 'metodo_financiero'],
+                nulls_distinct=False,
+                name='uniq_ganancia_diaria'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.divisa_extranjera_id} - {self.operacion} - {self.total_ganancia}"
+
+
+class ExportacionReporte(models.Model):
+    """
+    Trabajo de exportación de un reporte de ganancias en segundo plano.
+
+    Un worker de Celery genera el archivo en MEDIA_ROOT e informa el avance
+    en ``filas_procesadas``. Las solicitudes idénticas de un mismo usuario
+    (mismo ``filtro_hash``) mientras hay un trabajo en curso reutilizan ese
+    trabajo. ``updated_at`` se renueva con cada avance; un trabajo en curso
+    sin avances por más de ``reportes.EXPORTACION_SIN_AVANCE`` se da por
+    fallido.
+
+    Atributos:
+        solicitado_por (FK): Usuario que solicitó la exportación.
+        formato (str): 'excel' o 'pdf'.
+        reporte (str): Tipo de reporte exportado.
+        parametros (JSON): Filtros normalizados del reporte.
+        filtro_hash (str): SHA-256 de formato, reporte y parámetros.
+        estado (str): pendiente, procesando, completado o error.
+        filas_procesadas (int): Filas escritas hasta el momento.
+        filas_totales (int): Filas esperadas, si se conocen de antemano.
+        archivo (File): Archivo generado.
+        hash_contenido (str): SHA-256 del archivo generado.
+        error (str): Mensaje de error si la exportación falló.
+        updated_at (datetime): Último cambio de estado o avance.
+    """
+
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_PROCESANDO = 'procesando'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_PROCESANDO, 'Procesando'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_ERROR, 'Error'),
+    ]
+
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='exportaciones_ganancias',
+        verbose_name='Solicitado por'
+    )
+    formato = models.CharField(
+        max_length=10,
+        choices=[('excel', 'Excel'), ('pdf', 'PDF')],
+        verbose_name='Formato'
+    )
+    reporte = models.CharField(max_length=20, verbose_name='Tipo de Reporte')
+    parametros = models.JSONField(default=dict, blank=True)
+    filtro_hash = models.CharField(max_length=64, db_index=True)
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default=ESTADO_PENDIENTE,
+        verbose_name='Estado'
+    )
+    filas_procesadas = models.IntegerField(default=0)
+    filas_totales = models.IntegerField(null=True, blank=True)
+    archivo = models.FileField(upload_to='exportaciones/ganancias/', blank=True)
+    hash_contenido = models.CharField(max_length=64, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Exportación de Reporte'
+        verbose_name_plural = 'Exportaciones de Reportes'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['solicitado_por', 'filtro_hash'],
+                condition=models.Q(estado__in=['pendiente', 'procesando']),
+                name='uniq_exportacion_en_curso'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Exportación {self.id} - {self.reporte} ({self.formato}) - {self.estado}"
+
+    @property
+    def progreso(self):
+        """Porcentaje de avance (0-100), o None si no se conoce el total."""
+        if self.estado == self.ESTADO_COMPLETADO:
+            return 100
+        if not self.filas_totales:
+            return None
+        return min(100, round(self.filas_procesadas * 100 / self.filas_totales))
@@ -0,0 +1,879 @@
+"""
+Cálculo de los reportes de ganancias y generación de sus exportaciones.
+
+Las funciones reciben los parámetros de filtrado como un dict (por ejemplo
+``request.query_params``), de modo que pueden usarse tanto desde las vistas
+como desde tareas en segundo plano.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Aggregate, Avg, Case, Count, DecimalField, F, FloatField, Func, IntegerField,
+    Max, Min, Q, Sum, Value, When,
+)
+from django.db.models.functions import Abs, ExtractMonth, ExtractYear, Least, TruncDay, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .cache import ReporteCache
+from .models import ExportacionReporte, Ganancia, GananciaDiaria
+from .export_utils import (
+    EXPORT_CHUNK_SIZE,
+    export_comparativa_to_excel,
+    export_comparativa_to_pdf,
+    export_por_divisa_to_excel,
+    export_por_divisa_to_pdf,
+    export_evolucion_to_excel,
+    export_evolucion_to_pdf,
+    export_transacciones_to_excel,
+    export_transacciones_to_pdf,
+    stream_csv,
+)
+
+logger = logging.getLogger(__name__)
+
+REPORTES_EXPORTABLES = ('general', 'por_divisa', 'evolucion', 'transacciones')
+
+CONTENT_TYPES = {
+    'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+
+EXTENSIONES = {'excel': 'xlsx', 'pdf': 'pdf'}
+
+NOMBRES_ARCHIVO = {
+    'general': 'reporte_comparativa',
+    'por_divisa': 'reporte_por_divisa',
+    'evolucion': 'reporte_evolucion',
+    'transacciones': 'reporte_transacciones',
+}
+
+
+# Un trabajo en curso sin avances durante este lapso (p. ej. porque el worker
+# murió) se marca como fallido y deja de bloquear las solicitudes idénticas
+EXPORTACION_SIN_AVANCE = timedelta(minutes=30)
+
+# Reintentos de creación cuando una solicitud idéntica concurrente gana la carrera
+INTENTOS_SOLICITUD = 3
+
+# Parámetros que afectan el contenido de un reporte
+PARAMETROS_REPORTE = (
+    'fecha_inicio',
+    'fecha_fin',
+    'anio',
+    'mes',
+    'divisa_extranjera',
+    'operacion',
+    'metodo_financiero',
+    'granularidad',
+)
+
+
+def filtrar_por_fechas(queryset, params):
+    """Filtra por 'fecha_inicio' y 'fecha_fin' (YYYY-MM-DD) si se especifican."""
+    fecha_inicio = params.get('fecha_inicio')
+    fecha_fin = params.get('fecha_fin')
+
+    if fecha_inicio:
+        fecha_inicio = parse_date(fecha_inicio)
+        if fecha_inicio:
+            queryset = queryset.filter(fecha__gte=fecha_inicio)
+
+    if fecha_fin:
+        fecha_fin = parse_date(fecha_fin)
+        if fecha_fin:
+            queryset = queryset.filter(fecha__lte=fecha_fin)
+
+    return queryset
+
+
+def build_filtros_info(params):
+    """
+    Construye un diccionario con la información de filtros aplicados.
+
+    Returns:
+        dict con información legible de los filtros
+    """
+    from apps.divisas.models import Divisa
+    from apps.metodos_financieros.models import MetodoFinanciero
+
+    filtros = {}
+
+    # Fechas
+    fecha_inicio = params.get('fecha_inicio')
+    fecha_fin = params.get('fecha_fin')
+    if fecha_inicio:
+        filtros['fecha_inicio'] = fecha_inicio
+    if fecha_fin:
+        filtros['fecha_fin'] = fecha_fin
+
+    # Año y mes
+    anio = params.get('anio')
+    mes = params.get('mes')
+    if anio:
+        filtros['anio'] = anio
+    if mes:
+        filtros['mes'] = mes
+
+    # Divisa
+    divisa_id = params.get('divisa_extranjera')
+    if divisa_id:
+        try:
+            divisa = Divisa.objects.get(id=divisa_id)
+            filtros['divisa_nombre'] = f"{divisa.codigo} - {divisa.nombre}"
+        except (Divisa.DoesNotExist, ValueError):
+            pass
+
+    # Operación
+    operacion = params.get('operacion')
+    if operacion:
+        filtros['operacion'] = operacion
+
+    # Método financiero
+    metodo_id = params.get('metodo_financiero')
+    if metodo_id:
+        try:
+            metodo = MetodoFinanciero.objects.get(id=metodo_id)
+            filtros['metodo_nombre'] = metodo.nombre
+        except (MetodoFinanciero.DoesNotExist, ValueError):
+            pass
+
+    # Granularidad
+    granularidad = params.get('granularidad')
+    if granularidad:
+        filtros['granularidad'] = granularidad
+
+    return filtros
+
+
+def filtrar_resumen(params):
+    """
+    Retorna el resumen diario filtrado con los mismos parámetros que
+    acepta el listado de ganancias.
+
+    Parámetros:
+    - fecha_inicio / fecha_fin: Rango de fechas (YYYY-MM-DD)
+    - divisa_extranjera, metodo_financiero: IDs
+    - operacion: 'compra' o 'venta'
+    - anio, mes: Año y mes de la operación
+    """
+    queryset = filtrar_por_fechas(GananciaDiaria.objects.all(), params)
+
+    filtros_numericos = {
+        'divisa_extranjera': 'divisa_extranjera_id',
+        'metodo_financiero': 'metodo_financiero_id',
+        'anio': 'fecha__year',
+        'mes': 'fecha__month',
+    }
+    for param, campo in filtros_numericos.items():
+        valor = params.get(param)
+        if not valor:
+            continue
+        try:
+            queryset = queryset.filter(**{campo: int(valor)})
+        except ValueError:
+            raise ValidationError({param: ["Debe ser un número entero."]})
+
+    operacion = params.get('operacion')
+    if operacion:
+        queryset = queryset.filter(operacion=operacion)
+
+    return queryset
+
+
+def promedio(total, cantidad):
+    """Ganancia promedio a partir de los acumulados del resumen."""
+    if not cantidad:
+        return None
+    return (total / cantidad).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def agrupar_resumen(queryset, *campos, **alias):
+    """
+    Agrupa el resumen diario y calcula total, cantidad y promedio.
+
+    Returns:
+        list de dicts con los campos de agrupación y los acumulados.
+    """
+    filas = queryset.values(*campos, **alias).annotate(
+        suma_ganancia=Sum('total_ganancia'),
+        suma_operaciones=Sum('cantidad_operaciones'),
+        suma_monto=Sum('monto_total_operado'),
+    )
+    return [
+        {
+            **{campo: fila[campo] for campo in (*campos, *alias)},
+            'total_ganancia': fila['suma_ganancia'],
+            'cantidad_operaciones': fila['suma_operaciones'],
+            'monto_total_operado': fila['suma_monto'],
+            'ganancia_promedio': promedio(
+                fila['suma_ganancia'], fila['suma_operaciones']),
+        }
+        for fila in filas
+    ]
+
+
+def calcular_metricas(queryset):
+    """
+    Calcula en un solo ``aggregate()`` todas las medidas del resumen.
+
+    Los totales por operación se obtienen con agregaciones condicionales
+    (``filter=Q(...)``), por lo que la tabla se recorre una única vez.
+    """
+    agregados = {
+        'suma_ganancia': Sum('total_ganancia'),
+        'suma_operaciones': Sum('cantidad_operaciones'),
+        'maxima': Max('ganancia_maxima'),
+        'minima': Min('ganancia_minima'),
+        'fecha_inicio': Min('fecha'),
+        'fecha_fin': Max('fecha'),
+    }
+    for operacion in ('compra', 'venta'):
+        filtro = Q(operacion=operacion)
+        agregados[f'{operacion}_total'] = Sum('total_ganancia', filter=filtro)
+        agregados[f'{operacion}_cantidad'] = Sum(
+            'cantidad_operaciones', filter=filtro)
+
+    stats = queryset.aggregate(**agregados)
+    for campo in ('suma_ganancia', 'maxima', 'minima', 'compra_total', 'venta_total'):
+        stats[campo] = stats[campo] or Decimal('0')
+    for campo in ('suma_operaciones', 'compra_cantidad', 'venta_cantidad'):
+        stats[campo] = stats[campo] or 0
+    return stats
+
+
+def parametros_cache(params, *excluir):
+    """Filtros normalizados que identifican un reporte en la cache."""
+    parametros = normalizar_parametros(params)
+    for clave in excluir:
+        parametros.pop(clave, None)
+    return parametros
+
+
+def metricas_resumen(params):
+    """
+    Métricas del resumen diario para los filtros dados, cacheadas por
+    (hash de filtros, marca de agua).
+
+    El reporte general, las estadísticas, la comparativa y su exportación
+    comparten así un único recorrido del resumen mientras no cambien los
+    datos.
+    """
+    queryset = filtrar_resumen(params)
+    return ReporteCache.obtener(
+        'metricas', parametros_cache(params, 'granularidad'),
+        lambda: calcular_metricas(queryset))
+
+
+def reporte_por_divisa(params):
+    """Ganancias por divisa, cacheadas por filtros y marca de agua."""
+    queryset = filtrar_resumen(params)
+    return ReporteCache.obtener(
+        'por_divisa', parametros_cache(params, 'granularidad'),
+        lambda: datos_por_divisa(queryset))
+
+
+def reporte_por_metodo(params):
+    """Ganancias por método financiero, cacheadas por filtros y marca de agua."""
+    queryset = filtrar_resumen(params)
+    return ReporteCache.obtener(
+        'por_metodo', parametros_cache(params, 'granularidad'),
+        lambda: datos_por_metodo(queryset))
+
+
+def reporte_evolucion(params):
+    """Evolución temporal, cacheada por filtros (incluida la granularidad)."""
+    queryset = filtrar_resumen(params)
+    granularidad = params.get('granularidad', 'mes')
+    return ReporteCache.obtener(
+        'evolucion', parametros_cache(params),
+        lambda: datos_evolucion(queryset, granularidad))
+
+
+def datos_reporte_general(metricas):
+    """Resumen general a partir de las métricas del resumen."""
+    return {
+        'total_ganancia': metricas['suma_ganancia'],
+        'cantidad_operaciones': metricas['suma_operaciones'],
+        'ganancia_promedio': promedio(
+            metricas['suma_ganancia'], metricas['suma_operaciones']) or Decimal('0'),
+        'ganancia_maxima': metricas['maxima'],
+        'ganancia_minima': metricas['minima'],
+    }
+
+
+def datos_estadisticas(metricas):
+    """Estadísticas generales a partir de las métricas del resumen."""
+    return {
+        'total_ganancia': metricas['suma_ganancia'],
+        'total_operaciones': metricas['suma_operaciones'],
+        'ganancia_promedio_operacion': promedio(
+            metricas['suma_ganancia'], metricas['suma_operaciones']) or Decimal('0'),
+        'ganancia_maxima': metricas['maxima'],
+        'ganancia_minima': metricas['minima'],
+        'operaciones_compra': metricas['compra_cantidad'],
+        'operaciones_venta': metricas['venta_cantidad'],
+        'ganancia_compra': metricas['compra_total'],
+        'ganancia_venta': metricas['venta_total'],
+        'fecha_inicio': metricas['fecha_inicio'],
+        'fecha_fin': metricas['fecha_fin'],
+    }
+
+
+def datos_comparativa(metricas):
+    """Comparativa compra/venta a partir de las métricas del resumen."""
+    total_general = metricas['compra_total'] + metricas['venta_total']
+
+    data = {}
+    for operacion in ('compra', 'venta'):
+        total = metricas[f'{operacion}_total']
+        cantidad = metricas[f'{operacion}_cantidad']
+        data[operacion] = {
+            'total_ganancia': total,
+            'cantidad_operaciones': cantidad,
+            'ganancia_promedio': promedio(total, cantidad),
+            'porcentaje_total': (
+                float((total / total_general) * 100) if total_general > 0 else 0
+            ),
+        }
+    return data
+
+
+def datos_por_divisa(queryset):
+    """Ganancias agrupadas por divisa, ordenadas por total descendente."""
+    filas = agrupar_resumen(
+        queryset,
+        divisa_codigo=F('divisa_extranjera__codigo'),
+        divisa_nombre=F('divisa_extranjera__nombre'),
+    )
+    return sorted(filas, key=lambda fila: fila['total_ganancia'], reverse=True)
+
+
+def datos_por_metodo(queryset):
+    """Ganancias agrupadas por método financiero, ordenadas por total descendente."""
+    filas = sorted(
+        agrupar_resumen(
+            queryset,
+            metodo_nombre=F('metodo_financiero__nombre'),
+            # TODO: usar get_nombre_display
+            metodo_display=F('metodo_financiero__nombre'),
+        ),
+        key=lambda fila: fila['total_ganancia'],
+        reverse=True,
+    )
+
+    # Manejar casos donde metodo_financiero es null
+    for item in filas:
+        if item['metodo_nombre'] is None:
+            item['metodo_nombre'] = 'SIN_METODO'
+            item['metodo_display'] = 'Sin método especificado'
+    return filas
+
+
+def datos_evolucion(queryset, granularidad):
+    """Evolución temporal de ganancias por día o por mes."""
+    if granularidad == 'dia':
+        filas = sorted(
+            agrupar_resumen(queryset, 'fecha'),
+            key=lambda fila: fila['fecha'])
+        return [
+            {
+                'periodo': item['fecha'].strftime('%Y-%m-%d'),
+                'anio': item['fecha'].year,
+                'mes': item['fecha'].month,
+                'total_ganancia': item['total_ganancia'],
+                'cantidad_operaciones': item['cantidad_operaciones'],
+                'ganancia_promedio': item['ganancia_promedio'],
+            }
+            for item in filas
+        ]
+
+    filas = sorted(
+        agrupar_resumen(
+            queryset, anio=ExtractYear('fecha'), mes=ExtractMonth('fecha')),
+        key=lambda fila: (fila['anio'], fila['mes']))
+    return [
+        {
+            'periodo': f"{item['anio']}-{item['mes']:02d}",
+            'anio': item['anio'],
+            'mes': item['mes'],
+            'total_ganancia': item['total_ganancia'],
+            'cantidad_operaciones': item['cantidad_operaciones'],
+            'ganancia_promedio': item['ganancia_promedio'],
+        }
+        for item in filas
+    ]
+
+
+def filtrar_transacciones(queryset, params):
+    """Aplica los filtros de divisa, operación y método al listado."""
+    divisa_id = params.get('divisa_extranjera')
+    if divisa_id:
+        queryset = queryset.filter(divisa_extranjera_id=divisa_id)
+
+    operacion = params.get('operacion')
+    if operacion:
+        queryset = queryset.filter(operacion=operacion)
+
+    metodo_id = params.get('metodo_financiero')
+    if metodo_id:
+        queryset = queryset.filter(metodo_financiero_id=metodo_id)
+
+    return queryset
+
+
+def proyectar_transacciones(queryset):
+    """
+    Proyecta el listado de transacciones con ``values()``, ordenado por
+    fecha, ganancia e id descendentes, sin instanciar modelos.
+    """
+    return queryset.order_by('-fecha', '-ganancia_neta', '-id').values(
+        'id',
+        'transaccion_id',
+        'fecha',
+        'operacion',
+        'ganancia_neta',
+        'monto_divisa',
+        'tasa_aplicada',
+        divisa_codigo=F('divisa_extranjera__codigo'),
+        cliente_nombre=F('transaccion__cliente__nombre'),
+        metodo_nombre=F('metodo_financiero__nombre'),
+    )
+
+
+# ==================== ANALÍTICA DE MÁRGENES ====================
+
+PERCENTILES_MARGEN = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+class Percentil(Aggregate):
+    """Percentil continuo (``percentile_cont`` de PostgreSQL)."""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(percentil)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, percentil, **extra):
+        super().__init__(expression, percentil=float(percentil), **extra)
+
+
+class WidthBucket(Func):
+    """Intervalo (1..n) de un histograma de ``n`` intervalos entre dos límites."""
+    function = 'WIDTH_BUCKET'
+    output_field = IntegerField()
+
+
+def margen_porcentual():
+    """Expresión SQL equivalente a la propiedad ``Ganancia.porcentaje_margen``."""
+    return Case(
+        When(tasa_mercado=0, then=Value(0)),
+        default=Abs(F('tasa_aplicada') - F('tasa_mercado')) * 100 / F('tasa_mercado'),
+        output_field=DecimalField(max_digits=20, decimal_places=6),
+    )
+
+
+def distribucion_margen(queryset, intervalos):
+    """
+    Histograma del margen porcentual con ``intervalos`` de igual ancho
+    entre el margen mínimo y el máximo del conjunto.
+    """
+    limites = queryset.aggregate(
+        minimo=Min(margen_porcentual()), maximo=Max(margen_porcentual()))
+    minimo, maximo = limites['minimo'], limites['maximo']
+    if minimo is None:
+        return []
+    if minimo == maximo:
+        return [{'desde': minimo, 'hasta': maximo, 'cantidad': queryset.count()}]
+
+    # WIDTH_BUCKET asigna el máximo al intervalo n + 1; se lo incluye en el último
+    filas = (
+        queryset
+        .annotate(intervalo=Least(
+            WidthBucket(margen_porcentual(), Value(minimo), Value(maximo), Value(intervalos)),
+            Value(intervalos)))
+        .values('intervalo')
+        .annotate(cantidad=Count('id'))
+    )
+    cantidades = {fila['intervalo']: fila['cantidad'] for fila in filas}
+
+    ancho = (maximo - minimo) / intervalos
+    return [
+        {
+            'desde': round(minimo + ancho * (i - 1), 4),
+            'hasta': round(minimo + ancho * i, 4),
+            'cantidad': cantidades.get(i, 0),
+        }
+        for i in range(1, intervalos + 1)
+    ]
+
+
+def percentiles_margen_por_divisa(queryset):
+    """Percentiles del margen porcentual por divisa, en una sola consulta."""
+    agregados = {
+        f'p{round(p * 100)}': Percentil(margen_porcentual(), p) for p in PERCENTILES_MARGEN
+    }
+    filas = (
+        queryset
+        .values(
+            divisa_codigo=F('divisa_extranjera__codigo'),
+            divisa_nombre=F('divisa_extranjera__nombre'),
+        )
+        .annotate(cantidad=Count('id'), promedio=Avg(margen_porcentual()), **agregados)
+        .order_by('divisa_codigo')
+    )
+    return [
+        {
+            **fila,
+            'promedio': round(fila['promedio'], 4),
+            **{clave: round(fila[clave], 4) for clave in agregados},
+        }
+        for fila in filas
+    ]
+
+
+def spread_temporal(queryset, granularidad):
+    """
+    Diferencia entre la tasa aplicada y la de mercado por periodo y
+    operación: promedio, mínimo y máximo, en valor absoluto y porcentual.
+    """
+    truncar = TruncDay if granularidad == 'dia' else TruncMonth
+    formato = '%Y-%m-%d' if granularidad == 'dia' else '%Y-%m'
+    spread = F('tasa_aplicada') - F('tasa_mercado')
+    filas = (
+        queryset
+        .values('operacion', periodo=truncar('fecha'))
+        .annotate(
+            cantidad=Count('id'),
+            spread_promedio=Avg(spread),
+            spread_minimo=Min(spread),
+            spread_maximo=Max(spread),
+            margen_promedio=Avg(margen_porcentual()),
+        )
+        .order_by('periodo', 'operacion')
+    )
+    return [
+        {
+            **fila,
+            'periodo': fila['periodo'].strftime(formato),
+            'spread_promedio': round(fila['spread_promedio'], 4),
+            'margen_promedio': round(fila['margen_promedio'], 4),
+        }
+        for fila in filas
+    ]
+
+
+def analitica_margen(queryset, params):
+    """
+    Distribución, percentiles por divisa y spread temporal del margen,
+    calculados en la base de datos y memoizados por filtros y marca de agua.
+    """
+    try:
+        intervalos = min(max(int(params.get('intervalos', 10)), 1), 100)
+    except ValueError:
+        raise ValidationError({'intervalos': ["Debe ser un número entero."]})
+    granularidad = params.get('granularidad', 'mes')
+
+    parametros = normalizar_parametros(params)
+    parametros['intervalos'] = intervalos
+
+    def calcular():
+        return {
+            'distribucion': distribucion_margen(queryset, intervalos),
+            'percentiles_por_divisa': percentiles_margen_por_divisa(queryset),
+            'spread': spread_temporal(queryset, granularidad),
+        }
+
+    return ReporteCache.obtener('analitica_margen', parametros, calcular)
+
+
+def transacciones_exportables(params):
+    """
+    Queryset del listado de transacciones a exportar.
+
+    Tanto el Excel (write-only) como el PDF (tabla por bloques) se generan
+    recorriendo el cursor, por lo que no se limita el rango de fechas.
+    """
+    queryset = filtrar_por_fechas(Ganancia.objects.all(), params)
+    return proyectar_transacciones(filtrar_transacciones(queryset, params))
+
+
+# Columnas del CSV de transacciones: (encabezado, clave de proyectar_transacciones)
+COLUMNAS_CSV_TRANSACCIONES = (
+    ('id_transaccion', 'transaccion_id'),
+    ('fecha', 'fecha'),
+    ('cliente', 'cliente_nombre'),
+    ('divisa', 'divisa_codigo'),
+    ('operacion', 'operacion'),
+    ('monto_divisa', 'monto_divisa'),
+    ('tasa_aplicada', 'tasa_aplicada'),
+    ('metodo_pago', 'metodo_nombre'),
+    ('ganancia_neta', 'ganancia_neta'),
+)
+
+
+def exportar_transacciones_csv(params, comprimir=False):
+    """
+    Genera el CSV del listado de transacciones recorriendo el cursor.
+
+    Los valores se exportan sin formato (números con punto decimal, fechas
+    ISO) para que puedan procesarse directamente.
+
+    Returns:
+        tuple (generador de bytes, nombre_archivo)
+    """
+    claves = [clave for _, clave in COLUMNAS_CSV_TRANSACCIONES]
+    filas = (
+        [item[clave] for clave in claves]
+        for item in transacciones_exportables(params).iterator(
+            chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    contenido = stream_csv(
+        [encabezado for encabezado, _ in COLUMNAS_CSV_TRANSACCIONES],
+        filas,
+        comprimir=comprimir,
+    )
+
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+    extension = 'csv.gz' if comprimir else 'csv'
+    filename = f"{NOMBRES_ARCHIVO['transacciones']}_{timestamp}.{extension}"
+    return contenido, filename
+
+
+def _con_progreso(filas, progreso, cada=EXPORT_CHUNK_SIZE):
+    """Recorre ``filas`` informando a ``progreso`` cada ``cada`` filas."""
+    procesadas = 0
+    for fila in filas:
+        yield fila
+        procesadas += 1
+        if procesadas % cada == 0:
+            progreso(procesadas)
+    progreso(procesadas)
+
+
+def generar_exportacion(formato, reporte, params, progreso=None):
+    """
+    Genera el archivo de un reporte de ganancias.
+
+    Args:
+        formato: 'excel' o 'pdf'
+        reporte: Tipo de reporte ('general', 'por_divisa', 'evolucion', 'transacciones')
+        params: dict con los filtros del reporte
+        progreso: Callback opcional que recibe la cantidad de filas procesadas
+
+    Returns:
+        tuple (archivo, nombre_archivo) con el archivo posicionado al inicio
+
+    Raises:
+        ValueError: Si el formato o el tipo de reporte no son válidos
+    """
+    if formato not in CONTENT_TYPES:
+        raise ValueError(f"Formato de exportación no válido: {formato}")
+    if reporte not in REPORTES_EXPORTABLES:
+        raise ValueError("Tipo de reporte no válido")
+
+    excel = formato == 'excel'
+
+    if reporte == 'transacciones':
+        data = transacciones_exportables(params).iterator(
+            chunk_size=EXPORT_CHUNK_SIZE)
+        if progreso:
+            data = _con_progreso(data, progreso)
+    elif reporte == 'general':
+        data = datos_comparativa(metricas_resumen(params))
+    elif reporte == 'por_divisa':
+        data = reporte_por_divisa(params)
+    else:
+        data = reporte_evolucion(params)
+
+    exportadores = {
+        'general': (export_comparativa_to_excel, export_comparativa_to_pdf),
+        'por_divisa': (export_por_divisa_to_excel, export_por_divisa_to_pdf),
+        'evolucion': (export_evolucion_to_excel, export_evolucion_to_pdf),
+        'transacciones': (export_transacciones_to_excel, export_transacciones_to_pdf),
+    }
+    exportar_excel, exportar_pdf = exportadores[reporte]
+    if excel:
+        archivo = exportar_excel(data)
+    else:
+        archivo = exportar_pdf(data, build_filtros_info(params))
+
+    if progreso and reporte != 'transacciones':
+        progreso(len(data))
+
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'{NOMBRES_ARCHIVO[reporte]}_{timestamp}.{EXTENSIONES[formato]}'
+    return archivo, filename
+
+
+def normalizar_parametros(params):
+    """Conserva sólo los parámetros de reporte no vacíos, como strings."""
+    return {
+        clave: str(params.get(clave)).strip()
+        for clave in PARAMETROS_REPORTE
+        if params.get(clave) not in (None, '')
+    }
+
+
+def hash_filtros(formato, reporte, parametros):
+    """SHA-256 que identifica una exportación por formato, reporte y filtros."""
+    contenido = json.dumps(
+        {'formato': formato, 'reporte': reporte, 'parametros': parametros},
+        sort_keys=True,
+    )
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def vencer_exportaciones_colgadas(exportaciones=None) -> int:
+    """
+    Marca como fallidos los trabajos en curso sin avances recientes.
+
+    Args:
+        exportaciones: QuerySet opcional para acotar los trabajos revisados.
+
+    Returns:
+        int: Cantidad de trabajos marcados como fallidos.
+    """
+    ahora = timezone.now()
+    if exportaciones is None:
+        exportaciones = ExportacionReporte.objects.all()
+    return exportaciones.filter(
+        estado__in=[ExportacionReporte.ESTADO_PENDIENTE,
+                    ExportacionReporte.ESTADO_PROCESANDO],
+        updated_at__lt=ahora - EXPORTACION_SIN_AVANCE,
+    ).update(
+        estado=ExportacionReporte.ESTADO_ERROR,
+        error='La exportación no avanzó y se dio por fallida.',
+        finished_at=ahora,
+        updated_at=ahora,
+    )
+
+
+def solicitar_exportacion(usuario, formato, reporte, params):
+    """
+    Crea un trabajo de exportación o reutiliza uno idéntico en curso del
+    mismo usuario.
+
+    El trabajo se encola en Celery al confirmarse la transacción. Los
+    trabajos en curso sin avances recientes se dan por fallidos antes de
+    buscar uno reutilizable.
+
+    Returns:
+        tuple (ExportacionReporte, creado)
+
+    Raises:
+        ValueError: Si el formato o el tipo de reporte no son válidos
+    """
+    from .tasks import generar_exportacion_reporte
+
+    if formato not in CONTENT_TYPES:
+        raise ValueError(f"Formato de exportación no válido: {formato}")
+    if reporte not in REPORTES_EXPORTABLES:
+        raise ValueError("Tipo de reporte no válido")
+
+    parametros = normalizar_parametros(params)
+    filtro_hash = hash_filtros(formato, reporte, parametros)
+    del_usuario = ExportacionReporte.objects.filter(
+        solicitado_por=usuario, filtro_hash=filtro_hash)
+    en_curso = del_usuario.filter(
+        estado__in=[ExportacionReporte.ESTADO_PENDIENTE,
+                    ExportacionReporte.ESTADO_PROCESANDO],
+    )
+    vencer_exportaciones_colgadas(del_usuario)
+
+    for intento in range(INTENTOS_SOLICITUD):
+        existente = en_curso.first()
+        if existente:
+            return existente, False
+
+        try:
+            with transaction.atomic():
+                exportacion = ExportacionReporte.objects.create(
+                    solicitado_por=usuario,
+                    formato=formato,
+                    reporte=reporte,
+                    parametros=parametros,
+                    filtro_hash=filtro_hash,
+                )
+            break
+        except IntegrityError:
+            # Otra solicitud idéntica creó el trabajo en paralelo; puede
+            # haber terminado antes de leerlo, así que se vuelve a intentar
+            if intento == INTENTOS_SOLICITUD - 1:
+                raise
+
+    transaction.on_commit(
+        lambda: generar_exportacion_reporte.delay(exportacion.id))
+    return exportacion, True
+
+
+def procesar_exportacion(exportacion_id):
+    """
+    Genera el archivo de un trabajo de exportación y lo guarda en MEDIA_ROOT.
+
+    El trabajo se toma con un compare-and-set de 'pendiente' a 'procesando',
+    de modo que una tarea de Celery reentregada no lo genera dos veces.
+    Actualiza el avance a medida que se escriben las filas y, al terminar,
+    registra el hash SHA-256 del contenido sólo si el trabajo sigue en
+    'procesando' (no se dio por fallido mientras tanto).
+
+    Returns:
+        ExportacionReporte actualizado
+    """
+    exportacion = ExportacionReporte.objects.get(id=exportacion_id)
+    if exportacion.estado != ExportacionReporte.ESTADO_PENDIENTE:
+        return exportacion
+
+    params = exportacion.parametros
+    filas_totales = None
+    if exportacion.reporte == 'transacciones':
+        filas_totales = transacciones_exportables(params).count()
+
+    tomada = ExportacionReporte.objects.filter(
+        id=exportacion.id, estado=ExportacionReporte.ESTADO_PENDIENTE
+    ).update(estado=ExportacionReporte.ESTADO_PROCESANDO,
+             filas_totales=filas_totales, updated_at=timezone.now())
+    if not tomada:
+        exportacion.refresh_from_db()
+        return exportacion
+
+    def progreso(filas):
+        ExportacionReporte.objects.filter(id=exportacion.id).update(
+            filas_procesadas=filas, updated_at=timezone.now())
+
+    try:
+        archivo, filename = generar_exportacion(
+            exportacion.formato, exportacion.reporte, params, progreso=progreso)
+
+        sha256 = hashlib.sha256()
+        for bloque in iter(lambda: archivo.read(64 * 1024), b''):
+            sha256.update(bloque)
+        archivo.seek(0)
+
+        exportacion.archivo.save(filename, File(archivo), save=False)
+        valores = {
+            'estado': ExportacionReporte.ESTADO_COMPLETADO,
+            'archivo': exportacion.archivo.name,
+            'hash_contenido': sha256.hexdigest(),
+        }
+    except Exception as e:
+        logger.exception(f"Error al generar la exportación {exportacion.id}")
+        valores = {'estado': ExportacionReporte.ESTADO_ERROR, 'error': str(e)}
+
+    ahora = timezone.now()
+    terminada = ExportacionReporte.objects.filter(
+        id=exportacion.id, estado=ExportacionReporte.ESTADO_PROCESANDO
+    ).update(finished_at=ahora, updated_at=ahora, **valores)
+    if not terminada:
+        logger.warning(
+            f"La exportación {exportacion.id} dejó de estar en proceso antes de terminar")
+        if exportacion.archivo:
+            exportacion.archivo.delete(save=False)
+
+    exportacion.refresh_from_db()
+    return exportacion
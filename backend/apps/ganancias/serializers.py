@@ -5,7 +5,7 @@ Define la representación JSON de los modelos de ganancias
 y serializers especializados para reportes agregados.
 """
 from rest_framework import serializers
-from .models import Ganancia
+from .models import ExportacionReporte, Ganancia
 from apps.divisas.serializers import DivisaSerializer
 from apps.metodos_financieros.serializers import MetodoFinancieroSerializer
 
@@ -155,3 +155,38 @@ class EstadisticasGeneralesSerializer(serializers.Serializer):
     ganancia_venta = serializers.DecimalField(max_digits=15, decimal_places=2)
     fecha_inicio = serializers.DateField(allow_null=True)
     fecha_fin = serializers.DateField(allow_null=True)
+
+
+class ExportacionReporteSerializer(serializers.ModelSerializer):
+    """
+    Serializer para el estado de un trabajo de exportación de reportes.
+    """
+
+    progreso = serializers.FloatField(read_only=True)
+    url_descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportacionReporte
+        fields = [
+            'id',
+            'formato',
+            'reporte',
+            'parametros',
+            'estado',
+            'filas_procesadas',
+            'filas_totales',
+            'progreso',
+            'hash_contenido',
+            'error',
+            'url_descarga',
+            'created_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_url_descarga(self, obj):
+        if obj.estado != ExportacionReporte.ESTADO_COMPLETADO:
+            return None
+        url = f'/api/ganancias/exportaciones/{obj.id}/descargar/'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
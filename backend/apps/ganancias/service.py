@@ -4,11 +4,53 @@ Service layer para la gestión de cálculo y registro de ganancias.
 Contiene la lógica de negocio para calcular las ganancias generadas
 por cada transacción completada, con desglose detallado de componentes.
 """
-from decimal import Decimal
-from django.db import transaction
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import connection, models, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
 from apps.cotizaciones.models import Tasa
 from apps.operaciones.models import Transaccion
-from .models import Ganancia
+from .cache import ReporteCache
+from .models import Ganancia, GananciaDiaria
+
+
+# Campos de Transaccion necesarios para calcular una ganancia
+CAMPOS_CALCULO = (
+    'operacion',
+    'precio_base',
+    'tasa_aplicada',
+    'monto_origen',
+    'monto_destino',
+    'fecha_inicio',
+    'fecha_fin',
+    'metodo_financiero_id',
+    'divisa_origen_id',
+    'divisa_destino_id',
+    'divisa_origen__es_base',
+)
+
+# Campos de Ganancia que dependen de la transacción
+CAMPOS_RECALCULABLES = (
+    'ganancia_neta',
+    'divisa_extranjera_id',
+    'fecha',
+    'anio',
+    'mes',
+    'operacion',
+    'metodo_financiero_id',
+    'tasa_mercado',
+    'tasa_aplicada',
+    'monto_divisa',
+)
+
+# Escala de los campos decimales recalculables, para comparar un valor
+# calculado con el que guarda la columna (PostgreSQL redondea hacia arriba)
+ESCALAS_RECALCULABLES = {
+    campo: Decimal(1).scaleb(-Ganancia._meta.get_field(campo).decimal_places)
+    for campo in CAMPOS_RECALCULABLES
+    if isinstance(Ganancia._meta.get_field(campo), models.DecimalField)
+}
 
 
 class GananciaService:
@@ -28,6 +70,29 @@ class GananciaService:
             return transaccion.divisa_origen
         return transaccion.divisa_destino
 
+    @staticmethod
+    def _calcular_margen(operacion, tasa_mercado, tasa_aplicada,
+                         monto_origen, monto_destino):
+        """
+        Calcula el monto en divisa extranjera y la ganancia de una operación.
+
+        Returns:
+            tuple (monto_divisa, ganancia_neta)
+        """
+        if operacion == 'compra':
+            # Casa COMPRA: monto_origen es la divisa extranjera que entrega el cliente
+            monto_divisa = monto_origen
+            # Margen = (Tasa Mercado - Tasa Pagada Cliente) * Monto
+            margen_unitario = tasa_mercado - tasa_aplicada
+        else:  # venta
+            # Casa VENDE: monto_destino es la divisa extranjera que recibe el cliente
+            monto_divisa = monto_destino
+            # Margen = (Tasa Cobrada Cliente - Tasa Mercado) * Monto
+            margen_unitario = tasa_aplicada - tasa_mercado
+
+        # Ganancia total por la operación
+        return monto_divisa, margen_unitario * monto_divisa
+
     @staticmethod
     def calcular_ganancia_transaccion(transaccion: Transaccion) -> dict:
         """
@@ -70,20 +135,13 @@ class GananciaService:
         tasa_mercado = transaccion.precio_base
         tasa_aplicada = transaccion.tasa_aplicada
 
-        # Determinar monto en divisa extranjera según operación
-        if transaccion.operacion == 'compra':
-            # Casa COMPRA: monto_origen es la divisa extranjera que entrega el cliente
-            monto_divisa = transaccion.monto_origen
-            # Margen = (Tasa Mercado - Tasa Pagada Cliente) * Monto
-            margen_unitario = tasa_mercado - tasa_aplicada
-        else:  # venta
-            # Casa VENDE: monto_destino es la divisa extranjera que recibe el cliente
-            monto_divisa = transaccion.monto_destino
-            # Margen = (Tasa Cobrada Cliente - Tasa Mercado) * Monto
-            margen_unitario = tasa_aplicada - tasa_mercado
-
-        # Ganancia total por la operación
-        ganancia_neta = margen_unitario * monto_divisa
+        monto_divisa, ganancia_neta = GananciaService._calcular_margen(
+            transaccion.operacion,
+            tasa_mercado,
+            tasa_aplicada,
+            transaccion.monto_origen,
+            transaccion.monto_destino,
+        )
 
         return {
             'ganancia_neta': ganancia_neta,
@@ -140,4 +198,275 @@ class GananciaService:
             monto_divisa=datos['monto_divisa'],
         )
 
+        GananciaService.acumular_ganancia_diaria(ganancia)
+        ReporteCache.invalidar()
+
         return ganancia
+
+    @staticmethod
+    def acumular_ganancia_diaria(ganancia: Ganancia) -> None:
+        """
+        Suma una ganancia al resumen diario con un único upsert atómico.
+
+        Si la fila del día para (divisa, operación, método) no existe se crea;
+        si existe, los acumulados se actualizan en la base de datos, por lo que
+        registros concurrentes no pierden actualizaciones.
+        """
+        tabla = GananciaDiaria._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {tabla} AS r
+                    (fecha, divisa_extranjera_id, operacion, metodo_financiero_id,
+                     total_ganancia, cantidad_operaciones, monto_total_operado,
+                     ganancia_maxima, ganancia_minima)
+                VALUES (%s, %s, %s, %s, %s, 1, %s, %s, %s)
+                ON CONFLICT (fecha, divisa_extranjera_id, operacion, metodo_financiero_id)
+                DO UPDATE SET
+                    total_ganancia = r.total_ganancia + EXCLUDED.total_ganancia,
+                    cantidad_operaciones = r.cantidad_operaciones + 1,
+                    monto_total_operado = r.monto_total_operado + EXCLUDED.monto_total_operado,
+                    ganancia_maxima = GREATEST(r.ganancia_maxima, EXCLUDED.ganancia_maxima),
+                    ganancia_minima = LEAST(r.ganancia_minima, EXCLUDED.ganancia_minima)
+            """, [
+                ganancia.fecha,
+                ganancia.divisa_extranjera_id,
+                ganancia.operacion,
+                ganancia.metodo_financiero_id,
+                ganancia.ganancia_neta,
+                ganancia.monto_divisa,
+                ganancia.ganancia_neta,
+                ganancia.ganancia_neta,
+            ])
+        ReporteCache.invalidar()
+
+    @staticmethod
+    @transaction.atomic
+    def reconstruir_ganancia_diaria(desde=None, hasta=None) -> int:
+        """
+        Recalcula el resumen diario desde la tabla Ganancia.
+
+        Bloquea el resumen contra upserts concurrentes, elimina las filas del
+        rango y las vuelve a generar con un único ``INSERT ... SELECT``.
+
+        Args:
+            desde: Fecha inicial inclusive (opcional).
+            hasta: Fecha final inclusive (opcional).
+
+        Returns:
+            int: Cantidad de filas de resumen generadas.
+        """
+        tabla = GananciaDiaria._meta.db_table
+        condiciones = []
+        params = []
+        if desde:
+            condiciones.append("fecha >= %s")
+            params.append(desde)
+        if hasta:
+            condiciones.append("fecha <= %s")
+            params.append(hasta)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {tabla} IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(f"DELETE FROM {tabla} {where}", params)
+            cursor.execute(f"""
+                INSERT INTO {tabla}
+                    (fecha, divisa_extranjera_id, operacion, metodo_financiero_id,
+                     total_ganancia, cantidad_operaciones, monto_total_operado,
+                     ganancia_maxima, ganancia_minima)
+                SELECT fecha, divisa_extranjera_id, operacion, metodo_financiero_id,
+                       SUM(ganancia_neta), COUNT(*), SUM(monto_divisa),
+                       MAX(ganancia_neta), MIN(ganancia_neta)
+                FROM {Ganancia._meta.db_table}
+                {where}
+                GROUP BY fecha, divisa_extranjera_id, operacion, metodo_financiero_id
+            """, params)
+            generadas = cursor.rowcount
+
+        ReporteCache.invalidar()
+        return generadas
+
+    @staticmethod
+    def _ganancia_desde_valores(transaccion_id, valores, prefijo='') -> Ganancia:
+        """
+        Construye (sin guardar) la Ganancia de una transacción a partir de
+        una fila de ``values()`` con los campos de ``CAMPOS_CALCULO``.
+        """
+        def valor(campo):
+            return valores[prefijo + campo]
+
+        monto_divisa, ganancia_neta = GananciaService._calcular_margen(
+            valor('operacion'),
+            valor('precio_base'),
+            valor('tasa_aplicada'),
+            valor('monto_origen'),
+            valor('monto_destino'),
+        )
+        fecha = (valor('fecha_fin') or valor('fecha_inicio')).date()
+        divisa_extranjera_id = (
+            valor('divisa_destino_id') if valor('divisa_origen__es_base')
+            else valor('divisa_origen_id')
+        )
+
+        return Ganancia(
+            transaccion_id=transaccion_id,
+            ganancia_neta=ganancia_neta,
+            divisa_extranjera_id=divisa_extranjera_id,
+            fecha=fecha,
+            anio=fecha.year,
+            mes=fecha.month,
+            operacion=valor('operacion'),
+            metodo_financiero_id=valor('metodo_financiero_id'),
+            tasa_mercado=valor('precio_base'),
+            tasa_aplicada=valor('tasa_aplicada'),
+            monto_divisa=monto_divisa,
+        )
+
+    @staticmethod
+    def transacciones_sin_ganancia(desde=None, hasta=None):
+        """
+        Transacciones completadas que no tienen Ganancia registrada.
+
+        Usa ``NOT EXISTS``, que PostgreSQL resuelve como anti-join. El rango
+        se aplica sobre la fecha de finalización (o de inicio), con los mismos
+        límites de día que usa ``registrar_ganancia``.
+        """
+        queryset = Transaccion.objects.filter(estado='completada').filter(
+            ~Exists(Ganancia.objects.filter(transaccion_id=OuterRef('pk')))
+        ).alias(fecha_ganancia=Coalesce('fecha_fin', 'fecha_inicio'))
+        if desde:
+            inicio = datetime.combine(desde, time.min, tzinfo=dt_timezone.utc)
+            queryset = queryset.filter(fecha_ganancia__gte=inicio)
+        if hasta:
+            fin = datetime.combine(hasta + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+            queryset = queryset.filter(fecha_ganancia__lt=fin)
+        return queryset
+
+    @staticmethod
+    def backfill_ganancias(desde=None, hasta=None, batch_size=1000,
+                           recalcular=False, reconstruir_resumen=True) -> dict:
+        """
+        Registra en lote las ganancias faltantes y, opcionalmente, recalcula
+        las existentes.
+
+        Las transacciones se leen por lotes con ``values()`` recorriendo el id
+        (sin OFFSET) y se insertan con ``ON CONFLICT DO NOTHING``, por lo que
+        un ``registrar_ganancia`` concurrente no produce errores ni
+        duplicados. Al terminar se reconstruye el resumen diario del rango.
+
+        Args:
+            desde: Fecha inicial inclusive (opcional).
+            hasta: Fecha final inclusive (opcional).
+            batch_size: Cantidad de filas por lote.
+            recalcular: Si es True, recalcula también las ganancias existentes.
+            reconstruir_resumen: Si es False no se toca el resumen diario
+                (lo hace quien coordina varios rangos).
+
+        Returns:
+            dict con las claves 'creadas' y 'actualizadas'.
+        """
+        resultado = {'creadas': 0, 'actualizadas': 0}
+
+        pendientes = GananciaService.transacciones_sin_ganancia(desde, hasta)
+        ultimo_id = 0
+        while True:
+            lote = list(
+                pendientes.filter(id__gt=ultimo_id)
+                .order_by('id')
+                .values('id', *CAMPOS_CALCULO)[:batch_size]
+            )
+            if not lote:
+                break
+            ultimo_id = lote[-1]['id']
+            ganancias = [
+                GananciaService._ganancia_desde_valores(fila['id'], fila)
+                for fila in lote
+            ]
+            resultado['creadas'] += GananciaService._insertar_ganancias(ganancias)
+
+        if recalcular:
+            resultado['actualizadas'] = GananciaService._recalcular_ganancias(
+                desde, hasta, batch_size)
+
+        if reconstruir_resumen and (resultado['creadas'] or resultado['actualizadas']):
+            GananciaService.reconstruir_ganancia_diaria(desde, hasta)
+
+        return resultado
+
+    @staticmethod
+    def _insertar_ganancias(ganancias) -> int:
+        """
+        Inserta las ganancias omitiendo las transacciones que ya tienen una.
+
+        Returns:
+            int: Cantidad de filas efectivamente insertadas.
+        """
+        if not ganancias:
+            return 0
+
+        campos = [campo for campo in Ganancia._meta.concrete_fields
+                  if not campo.primary_key]
+        columnas = ', '.join(connection.ops.quote_name(campo.column) for campo in campos)
+        fila = f"({', '.join(['%s'] * len(campos))})"
+        params = [
+            campo.get_db_prep_save(campo.pre_save(ganancia, add=True), connection)
+            for ganancia in ganancias
+            for campo in campos
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {Ganancia._meta.db_table} ({columnas})
+                VALUES {', '.join([fila] * len(ganancias))}
+                ON CONFLICT DO NOTHING
+            """, params)
+            return cursor.rowcount
+
+    @staticmethod
+    def _recalcular_ganancias(desde, hasta, batch_size) -> int:
+        """
+        Recalcula las ganancias existentes del rango desde su transacción y
+        actualiza con ``bulk_update`` sólo las que cambiaron. Los valores
+        calculados se redondean a la escala de su columna antes de comparar.
+
+        Returns:
+            int: Cantidad de ganancias actualizadas.
+        """
+        queryset = Ganancia.objects.all()
+        if desde:
+            queryset = queryset.filter(fecha__gte=desde)
+        if hasta:
+            queryset = queryset.filter(fecha__lte=hasta)
+
+        campos_transaccion = [f'transaccion__{campo}' for campo in CAMPOS_CALCULO]
+        actualizadas = 0
+        ultimo_id = 0
+        while True:
+            lote = list(
+                queryset.filter(id__gt=ultimo_id)
+                .order_by('id')
+                .values('id', 'transaccion_id', *CAMPOS_RECALCULABLES, *campos_transaccion)
+                [:batch_size]
+            )
+            if not lote:
+                break
+            ultimo_id = lote[-1]['id']
+
+            cambiadas = []
+            for fila in lote:
+                ganancia = GananciaService._ganancia_desde_valores(
+                    fila['transaccion_id'], fila, prefijo='transaccion__')
+                for campo, escala in ESCALAS_RECALCULABLES.items():
+                    setattr(ganancia, campo, getattr(ganancia, campo).quantize(
+                        escala, rounding=ROUND_HALF_UP))
+                if any(getattr(ganancia, campo) != fila[campo]
+                       for campo in CAMPOS_RECALCULABLES):
+                    ganancia.id = fila['id']
+                    cambiadas.append(ganancia)
+
+            campos = [campo.removesuffix('_id') for campo in CAMPOS_RECALCULABLES]
+            Ganancia.objects.bulk_update(cambiadas, campos)
+            actualizadas += len(cambiadas)
+
+        if actualizadas:
+            ReporteCache.invalidar()
+        return actualizadas
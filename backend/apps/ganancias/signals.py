@@ -0,0 +1,36 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from apps.operaciones.models import Transaccion
+from apps.operaciones.transiciones import TransicionTransaccion, transaccion_transicionada
+
+from .cache import ReporteCache
+from .models import Ganancia
+from .service import GananciaService
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(transaccion_transicionada, sender=Transaccion)
+def registrar_ganancia_al_completar(sender, evento: TransicionTransaccion, **kwargs):
+    """Registra la ganancia de una transacción al pasar a 'completada'."""
+    if evento.estado_nuevo != 'completada':
+        return
+
+    try:
+        # Savepoint: un error de base de datos no invalida la transición
+        with transaction.atomic():
+            GananciaService.registrar_ganancia(evento.transaccion)
+    except Exception as e:
+        # Log error pero no fallar la transacción
+        logger.error(
+            f"Error al registrar ganancia para transacción {evento.transaccion.id}: {str(e)}")
+
+
+@receiver(post_delete, sender=Ganancia)
+def invalidar_reportes_al_eliminar(sender, instance, **kwargs):
+    """Las ganancias eliminadas dejan de figurar en los reportes cacheados."""
+    ReporteCache.invalidar()
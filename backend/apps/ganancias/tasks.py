@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from .reportes import procesar_exportacion
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def generar_exportacion_reporte(exportacion_id):
+    logger.info(f"Generando exportación de reporte {exportacion_id}...")
+
+    exportacion = procesar_exportacion(exportacion_id)
+
+    logger.info(f"Exportación {exportacion_id} finalizada con estado {exportacion.estado}")
+
+    return exportacion.estado
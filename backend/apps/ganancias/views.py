@@ -5,17 +5,18 @@ Proporciona ViewSet de solo lectura con múltiples endpoints
 para consultar y analizar ganancias del negocio.
 """
 from decimal import Decimal
-from datetime import timedelta
-from django.db.models import Sum, Avg, Max, Min, Count, F
-from django.utils import timezone
 from django.utils.dateparse import parse_date
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, permission_classes as action_permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import ValidationError
 
-from .models import Ganancia
+from globalexchange.pagination import KeysetPagination
+
+from .cache import ReporteCache
+from .models import ExportacionReporte, Ganancia
 from .serializers import (
     GananciaSerializer,
     GananciaResumenSerializer,
@@ -24,19 +25,41 @@ from .serializers import (
     GananciaEvolucionTemporalSerializer,
     GananciaTransaccionSerializer,
     EstadisticasGeneralesSerializer,
+    ExportacionReporteSerializer,
 )
-from .export_utils import (
-    export_comparativa_to_excel,
-    export_comparativa_to_pdf,
-    export_por_divisa_to_excel,
-    export_por_divisa_to_pdf,
-    export_evolucion_to_excel,
-    export_evolucion_to_pdf,
-    export_transacciones_to_excel,
-    export_transacciones_to_pdf,
+from .reportes import (
+    CONTENT_TYPES,
+    REPORTES_EXPORTABLES,
+    analitica_margen,
+    datos_comparativa,
+    datos_estadisticas,
+    datos_reporte_general,
+    exportar_transacciones_csv,
+    filtrar_por_fechas,
+    filtrar_transacciones,
+    generar_exportacion,
+    metricas_resumen,
+    proyectar_transacciones,
+    reporte_evolucion,
+    reporte_por_divisa,
+    reporte_por_metodo,
+    solicitar_exportacion,
+    vencer_exportaciones_colgadas,
 )
 
 
+class GananciaListadoPagination(KeysetPagination):
+    """
+    Paginación por cursor del listado de transacciones, ordenado por
+    (fecha, ganancia_neta, id) descendentes.
+    """
+    ordenamiento = (
+        ('-fecha', parse_date),
+        ('-ganancia_neta', Decimal),
+        ('-id', int),
+    )
+
+
 class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet de solo lectura para consultar ganancias.
@@ -51,9 +74,14 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
     - GET /api/ganancias/por_divisa/ - Ganancias agrupadas por divisa
     - GET /api/ganancias/por_metodo/ - Ganancias agrupadas por método de pago
     - GET /api/ganancias/evolucion_temporal/ - Evolución mensual de ganancias
-    - GET /api/ganancias/listado_transacciones/ - Listado de transacciones (max 30 días)
+    - GET /api/ganancias/listado_transacciones/ - Listado de transacciones paginado por cursor
     - GET /api/ganancias/estadisticas/ - Estadísticas generales del periodo
     - GET /api/ganancias/comparativa_operaciones/ - Comparativa compra vs venta
+    - GET /api/ganancias/analitica_margen/ - Distribución y percentiles del margen
+    - GET /api/ganancias/cache_reportes/ - Aciertos y fallos de la cache de reportes
+    - POST /api/ganancias/exportaciones/ - Solicitar una exportación en segundo plano
+    - GET /api/ganancias/exportaciones/{id}/ - Estado de una exportación
+    - GET /api/ganancias/exportaciones/{id}/descargar/ - Descargar el archivo generado
     """
 
     queryset = Ganancia.objects.select_related(
@@ -79,81 +107,7 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
         - fecha_inicio: Fecha de inicio (YYYY-MM-DD)
         - fecha_fin: Fecha de fin (YYYY-MM-DD)
         """
-        queryset = super().get_queryset()
-
-        # Filtros por fecha
-        fecha_inicio = self.request.query_params.get('fecha_inicio')
-        fecha_fin = self.request.query_params.get('fecha_fin')
-
-        if fecha_inicio:
-            fecha_inicio = parse_date(fecha_inicio)
-            if fecha_inicio:
-                queryset = queryset.filter(fecha__gte=fecha_inicio)
-
-        if fecha_fin:
-            fecha_fin = parse_date(fecha_fin)
-            if fecha_fin:
-                queryset = queryset.filter(fecha__lte=fecha_fin)
-
-        return queryset
-
-    def _build_filtros_info(self, request):
-        """
-        Construye un diccionario con la información de filtros aplicados.
-        
-        Returns:
-            dict con información legible de los filtros
-        """
-        from apps.divisas.models import Divisa
-        from apps.metodos_financieros.models import MetodoFinanciero
-        
-        filtros = {}
-        
-        # Fechas
-        fecha_inicio = request.query_params.get('fecha_inicio')
-        fecha_fin = request.query_params.get('fecha_fin')
-        if fecha_inicio:
-            filtros['fecha_inicio'] = fecha_inicio
-        if fecha_fin:
-            filtros['fecha_fin'] = fecha_fin
-        
-        # Año y mes
-        anio = request.query_params.get('anio')
-        mes = request.query_params.get('mes')
-        if anio:
-            filtros['anio'] = anio
-        if mes:
-            filtros['mes'] = mes
-        
-        # Divisa
-        divisa_id = request.query_params.get('divisa_extranjera')
-        if divisa_id:
-            try:
-                divisa = Divisa.objects.get(id=divisa_id)
-                filtros['divisa_nombre'] = f"{divisa.codigo} - {divisa.nombre}"
-            except Divisa.DoesNotExist:
-                pass
-        
-        # Operación
-        operacion = request.query_params.get('operacion')
-        if operacion:
-            filtros['operacion'] = operacion
-        
-        # Método financiero
-        metodo_id = request.query_params.get('metodo_financiero')
-        if metodo_id:
-            try:
-                metodo = MetodoFinanciero.objects.get(id=metodo_id)
-                filtros['metodo_nombre'] = metodo.nombre
-            except MetodoFinanciero.DoesNotExist:
-                pass
-        
-        # Granularidad
-        granularidad = request.query_params.get('granularidad')
-        if granularidad:
-            filtros['granularidad'] = granularidad
-        
-        return filtros
+        return filtrar_por_fechas(super().get_queryset(), self.request.query_params)
 
     @action(detail=False, methods=['get'])
     def reporte_general(self, request):
@@ -175,20 +129,7 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
             "ganancia_minima": "1000.00"
         }
         """
-        queryset = self.filter_queryset(self.get_queryset())
-
-        stats = queryset.aggregate(
-            total_ganancia=Sum('ganancia_neta'),
-            cantidad_operaciones=Count('id'),
-            ganancia_promedio=Avg('ganancia_neta'),
-            ganancia_maxima=Max('ganancia_neta'),
-            ganancia_minima=Min('ganancia_neta'),
-        )
-
-        # Convertir None a 0 para campos numéricos
-        stats['total_ganancia'] = stats['total_ganancia'] or Decimal('0')
-        stats['ganancia_promedio'] = stats['ganancia_promedio'] or Decimal('0')
-        stats['cantidad_operaciones'] = stats['cantidad_operaciones'] or 0
+        stats = datos_reporte_general(metricas_resumen(request.query_params))
 
         serializer = GananciaResumenSerializer(data=stats)
         serializer.is_valid(raise_exception=True)
@@ -215,17 +156,7 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
             ...
         ]
         """
-        queryset = self.filter_queryset(self.get_queryset())
-
-        ganancias_por_divisa = queryset.values(
-            divisa_codigo=F('divisa_extranjera__codigo'),
-            divisa_nombre=F('divisa_extranjera__nombre')
-        ).annotate(
-            total_ganancia=Sum('ganancia_neta'),
-            cantidad_operaciones=Count('id'),
-            ganancia_promedio=Avg('ganancia_neta'),
-            monto_total_operado=Sum('monto_divisa'),
-        ).order_by('-total_ganancia')
+        ganancias_por_divisa = reporte_por_divisa(request.query_params)
 
         serializer = GananciaPorDivisaSerializer(
             ganancias_por_divisa, many=True)
@@ -250,23 +181,7 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
             ...
         ]
         """
-        queryset = self.filter_queryset(self.get_queryset())
-
-        ganancias_por_metodo = queryset.values(
-            metodo_nombre=F('metodo_financiero__nombre'),
-            # TODO: usar get_nombre_display
-            metodo_display=F('metodo_financiero__nombre')
-        ).annotate(
-            total_ganancia=Sum('ganancia_neta'),
-            cantidad_operaciones=Count('id'),
-            ganancia_promedio=Avg('ganancia_neta'),
-        ).order_by('-total_ganancia')
-
-        # Manejar casos donde metodo_financiero es null
-        for item in ganancias_por_metodo:
-            if item['metodo_nombre'] is None:
-                item['metodo_nombre'] = 'SIN_METODO'
-                item['metodo_display'] = 'Sin método especificado'
+        ganancias_por_metodo = reporte_por_metodo(request.query_params)
 
         serializer = GananciaPorMetodoSerializer(
             ganancias_por_metodo, many=True)
@@ -295,49 +210,7 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
             ...
         ]
         """
-        queryset = self.filter_queryset(self.get_queryset())
-        granularidad = request.query_params.get('granularidad', 'mes')
-
-        if granularidad == 'dia':
-            # Agrupar por día
-            evolucion = queryset.values('fecha').annotate(
-                total_ganancia=Sum('ganancia_neta'),
-                cantidad_operaciones=Count('id'),
-                ganancia_promedio=Avg('ganancia_neta'),
-            ).order_by('fecha')
-
-            # Formatear respuesta
-            data = [
-                {
-                    'periodo': item['fecha'].strftime('%Y-%m-%d'),
-                    'anio': item['fecha'].year,
-                    'mes': item['fecha'].month,
-                    'total_ganancia': item['total_ganancia'],
-                    'cantidad_operaciones': item['cantidad_operaciones'],
-                    'ganancia_promedio': item['ganancia_promedio'],
-                }
-                for item in evolucion
-            ]
-        else:
-            # Agrupar por mes (default)
-            evolucion = queryset.values('anio', 'mes').annotate(
-                total_ganancia=Sum('ganancia_neta'),
-                cantidad_operaciones=Count('id'),
-                ganancia_promedio=Avg('ganancia_neta'),
-            ).order_by('anio', 'mes')
-
-            # Formatear respuesta
-            data = [
-                {
-                    'periodo': f"{item['anio']}-{item['mes']:02d}",
-                    'anio': item['anio'],
-                    'mes': item['mes'],
-                    'total_ganancia': item['total_ganancia'],
-                    'cantidad_operaciones': item['cantidad_operaciones'],
-                    'ganancia_promedio': item['ganancia_promedio'],
-                }
-                for item in evolucion
-            ]
+        data = reporte_evolucion(request.query_params)
 
         serializer = GananciaEvolucionTemporalSerializer(data, many=True)
         return Response(serializer.data)
@@ -347,106 +220,61 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
         """
         GET /api/ganancias/listado_transacciones/
 
-        Retorna el listado de transacciones en un periodo de hasta 30 días.
+        Retorna el listado de transacciones paginado por cursor.
 
         Query params:
-        - fecha_inicio: Fecha de inicio (YYYY-MM-DD). Si no se especifica, usa últimos 30 días
-        - fecha_fin: Fecha de fin (YYYY-MM-DD). Si no se especifica, usa fecha actual
+        - fecha_inicio: Fecha de inicio (YYYY-MM-DD, opcional)
+        - fecha_fin: Fecha de fin (YYYY-MM-DD, opcional)
         - divisa_extranjera: ID de divisa (opcional)
         - operacion: 'compra' o 'venta' (opcional)
         - metodo_financiero: ID de método (opcional)
-
-        Restricciones:
-        - El rango de fechas no puede exceder 30 días
-        - Si no se especifica rango, se usa los últimos 30 días por defecto
+        - page_size: Filas por página (por defecto 50, máximo 500)
+        - cursor: Valor 'cursor' de la página anterior
 
         Response:
-        [
-            {
-                "transaccion_id": 123,
-                "fecha": "2024-01-15",
-                "divisa_codigo": "USD",
-                "operacion": "venta",
-                "ganancia_neta": "25000.00",
-                "monto_divisa": "500.00",
-                "tasa_aplicada": "7500.00",
-                "cliente_nombre": "Juan Pérez",
-                "metodo_nombre": "EFECTIVO"
-            },
-            ...
-        ]
+        {
+            "next": "http://.../listado_transacciones/?cursor=...",
+            "cursor": "WyIyMDI0LTAxLTE1IiwgIjI1MDAwLjAwIiwgMTIzXQ==",
+            "results": [
+                {
+                    "transaccion_id": 123,
+                    "fecha": "2024-01-15",
+                    "divisa_codigo": "USD",
+                    "operacion": "venta",
+                    "ganancia_neta": "25000.00",
+                    "monto_divisa": "500.00",
+                    "tasa_aplicada": "7500.00",
+                    "cliente_nombre": "Juan Pérez",
+                    "metodo_nombre": "EFECTIVO"
+                },
+                ...
+            ]
+        }
         """
-        # Obtener fechas del request
-        fecha_inicio_str = request.query_params.get('fecha_inicio')
-        fecha_fin_str = request.query_params.get('fecha_fin')
-        
-        # Si no se especifican fechas, usar últimos 30 días por defecto
-        if not fecha_inicio_str or not fecha_fin_str:
-            fecha_fin = timezone.now().date()
-            fecha_inicio = fecha_fin - timedelta(days=30)
-        else:
-            fecha_inicio = parse_date(fecha_inicio_str)
-            fecha_fin = parse_date(fecha_fin_str)
-            
-            if not fecha_inicio or not fecha_fin:
-                return Response(
-                    {"error": "Formato de fecha inválido. Use YYYY-MM-DD"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        
-        # Validar que el rango no exceda 30 días
-        delta = (fecha_fin - fecha_inicio).days
-        if delta > 30:
-            return Response(
-                {"error": "El rango de fechas no puede exceder 30 días"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if delta < 0:
+        fechas = {}
+        for campo in ('fecha_inicio', 'fecha_fin'):
+            valor = request.query_params.get(campo)
+            if valor:
+                fechas[campo] = parse_date(valor)
+                if not fechas[campo]:
+                    return Response(
+                        {"error": "Formato de fecha inválido. Use YYYY-MM-DD"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+        if len(fechas) == 2 and fechas['fecha_inicio'] > fechas['fecha_fin']:
             return Response(
                 {"error": "La fecha de inicio debe ser anterior a la fecha de fin"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Filtrar por rango de fechas
-        queryset = self.get_queryset().filter(
-            fecha__gte=fecha_inicio,
-            fecha__lte=fecha_fin
-        )
-        
-        # Aplicar filtros adicionales
-        divisa_id = request.query_params.get('divisa_extranjera')
-        if divisa_id:
-            queryset = queryset.filter(divisa_extranjera_id=divisa_id)
-        
-        operacion = request.query_params.get('operacion')
-        if operacion:
-            queryset = queryset.filter(operacion=operacion)
-        
-        metodo_id = request.query_params.get('metodo_financiero')
-        if metodo_id:
-            queryset = queryset.filter(metodo_financiero_id=metodo_id)
-        
-        # Ordenar por fecha descendente y luego por ganancia descendente
-        transacciones = queryset.order_by('-fecha', '-ganancia_neta')
-
-        data = [
-            {
-                'transaccion_id': g.transaccion.id,
-                'fecha': g.fecha,
-                'divisa_codigo': g.divisa_extranjera.codigo,
-                'operacion': g.operacion,
-                'ganancia_neta': g.ganancia_neta,
-                'monto_divisa': g.monto_divisa,
-                'tasa_aplicada': g.tasa_aplicada,
-                'cliente_nombre': g.transaccion.cliente.nombre,
-                'metodo_nombre': g.metodo_financiero.nombre if g.metodo_financiero else None,
-            }
-            for g in transacciones
-        ]
 
-        serializer = GananciaTransaccionSerializer(data, many=True)
-        return Response(serializer.data)
+        queryset = proyectar_transacciones(
+            filtrar_transacciones(self.get_queryset(), request.query_params))
+
+        paginator = GananciaListadoPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = GananciaTransaccionSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def estadisticas(self, request):
@@ -470,53 +298,7 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
             "fecha_fin": "2024-12-31"
         }
         """
-        queryset = self.filter_queryset(self.get_queryset())
-
-        # Estadísticas generales
-        stats_generales = queryset.aggregate(
-            total_ganancia=Sum('ganancia_neta'),
-            total_operaciones=Count('id'),
-            ganancia_promedio_operacion=Avg('ganancia_neta'),
-            ganancia_maxima=Max('ganancia_neta'),
-            ganancia_minima=Min('ganancia_neta'),
-        )
-
-        # Estadísticas por tipo de operación
-        stats_compra = queryset.filter(operacion='compra').aggregate(
-            operaciones_compra=Count('id'),
-            ganancia_compra=Sum('ganancia_neta'),
-        )
-
-        stats_venta = queryset.filter(operacion='venta').aggregate(
-            operaciones_venta=Count('id'),
-            ganancia_venta=Sum('ganancia_neta'),
-        )
-
-        # Rango de fechas
-        fechas = queryset.aggregate(
-            fecha_inicio=Min('fecha'),
-            fecha_fin=Max('fecha'),
-        )
-
-        # Combinar datos
-        data = {
-            **stats_generales,
-            **stats_compra,
-            **stats_venta,
-            **fechas,
-        }
-
-        # Valores por defecto
-        data['total_ganancia'] = data['total_ganancia'] or Decimal('0')
-        data['ganancia_promedio_operacion'] = data['ganancia_promedio_operacion'] or Decimal(
-            '0')
-        data['ganancia_maxima'] = data['ganancia_maxima'] or Decimal('0')
-        data['ganancia_minima'] = data['ganancia_minima'] or Decimal('0')
-        data['total_operaciones'] = data['total_operaciones'] or 0
-        data['operaciones_compra'] = data['operaciones_compra'] or 0
-        data['operaciones_venta'] = data['operaciones_venta'] or 0
-        data['ganancia_compra'] = data['ganancia_compra'] or Decimal('0')
-        data['ganancia_venta'] = data['ganancia_venta'] or Decimal('0')
+        data = datos_estadisticas(metricas_resumen(request.query_params))
 
         serializer = EstadisticasGeneralesSerializer(data=data)
         serializer.is_valid(raise_exception=True)
@@ -546,40 +328,71 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
             }
         }
         """
-        queryset = self.filter_queryset(self.get_queryset())
+        return Response(datos_comparativa(metricas_resumen(request.query_params)))
+
+    @action(detail=False, methods=['get'])
+    def analitica_margen(self, request):
+        """
+        GET /api/ganancias/analitica_margen/
 
-        total_general = queryset.aggregate(total=Sum('ganancia_neta'))[
-            'total'] or Decimal('0')
+        Analítica del margen porcentual (|tasa aplicada - tasa mercado| /
+        tasa mercado) calculada en la base de datos.
 
-        compra = queryset.filter(operacion='compra').aggregate(
-            total_ganancia=Sum('ganancia_neta'),
-            cantidad_operaciones=Count('id'),
-            ganancia_promedio=Avg('ganancia_neta'),
-        )
+        Query params:
+        - fecha_inicio / fecha_fin: Rango de fechas (YYYY-MM-DD)
+        - divisa_extranjera, metodo_financiero: IDs
+        - operacion: 'compra' o 'venta'
+        - intervalos: Cantidad de intervalos del histograma (default 10, máx. 100)
+        - granularidad: 'mes' (default) o 'dia' para el spread temporal
 
-        venta = queryset.filter(operacion='venta').aggregate(
-            total_ganancia=Sum('ganancia_neta'),
-            cantidad_operaciones=Count('id'),
-            ganancia_promedio=Avg('ganancia_neta'),
-        )
+        Response:
+        {
+            "distribucion": [
+                {"desde": 0.5, "hasta": 0.75, "cantidad": 12},
+                ...
+            ],
+            "percentiles_por_divisa": [
+                {
+                    "divisa_codigo": "USD",
+                    "divisa_nombre": "Dólar",
+                    "cantidad": 150,
+                    "promedio": 1.52,
+                    "p25": 0.98, "p50": 1.37, "p75": 2.05, "p90": 2.6, "p99": 3.1
+                },
+                ...
+            ],
+            "spread": [
+                {
+                    "periodo": "2024-01",
+                    "operacion": "venta",
+                    "cantidad": 25,
+                    "spread_promedio": 110.5,
+                    "spread_minimo": 50.0,
+                    "spread_maximo": 200.0,
+                    "margen_promedio": 1.5
+                },
+                ...
+            ]
+        }
+        """
+        queryset = filtrar_transacciones(self.get_queryset(), request.query_params)
+        return Response(analitica_margen(queryset, request.query_params))
 
-        # Calcular porcentajes
-        compra['total_ganancia'] = compra['total_ganancia'] or Decimal('0')
-        venta['total_ganancia'] = venta['total_ganancia'] or Decimal('0')
+    @action(detail=False, methods=['get'])
+    def cache_reportes(self, request):
+        """
+        GET /api/ganancias/cache_reportes/
 
-        if total_general > 0:
-            compra['porcentaje_total'] = float(
-                (compra['total_ganancia'] / total_general) * 100)
-            venta['porcentaje_total'] = float(
-                (venta['total_ganancia'] / total_general) * 100)
-        else:
-            compra['porcentaje_total'] = 0
-            venta['porcentaje_total'] = 0
+        Retorna los contadores de la cache de reportes.
 
-        return Response({
-            'compra': compra,
-            'venta': venta,
-        })
+        Response:
+        {
+            "aciertos": 120,
+            "fallos": 15,
+            "tasa_aciertos": 0.8889
+        }
+        """
+        return Response(ReporteCache.estadisticas())
 
     @action(detail=False, methods=['get'])
     def export_excel(self, request):
@@ -595,172 +408,7 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
         Returns:
             Archivo Excel descargable
         """
-        reporte_tipo = request.query_params.get('reporte', 'general')
-        
-        try:
-            if reporte_tipo == 'general':
-                # Obtener datos de comparativa
-                queryset = self.filter_queryset(self.get_queryset())
-                total_general = queryset.aggregate(total=Sum('ganancia_neta'))['total'] or Decimal('0')
-
-                compra = queryset.filter(operacion='compra').aggregate(
-                    total_ganancia=Sum('ganancia_neta'),
-                    cantidad_operaciones=Count('id'),
-                    ganancia_promedio=Avg('ganancia_neta'),
-                )
-                venta = queryset.filter(operacion='venta').aggregate(
-                    total_ganancia=Sum('ganancia_neta'),
-                    cantidad_operaciones=Count('id'),
-                    ganancia_promedio=Avg('ganancia_neta'),
-                )
-
-                compra['total_ganancia'] = compra['total_ganancia'] or Decimal('0')
-                venta['total_ganancia'] = venta['total_ganancia'] or Decimal('0')
-
-                if total_general > 0:
-                    compra['porcentaje_total'] = float((compra['total_ganancia'] / total_general) * 100)
-                    venta['porcentaje_total'] = float((venta['total_ganancia'] / total_general) * 100)
-                else:
-                    compra['porcentaje_total'] = 0
-                    venta['porcentaje_total'] = 0
-
-                data = {'compra': compra, 'venta': venta}
-                buffer = export_comparativa_to_excel(data)
-                timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'reporte_comparativa_{timestamp}.xlsx'
-
-            elif reporte_tipo == 'por_divisa':
-                # Obtener datos por divisa
-                queryset = self.filter_queryset(self.get_queryset())
-                data = list(queryset.values(
-                    divisa_codigo=F('divisa_extranjera__codigo'),
-                    divisa_nombre=F('divisa_extranjera__nombre')
-                ).annotate(
-                    total_ganancia=Sum('ganancia_neta'),
-                    cantidad_operaciones=Count('id'),
-                    ganancia_promedio=Avg('ganancia_neta'),
-                    monto_total_operado=Sum('monto_divisa'),
-                ).order_by('-total_ganancia'))
-                
-                buffer = export_por_divisa_to_excel(data)
-                timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'reporte_por_divisa_{timestamp}.xlsx'
-
-            elif reporte_tipo == 'evolucion':
-                # Obtener datos de evolución
-                queryset = self.filter_queryset(self.get_queryset())
-                granularidad = request.query_params.get('granularidad', 'mes')
-
-                if granularidad == 'dia':
-                    evolucion = queryset.values('fecha').annotate(
-                        total_ganancia=Sum('ganancia_neta'),
-                        cantidad_operaciones=Count('id'),
-                        ganancia_promedio=Avg('ganancia_neta'),
-                    ).order_by('fecha')
-
-                    data = [
-                        {
-                            'periodo': item['fecha'].strftime('%Y-%m-%d'),
-                            'anio': item['fecha'].year,
-                            'mes': item['fecha'].month,
-                            'total_ganancia': item['total_ganancia'],
-                            'cantidad_operaciones': item['cantidad_operaciones'],
-                            'ganancia_promedio': item['ganancia_promedio'],
-                        }
-                        for item in evolucion
-                    ]
-                else:
-                    evolucion = queryset.values('anio', 'mes').annotate(
-                        total_ganancia=Sum('ganancia_neta'),
-                        cantidad_operaciones=Count('id'),
-                        ganancia_promedio=Avg('ganancia_neta'),
-                    ).order_by('anio', 'mes')
-
-                    data = [
-                        {
-                            'periodo': f"{item['anio']}-{item['mes']:02d}",
-                            'anio': item['anio'],
-                            'mes': item['mes'],
-                            'total_ganancia': item['total_ganancia'],
-                            'cantidad_operaciones': item['cantidad_operaciones'],
-                            'ganancia_promedio': item['ganancia_promedio'],
-                        }
-                        for item in evolucion
-                    ]
-
-                buffer = export_evolucion_to_excel(data)
-                timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'reporte_evolucion_{timestamp}.xlsx'
-
-            elif reporte_tipo == 'transacciones':
-                # Obtener datos de transacciones
-                fecha_inicio_str = request.query_params.get('fecha_inicio')
-                fecha_fin_str = request.query_params.get('fecha_fin')
-                
-                if not fecha_inicio_str or not fecha_fin_str:
-                    fecha_fin = timezone.now().date()
-                    fecha_inicio = fecha_fin - timedelta(days=30)
-                else:
-                    fecha_inicio = parse_date(fecha_inicio_str)
-                    fecha_fin = parse_date(fecha_fin_str)
-                
-                queryset = self.get_queryset().filter(
-                    fecha__gte=fecha_inicio,
-                    fecha__lte=fecha_fin
-                )
-                
-                # Aplicar filtros adicionales
-                divisa_id = request.query_params.get('divisa_extranjera')
-                if divisa_id:
-                    queryset = queryset.filter(divisa_extranjera_id=divisa_id)
-                
-                operacion = request.query_params.get('operacion')
-                if operacion:
-                    queryset = queryset.filter(operacion=operacion)
-                
-                metodo_id = request.query_params.get('metodo_financiero')
-                if metodo_id:
-                    queryset = queryset.filter(metodo_financiero_id=metodo_id)
-                
-                transacciones = queryset.order_by('-fecha', '-ganancia_neta')
-
-                data = [
-                    {
-                        'transaccion_id': g.transaccion.id,
-                        'fecha': g.fecha.strftime('%Y-%m-%d'),
-                        'divisa_codigo': g.divisa_extranjera.codigo,
-                        'operacion': g.operacion,
-                        'ganancia_neta': str(g.ganancia_neta),
-                        'monto_divisa': str(g.monto_divisa),
-                        'tasa_aplicada': str(g.tasa_aplicada),
-                        'cliente_nombre': g.transaccion.cliente.nombre,
-                        'metodo_nombre': g.metodo_financiero.nombre if g.metodo_financiero else None,
-                    }
-                    for g in transacciones
-                ]
-
-                buffer = export_transacciones_to_excel(data)
-                timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'reporte_transacciones_{timestamp}.xlsx'
-
-            else:
-                return Response(
-                    {"error": "Tipo de reporte no válido"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            response = HttpResponse(
-                buffer.getvalue(),
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
-
-        except Exception as e:
-            return Response(
-                {"error": f"Error al generar el reporte: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return self._exportar(request, 'excel')
 
     @action(detail=False, methods=['get'])
     def export_pdf(self, request):
@@ -776,169 +424,150 @@ class GananciaViewSet(viewsets.ReadOnlyModelViewSet):
         Returns:
             Archivo PDF descargable
         """
-        reporte_tipo = request.query_params.get('reporte', 'general')
-        
-        # Construir información de filtros
-        filtros = self._build_filtros_info(request)
-        
+        return self._exportar(request, 'pdf')
+
+    @action(detail=False, methods=['get'])
+    def export_csv(self, request):
+        """
+        GET /api/ganancias/export_csv/?comprimir=true&...filtros
+
+        Exporta el listado de transacciones con sus ganancias a CSV.
+
+        El archivo se transmite fila a fila desde el cursor de la base de
+        datos, sin límite de rango de fechas.
+
+        Query params:
+        - fecha_inicio, fecha_fin, divisa_extranjera, operacion, metodo_financiero
+        - comprimir: 'true' para recibir el archivo comprimido con gzip (.csv.gz)
+
+        Returns:
+            Archivo CSV descargable
+        """
+        comprimir = request.query_params.get('comprimir', '').lower() == 'true'
+        contenido, filename = exportar_transacciones_csv(
+            request.query_params, comprimir=comprimir)
+
+        response = StreamingHttpResponse(
+            contenido,
+            content_type='application/gzip' if comprimir else 'text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['post'])
+    def exportaciones(self, request):
+        """
+        POST /api/ganancias/exportaciones/
+
+        Solicita la generación de un reporte en segundo plano.
+
+        Body:
+        - formato: 'excel' o 'pdf'
+        - reporte: Tipo de reporte ('general', 'por_divisa', 'evolucion', 'transacciones')
+        - Otros filtros según el tipo de reporte
+
+        Si ya existe una exportación idéntica en curso se retorna esa misma
+        (200); en caso contrario se crea una nueva (202).
+        """
+        formato = request.data.get('formato', 'excel')
+        reporte = request.data.get('reporte', 'general')
         try:
-            if reporte_tipo == 'general':
-                # Obtener datos de comparativa
-                queryset = self.filter_queryset(self.get_queryset())
-                total_general = queryset.aggregate(total=Sum('ganancia_neta'))['total'] or Decimal('0')
-
-                compra = queryset.filter(operacion='compra').aggregate(
-                    total_ganancia=Sum('ganancia_neta'),
-                    cantidad_operaciones=Count('id'),
-                    ganancia_promedio=Avg('ganancia_neta'),
-                )
-                venta = queryset.filter(operacion='venta').aggregate(
-                    total_ganancia=Sum('ganancia_neta'),
-                    cantidad_operaciones=Count('id'),
-                    ganancia_promedio=Avg('ganancia_neta'),
-                )
-
-                compra['total_ganancia'] = compra['total_ganancia'] or Decimal('0')
-                venta['total_ganancia'] = venta['total_ganancia'] or Decimal('0')
-
-                if total_general > 0:
-                    compra['porcentaje_total'] = float((compra['total_ganancia'] / total_general) * 100)
-                    venta['porcentaje_total'] = float((venta['total_ganancia'] / total_general) * 100)
-                else:
-                    compra['porcentaje_total'] = 0
-                    venta['porcentaje_total'] = 0
-
-                data = {'compra': compra, 'venta': venta}
-                buffer = export_comparativa_to_pdf(data, filtros)
-                timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'reporte_comparativa_{timestamp}.pdf'
-
-            elif reporte_tipo == 'por_divisa':
-                # Obtener datos por divisa
-                queryset = self.filter_queryset(self.get_queryset())
-                data = list(queryset.values(
-                    divisa_codigo=F('divisa_extranjera__codigo'),
-                    divisa_nombre=F('divisa_extranjera__nombre')
-                ).annotate(
-                    total_ganancia=Sum('ganancia_neta'),
-                    cantidad_operaciones=Count('id'),
-                    ganancia_promedio=Avg('ganancia_neta'),
-                    monto_total_operado=Sum('monto_divisa'),
-                ).order_by('-total_ganancia'))
-                
-                buffer = export_por_divisa_to_pdf(data, filtros)
-                timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'reporte_por_divisa_{timestamp}.pdf'
-
-            elif reporte_tipo == 'evolucion':
-                # Obtener datos de evolución
-                queryset = self.filter_queryset(self.get_queryset())
-                granularidad = request.query_params.get('granularidad', 'mes')
-
-                if granularidad == 'dia':
-                    evolucion = queryset.values('fecha').annotate(
-                        total_ganancia=Sum('ganancia_neta'),
-                        cantidad_operaciones=Count('id'),
-                        ganancia_promedio=Avg('ganancia_neta'),
-                    ).order_by('fecha')
-
-                    data = [
-                        {
-                            'periodo': item['fecha'].strftime('%Y-%m-%d'),
-                            'anio': item['fecha'].year,
-                            'mes': item['fecha'].month,
-                            'total_ganancia': item['total_ganancia'],
-                            'cantidad_operaciones': item['cantidad_operaciones'],
-                            'ganancia_promedio': item['ganancia_promedio'],
-                        }
-                        for item in evolucion
-                    ]
-                else:
-                    evolucion = queryset.values('anio', 'mes').annotate(
-                        total_ganancia=Sum('ganancia_neta'),
-                        cantidad_operaciones=Count('id'),
-                        ganancia_promedio=Avg('ganancia_neta'),
-                    ).order_by('anio', 'mes')
-
-                    data = [
-                        {
-                            'periodo': f"{item['anio']}-{item['mes']:02d}",
-                            'anio': item['anio'],
-                            'mes': item['mes'],
-                            'total_ganancia': item['total_ganancia'],
-                            'cantidad_operaciones': item['cantidad_operaciones'],
-                            'ganancia_promedio': item['ganancia_promedio'],
-                        }
-                        for item in evolucion
-                    ]
-
-                buffer = export_evolucion_to_pdf(data, filtros)
-                timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'reporte_evolucion_{timestamp}.pdf'
-
-            elif reporte_tipo == 'transacciones':
-                # Obtener datos de transacciones
-                fecha_inicio_str = request.query_params.get('fecha_inicio')
-                fecha_fin_str = request.query_params.get('fecha_fin')
-                
-                if not fecha_inicio_str or not fecha_fin_str:
-                    fecha_fin = timezone.now().date()
-                    fecha_inicio = fecha_fin - timedelta(days=30)
-                else:
-                    fecha_inicio = parse_date(fecha_inicio_str)
-                    fecha_fin = parse_date(fecha_fin_str)
-                
-                queryset = self.get_queryset().filter(
-                    fecha__gte=fecha_inicio,
-                    fecha__lte=fecha_fin
-                )
-                
-                # Aplicar filtros adicionales
-                divisa_id = request.query_params.get('divisa_extranjera')
-                if divisa_id:
-                    queryset = queryset.filter(divisa_extranjera_id=divisa_id)
-                
-                operacion = request.query_params.get('operacion')
-                if operacion:
-                    queryset = queryset.filter(operacion=operacion)
-                
-                metodo_id = request.query_params.get('metodo_financiero')
-                if metodo_id:
-                    queryset = queryset.filter(metodo_financiero_id=metodo_id)
-                
-                transacciones = queryset.order_by('-fecha', '-ganancia_neta')
-
-                data = [
-                    {
-                        'transaccion_id': g.transaccion.id,
-                        'fecha': g.fecha.strftime('%Y-%m-%d'),
-                        'divisa_codigo': g.divisa_extranjera.codigo,
-                        'operacion': g.operacion,
-                        'ganancia_neta': str(g.ganancia_neta),
-                        'monto_divisa': str(g.monto_divisa),
-                        'tasa_aplicada': str(g.tasa_aplicada),
-                        'cliente_nombre': g.transaccion.cliente.nombre,
-                        'metodo_nombre': g.metodo_financiero.nombre if g.metodo_financiero else None,
-                    }
-                    for g in transacciones
-                ]
-
-                buffer = export_transacciones_to_pdf(data, filtros)
-                timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'reporte_transacciones_{timestamp}.pdf'
-
-            else:
-                return Response(
-                    {"error": "Tipo de reporte no válido"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+            exportacion, creada = solicitar_exportacion(
+                request.user, formato, reporte, request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = ExportacionReporteSerializer(
+            exportacion, context={'request': request})
+        return Response(
+            serializer.data,
+            status=status.HTTP_202_ACCEPTED if creada else status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=['get'],
+            url_path=r'exportaciones/(?P<exportacion_id>\d+)')
+    def estado_exportacion(self, request, exportacion_id=None):
+        """
+        GET /api/ganancias/exportaciones/{id}/
+
+        Retorna el estado y el avance de una exportación.
+        """
+        exportacion = self._get_exportacion(exportacion_id)
+        if exportacion is None:
+            return Response(
+                {"error": "Exportación no encontrada"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        serializer = ExportacionReporteSerializer(
+            exportacion, context={'request': request})
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            url_path=r'exportaciones/(?P<exportacion_id>\d+)/descargar')
+    def descargar_exportacion(self, request, exportacion_id=None):
+        """
+        GET /api/ganancias/exportaciones/{id}/descargar/
 
+        Descarga el archivo de una exportación completada. El hash SHA-256
+        del contenido se envía como ETag y en 'X-Content-SHA256'.
+        """
+        exportacion = self._get_exportacion(exportacion_id)
+        if exportacion is None:
+            return Response(
+                {"error": "Exportación no encontrada"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if exportacion.estado != ExportacionReporte.ESTADO_COMPLETADO:
+            return Response(
+                {"error": "La exportación aún no está disponible",
+                 "estado": exportacion.estado},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        etag = f'"{exportacion.hash_contenido}"'
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+
+        response = FileResponse(
+            exportacion.archivo.open('rb'),
+            as_attachment=True,
+            filename=exportacion.archivo.name.rsplit('/', 1)[-1],
+            content_type=CONTENT_TYPES[exportacion.formato]
+        )
+        response['ETag'] = etag
+        response['X-Content-SHA256'] = exportacion.hash_contenido
+        return response
+
+    def _get_exportacion(self, exportacion_id):
+        """Exportación solicitada por el usuario actual, o None."""
+        exportaciones = ExportacionReporte.objects.filter(
+            id=exportacion_id, solicitado_por=self.request.user)
+        vencer_exportaciones_colgadas(exportaciones)
+        return exportaciones.first()
+
+    def _exportar(self, request, formato):
+        """Genera la exportación en la misma petición y la transmite."""
+        reporte_tipo = request.query_params.get('reporte', 'general')
+        if reporte_tipo not in REPORTES_EXPORTABLES:
+            return Response(
+                {"error": "Tipo de reporte no válido"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            archivo, filename = generar_exportacion(
+                formato, reporte_tipo, request.query_params)
+        except ValidationError:
+            raise
         except Exception as e:
             return Response(
                 {"error": f"Error al generar el reporte: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+        return FileResponse(
+            archivo,
+            as_attachment=True,
+            filename=filename,
+            content_type=CONTENT_TYPES[formato]
+        )
@@ -28,6 +28,7 @@ from .models import (
     Cheque
 )
 from apps.operaciones.models import Transaccion
+from apps.operaciones.transiciones import transicionar
 from apps.pagos.models import Pagos
 
 from .serializers import (
@@ -691,8 +692,7 @@ class ChequeViewSet(viewsets.ModelViewSet):
                     exc.messages[0] if exc.messages else "No se pudo registrar el pago asociado al cheque."
                 )
 
-            transaccion.estado = "en_proceso"
-            transaccion.save(update_fields=["estado", "updated_at"])
+            transicionar(transaccion, "en_proceso")
 
         output_serializer = self.get_serializer(cheque)
         headers = self.get_success_headers(output_serializer.data)
@@ -0,0 +1,139 @@
+"""
+Idempotencia de las solicitudes que crean o confirman transacciones.
+
+Un cliente que reintenta una solicitud (por ejemplo, desde un kiosco con red
+inestable) envía la misma cabecera ``Idempotency-Key``. La primera ejecución
+reserva la clave y guarda su respuesta; los reintentos se responden desde la
+tabla sin volver a recalcular la tasa, reservar stock ni crear sesiones de
+Stripe.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import SolicitudIdempotente
+
+CABECERA_IDEMPOTENCIA = 'Idempotency-Key'
+IDEMPOTENCIA_TTL = timedelta(hours=24)
+# Tiempo tras el cual una reserva sin respuesta se considera abandonada (el
+# proceso que la tomó murió sin guardar ni liberar la clave)
+IDEMPOTENCIA_LEASE = timedelta(minutes=5)
+LONGITUD_MAXIMA_CLAVE = 255
+
+
+def hash_solicitud(request) -> str:
+    """SHA-256 del método, la ruta y el cuerpo normalizado de la solicitud."""
+    contenido = json.dumps(
+        [request.method, request.path, request.data],
+        sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def _reservar_clave(usuario, clave, huella):
+    """
+    Reserva la clave para una nueva ejecución.
+
+    Returns:
+        tuple: (SolicitudIdempotente o None, bool indicando si la reserva es
+        nueva). El registro es None si otra ejecución lo liberó entre medio.
+    """
+    ahora = timezone.now()
+    try:
+        with transaction.atomic():
+            registro = SolicitudIdempotente.objects.create(
+                usuario=usuario, clave=clave, hash_solicitud=huella,
+                expira_en=ahora + IDEMPOTENCIA_TTL)
+        return registro, True
+    except IntegrityError:
+        pass
+
+    # Una clave vencida, o una reserva en curso abandonada, se vuelve a usar
+    # como si fuera nueva
+    renovadas = SolicitudIdempotente.objects.filter(
+        Q(expira_en__lte=ahora)
+        | Q(estado_http__isnull=True, created_at__lte=ahora - IDEMPOTENCIA_LEASE),
+        usuario=usuario, clave=clave,
+    ).update(hash_solicitud=huella, estado_http=None, respuesta=None,
+             created_at=ahora, expira_en=ahora + IDEMPOTENCIA_TTL)
+    registro = SolicitudIdempotente.objects.filter(usuario=usuario, clave=clave).first()
+    return registro, bool(renovadas)
+
+
+def _responder_guardada(registro, huella):
+    """Respuesta a un reintento con una clave ya reservada."""
+    if registro is not None and registro.hash_solicitud != huella:
+        return Response(
+            {'error': 'La clave de idempotencia ya se usó con otra solicitud.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if registro is None or registro.estado_http is None:
+        return Response(
+            {'error': 'Una solicitud con esta clave de idempotencia sigue en curso.'},
+            status=status.HTTP_409_CONFLICT)
+
+    response = Response(registro.respuesta, status=registro.estado_http)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotente(vista):
+    """
+    Decorador para acciones de ViewSet que admite la cabecera ``Idempotency-Key``.
+
+    Sin la cabecera la acción se ejecuta normalmente. Con ella, la clave se
+    asocia al usuario autenticado y al hash de la solicitud:
+
+    - Primera vez: se ejecuta la acción y se guarda la respuesta. Las
+      respuestas 5xx y las excepciones liberan la clave para poder reintentar.
+    - Reintento idéntico: se devuelve la respuesta guardada, con la cabecera
+      ``Idempotent-Replayed: true``.
+    - Misma clave con otro cuerpo o ruta: 422.
+    - Misma clave mientras la primera ejecución sigue en curso: 409. Si la
+      reserva no se completa en ``IDEMPOTENCIA_LEASE``, un reintento la toma.
+    """
+    @functools.wraps(vista)
+    def envoltura(self, request, *args, **kwargs):
+        clave = request.headers.get(CABECERA_IDEMPOTENCIA)
+        if not clave or not request.user.is_authenticated:
+            return vista(self, request, *args, **kwargs)
+        if len(clave) > LONGITUD_MAXIMA_CLAVE:
+            return Response(
+                {'error': f'{CABECERA_IDEMPOTENCIA} admite hasta {LONGITUD_MAXIMA_CLAVE} caracteres.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        huella = hash_solicitud(request)
+        registro, nueva = _reservar_clave(request.user, clave, huella)
+        if not nueva:
+            return _responder_guardada(registro, huella)
+
+        # created_at identifica esta reserva: si el lease venció y otro
+        # reintento la tomó, esta ejecución ya no la modifica
+        propia = SolicitudIdempotente.objects.filter(
+            pk=registro.pk, created_at=registro.created_at, estado_http__isnull=True)
+        try:
+            response = vista(self, request, *args, **kwargs)
+        except Exception:
+            propia.delete()
+            raise
+
+        if not isinstance(response, Response) or response.status_code >= 500:
+            propia.delete()
+        else:
+            propia.update(estado_http=response.status_code, respuesta=response.data)
+        return response
+
+    return envoltura
+
+
+def purgar_solicitudes_vencidas() -> int:
+    """Elimina las claves de idempotencia vencidas. Retorna cuántas se borraron."""
+    borradas, _ = SolicitudIdempotente.objects.filter(
+        expira_en__lte=timezone.now()).delete()
+    return borradas
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0005_transaccion_precio_base'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(condition=models.Q(('estado', 'pendiente')), fields=['created_at'], name='idx_transaccion_pendiente'),
+        ),
+    ]
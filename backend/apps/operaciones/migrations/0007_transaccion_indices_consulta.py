@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operaciones', '0006_transaccion_pendiente_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['-created_at', 'id'], name='idx_transaccion_creada'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['cliente', 'estado', '-created_at'], name='idx_transaccion_cliente_estado'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(condition=models.Q(('estado', 'pendiente')), fields=['divisa_origen'], name='idx_transaccion_pend_origen'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(condition=models.Q(('estado', 'pendiente')), fields=['divisa_destino'], name='idx_transaccion_pend_destino'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from apps.clientes.models import Cliente
 from apps.divisas.models import Divisa
@@ -73,9 +74,67 @@ class Transaccion(models.Model):
         verbose_name = "Transacción"
         verbose_name_plural = "Transacciones"
         ordering = ['-created_at']
+        indexes = [
+            # Barrido de transacciones pendientes vencidas
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(estado='pendiente'),
+                name='idx_transaccion_pendiente',
+            ),
+            # Listado paginado por cursor (-created_at, id)
+            models.Index(
+                fields=['-created_at', 'id'],
+                name='idx_transaccion_creada',
+            ),
+            # Historial del cliente, opcionalmente filtrado por estado
+            models.Index(
+                fields=['cliente', 'estado', '-created_at'],
+                name='idx_transaccion_cliente_estado',
+            ),
+            # Pendientes afectadas por un cambio de tasa de la divisa
+            models.Index(
+                fields=['divisa_origen'],
+                condition=models.Q(estado='pendiente'),
+                name='idx_transaccion_pend_origen',
+            ),
+            models.Index(
+                fields=['divisa_destino'],
+                condition=models.Q(estado='pendiente'),
+                name='idx_transaccion_pend_destino',
+            ),
+        ]
 
 
 class PagoStripe(models.Model):
     transaccion = models.ForeignKey(Transaccion, on_delete=models.PROTECT)
     brand = models.CharField(max_length=20)
     funding = models.CharField(max_length=10)
+
+
+class SolicitudIdempotente(models.Model):
+    """
+    Respuesta guardada de una solicitud enviada con ``Idempotency-Key``.
+
+    Mientras la solicitud original se ejecuta, ``estado_http`` es nulo; al
+    terminar se guarda la respuesta, que se devuelve tal cual a los
+    reintentos con la misma clave hasta ``expira_en``.
+    """
+    usuario = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='solicitudes_idempotentes')
+    clave = models.CharField(max_length=255)
+    hash_solicitud = models.CharField(max_length=64)
+    estado_http = models.PositiveSmallIntegerField(null=True, blank=True)
+    respuesta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expira_en = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Solicitud idempotente"
+        verbose_name_plural = "Solicitudes idempotentes"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'clave'], name='uq_solicitud_idempotente'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.clave}"
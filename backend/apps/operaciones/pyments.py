@@ -6,9 +6,10 @@ from globalexchange.configuration import config
 import stripe
 from apps.operaciones.models import Transaccion, PagoStripe
 from apps.clientes.models import Cliente
+from apps.operaciones.transiciones import transicionar
+from apps.clientes.service import registrar_gasto, reservar_gasto
 from django.db import transaction
 from apps.metodos_financieros.models import Tarjeta, MetodoFinancieroDetalle, MetodoFinanciero
-from apps.clientes.models import Cliente
 from apps.pagos.models import Pagos
 from apps.facturacion.factura_service import cargar_datos_factura, calcular_factura, generar_factura
 from apps.facturacion.models import Factura, FacturaSettings
@@ -16,7 +17,6 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-from django.db.models import F
 stripe.api_key = config.STRIPE_KEY
 
 # Códigos normalizados del “procesador”
@@ -97,21 +97,18 @@ def completar_pago_stripe(session_id):
             return
         
         # Actualizar información
-        transaccion.stripe_session_id = session_id
-        transaccion.estado = "en_proceso"
         print("Actualizando informacion de transaccion")
-        transaccion.save()
-        cliente = transaccion.cliente
-        
+        transicionar(transaccion, "en_proceso", stripe_session_id=session_id)
         monto = transaccion.monto_origen
-        
-        # Actualización segura en SQL usando F()
-        Cliente.objects.filter(pk=cliente.pk).update(
-            gasto_diario=F('gasto_diario') + monto,
-            gasto_mensual=F('gasto_mensual') + monto
-        )
 
-        cliente.refresh_from_db(fields=["gasto_diario", "gasto_mensual"])
+        # El cobro ya fue capturado por Stripe: si excede los límites se
+        # registra igual, para que el gasto refleje lo cobrado, y se informa
+        limite = reservar_gasto(transaccion.cliente_id, monto)
+        if limite:
+            logger.error(
+                f"El pago Stripe de la transacción {transaccion.pk} excede el límite "
+                f"{limite} del cliente {transaccion.cliente_id}; se registra el gasto cobrado")
+            registrar_gasto(transaccion.cliente_id, monto)
 
         pago.estado = "APROBADO"
         pago.response = "checkout.session.completed"
@@ -139,7 +136,7 @@ def completar_pago_stripe(session_id):
             cdc = generar_factura(factura_calculada)
             
             transaccion.factura_emitida = True
-            transaccion.save()
+            transaccion.save(update_fields=['factura_emitida', 'updated_at'])
             factura = Factura.objects.create(transaccion=transaccion, cdc=cdc)
             factura.save()
 
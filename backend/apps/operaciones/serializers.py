@@ -44,6 +44,32 @@ class TransaccionDetalleSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'fecha_inicio', 'created_at', 'updated_at']
 
 
+class TransaccionListadoSerializer(serializers.Serializer):
+    """
+    Representación compacta de una transacción para el listado.
+
+    Se construye sobre las filas de ``values()`` del listado, con los códigos
+    y nombres de las relaciones ya resueltos en la consulta.
+    """
+
+    id = serializers.IntegerField()
+    operacion = serializers.CharField()
+    estado = serializers.CharField()
+    monto_origen = serializers.DecimalField(max_digits=15, decimal_places=2)
+    monto_destino = serializers.DecimalField(max_digits=15, decimal_places=2)
+    tasa_aplicada = serializers.DecimalField(max_digits=15, decimal_places=6)
+    created_at = serializers.DateTimeField()
+    fecha_fin = serializers.DateTimeField(allow_null=True)
+    factura_emitida = serializers.BooleanField()
+    cliente = serializers.UUIDField()
+    cliente_nombre = serializers.CharField()
+    divisa_origen_codigo = serializers.CharField()
+    divisa_destino_codigo = serializers.CharField()
+    metodo_financiero_nombre = serializers.CharField(allow_null=True)
+    tauser_codigo = serializers.CharField()
+    operador_username = serializers.CharField()
+
+
 class TransaccionSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -1,9 +1,32 @@
+import hashlib
+import logging
+from datetime import timedelta
 from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
 from apps.clientes.models import Cliente
 from apps.divisas.models import Divisa
 from apps.cotizaciones.models import Tasa
 from apps.metodos_financieros.models import MetodoFinanciero, MetodoFinancieroDetalle
 from apps.cotizaciones.service import TasaService
+from apps.stock.enums import EstadoMovimiento
+from apps.stock.models import MovimientoStock
+from apps.stock.service import restaurar_stock_movimientos
+
+from .models import Transaccion
+
+logger = logging.getLogger(__name__)
+
+# Tiempo que una transacción puede permanecer pendiente antes de cancelarse
+TTL_TRANSACCION_PENDIENTE = timedelta(hours=24)
+EXPIRACION_BATCH_SIZE = 500
+
+# Cotizaciones de reconfirmación cacheadas por versión de sus insumos
+COTIZACION_CACHE_PREFIJO = 'operaciones:reconfirmacion'
+COTIZACION_CACHE_TIMEOUT = 600
 
 
 def _round_decimal(valor: Decimal) -> Decimal:
@@ -160,3 +183,139 @@ def calcular_operacion(divisa_origen_id, divisa_destino_id, monto: Decimal, op_p
             "comision_metodo": float(com_metodo_val),
         },
     }
+
+
+
+def version_cotizacion(transaccion_id) -> tuple:
+    """
+    Versión de los datos de los que depende la cotización de una transacción.
+
+    Una sola consulta por clave primaria lee el monto de origen, la fecha de
+    actualización de la tasa de cada divisa, la del método financiero y la
+    de su catálogo (banco, billetera o marca de tarjeta), y la categoría del
+    cliente con su descuento. Si alguno cambia, cambia la versión.
+    """
+    return Transaccion.objects.filter(pk=transaccion_id).values_list(
+        'monto_origen',
+        'divisa_origen__tasa__fechaActualizacion',
+        'divisa_origen__tasa__activo',
+        'divisa_destino__tasa__fechaActualizacion',
+        'divisa_destino__tasa__activo',
+        'metodo_financiero__fecha_actualizacion',
+        'metodo_financiero__is_active',
+        'metodo_financiero_detalle__is_active',
+        'metodo_financiero_detalle__metodo_financiero__fecha_actualizacion',
+        'metodo_financiero_detalle__cuenta_bancaria__banco__fecha_actualizacion',
+        'metodo_financiero_detalle__billetera_digital__plataforma__fecha_actualizacion',
+        'metodo_financiero_detalle__tarjeta__marca__fecha_actualizacion',
+        'cliente__id_categoria_id',
+        'cliente__id_categoria__descuento',
+    ).get()
+
+
+def cotizar_transaccion(transaccion) -> tuple:
+    """
+    Recalcula la tasa y el monto destino vigentes de una transacción.
+
+    El resultado de ``calcular_operacion`` se guarda en cache bajo la versión
+    de sus insumos (``version_cotizacion``), de modo que los sondeos repetidos
+    durante el pago sólo ejecutan esa consulta mientras la tasa, las
+    comisiones y la categoría del cliente no cambien.
+
+    Returns:
+        tuple: (tc_final, monto_destino, precio_base)
+    """
+    version = repr(version_cotizacion(transaccion.pk))
+    clave = '{}:{}:{}'.format(
+        COTIZACION_CACHE_PREFIJO,
+        transaccion.pk,
+        hashlib.sha256(version.encode()).hexdigest(),
+    )
+    cotizacion = cache.get(clave)
+    if cotizacion is not None:
+        return cotizacion
+
+    resultado = calcular_operacion(
+        cliente_id=transaccion.cliente_id,
+        divisa_origen_id=transaccion.divisa_origen_id,
+        divisa_destino_id=transaccion.divisa_destino_id,
+        monto=transaccion.monto_origen,
+        metodo_id=transaccion.metodo_financiero_id,
+        detalle_metodo_id=transaccion.metodo_financiero_detalle_id,
+        op_perspectiva_casa=transaccion.operacion
+    )
+    cotizacion = (resultado['tc_final'], resultado['monto_destino'], resultado['precio_base'])
+    cache.set(clave, cotizacion, COTIZACION_CACHE_TIMEOUT)
+    return cotizacion
+
+
+def _cancelar_pendientes_vencidas(limite, batch_size) -> list[int]:
+    """
+    Cancela un lote de transacciones pendientes creadas antes de ``limite``.
+
+    Un único ``UPDATE ... RETURNING`` selecciona el lote por el índice
+    parcial de pendientes y omite las filas bloqueadas por otra transacción
+    (por ejemplo, un pago en curso), que se reintentan en el próximo barrido.
+
+    Returns:
+        list[int]: IDs de las transacciones canceladas.
+    """
+    tabla = Transaccion._meta.db_table
+    ahora = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {tabla}
+            SET estado = 'cancelada', fecha_fin = %s, updated_at = %s
+            WHERE id IN (
+                SELECT id FROM {tabla}
+                WHERE estado = 'pendiente' AND created_at < %s
+                ORDER BY created_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id
+            """,
+            [ahora, ahora, limite, batch_size],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def expirar_transacciones_pendientes(ttl=TTL_TRANSACCION_PENDIENTE,
+                                     batch_size=EXPIRACION_BATCH_SIZE) -> int:
+    """
+    Cancela las transacciones que siguen pendientes después de ``ttl``.
+
+    Procesa lotes de ``batch_size`` en transacciones cortas. Por cada lote
+    cancela también los movimientos de stock en proceso de esas
+    transacciones y devuelve su reserva con ``restaurar_stock_movimientos``.
+    Al ser actualizaciones en lote no se disparan las señales post_save.
+
+    Returns:
+        int: Cantidad de transacciones canceladas.
+    """
+    limite = timezone.now() - ttl
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = _cancelar_pendientes_vencidas(limite, batch_size)
+            if not ids:
+                break
+
+            movimientos = list(
+                MovimientoStock.objects.filter(
+                    transaccion_id__in=ids, estado=EstadoMovimiento.EN_PROCESO
+                ).values_list('id', flat=True)
+            )
+            if movimientos:
+                MovimientoStock.objects.filter(id__in=movimientos).update(
+                    estado=EstadoMovimiento.CANCELADO)
+                restaurar_stock_movimientos(movimientos)
+
+        total += len(ids)
+        logger.info(f"Se cancelaron {len(ids)} transacciones pendientes vencidas "
+                    f"y {len(movimientos)} reservas de stock")
+        if len(ids) < batch_size:
+            break
+
+    return total
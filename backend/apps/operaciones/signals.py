@@ -4,37 +4,53 @@ from django.core.exceptions import ValidationError
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from apps.facturacion.factura_service import cargar_datos_factura, calcular_factura, generar_factura
 from .models import Transaccion
+from .transiciones import TransicionTransaccion, transaccion_transicionada
 from apps.facturacion.models import Factura, FacturaSettings
 import json
 import logging
 from apps.stock.serializers import MovimientoStockSerializer
 from apps.stock.models import MovimientoStock
+from apps.stock.service import restaurar_stock_movimientos
 from apps.stock.enums import TipoMovimiento, EstadoMovimiento
 
 logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=Transaccion)
 def manejar_transaccion_post_save(sender, instance, created, **kwargs):
-    procesar_cambios_transaccion(instance, created)
-
-def procesar_cambios_transaccion(transaccion: Transaccion, created):
+    # Los cambios de estado posteriores se notifican con transaccion_transicionada
     if created:
-        from .tasks import expire_transaction_task
-        TTL = 86400 # 24hs
+        procesar_transaccion_creada(instance)
 
-        expire_transaction_task.apply_async(args=[transaccion.pk], countdown=TTL)
-    
+
+@receiver(transaccion_transicionada, sender=Transaccion)
+def manejar_transicion_transaccion(sender, evento: TransicionTransaccion, **kwargs):
+    procesar_transicion(evento)
+
+
+def procesar_transaccion_creada(transaccion: Transaccion):
+    # La expiración de las pendientes la resuelve el barrido periódico
+    # apps.operaciones.tasks.expirar_transacciones_pendientes
     if transaccion.estado in ["en_proceso", "completada"]:
         generar_factura_al_pagar(transaccion)
 
-    if created and transaccion.operacion == "venta":
-        reservar_stock_divisa(instance=transaccion, created=created)
+    if transaccion.operacion == "venta":
+        reservar_stock_divisa(instance=transaccion, created=True)
 
     if transaccion.operacion == "venta" and transaccion.estado == "completada":
         finalizar_movimiento_stock(transaccion)
 
-    if not created and transaccion.estado in ["cancelada", "fallida"]:
-        cancelar_reserva_stock(transaccion)  
+
+def procesar_transicion(evento: TransicionTransaccion):
+    transaccion = evento.transaccion
+
+    if evento.estado_nuevo in ["en_proceso", "completada"]:
+        generar_factura_al_pagar(transaccion)
+
+    if evento.estado_nuevo == "completada":
+        finalizar_movimiento_stock(transaccion)
+
+    if evento.estado_nuevo in ["cancelada", "fallida"]:
+        cancelar_reserva_stock(transaccion)
 
 def generar_factura_al_pagar(instance: Transaccion):
     """
@@ -67,7 +83,7 @@ def generar_factura_al_pagar(instance: Transaccion):
         cdc = generar_factura(factura_calculada)
         
         instance.factura_emitida = True
-        instance.save()
+        instance.save(update_fields=['factura_emitida', 'updated_at'])
         factura = Factura.objects.create(transaccion=instance, cdc=cdc)
         factura.save()
 
@@ -110,25 +126,25 @@ def reservar_stock_divisa(instance, created):
         return
 
 def cancelar_reserva_stock(transaccion: Transaccion):
-    try:
-        movimiento = MovimientoStock.objects.get(transaccion=transaccion)
-    except MovimientoStock.DoesNotExist:
-        logger.warning("No se puede cancelar reserva de stock para la transaccion con id" + str(transaccion.pk))
+    movimientos = list(
+        MovimientoStock.objects.filter(
+            transaccion=transaccion, estado=EstadoMovimiento.EN_PROCESO
+        ).values_list("id", flat=True)
+    )
+    if not movimientos:
+        logger.warning("No se puede cancelar reserva de stock para la transaccion con id " + str(transaccion.pk))
         return
 
     logger.info(f"Cancelando movimiento de stock debido a transacción {transaccion.pk} cancelada")
-    movimiento.estado = EstadoMovimiento.CANCELADO
-
-    movimiento.save()
+    MovimientoStock.objects.filter(id__in=movimientos).update(estado=EstadoMovimiento.CANCELADO)
+    restaurar_stock_movimientos(movimientos)
 
 def finalizar_movimiento_stock(transaccion: Transaccion):
-    try:
-        movimiento = MovimientoStock.objects.get(transaccion=transaccion)
-    except MovimientoStock.DoesNotExist:
-        logger.warning("No se puede finalizar reserva de stock para la transaccion con id" + str(transaccion.pk))
+    finalizados = MovimientoStock.objects.filter(
+        transaccion=transaccion, estado=EstadoMovimiento.EN_PROCESO
+    ).update(estado=EstadoMovimiento.FINALIZADO)
+    if not finalizados:
+        logger.warning("No se puede finalizar reserva de stock para la transaccion con id " + str(transaccion.pk))
         return
 
-    logger.info(f"Cancelando movimiento de stock debido a transacción {transaccion.pk} cancelada")
-    movimiento.estado = EstadoMovimiento.FINALIZADO
-
-    movimiento.save()
+    logger.info(f"Finalizando movimiento de stock de la transacción {transaccion.pk} completada")
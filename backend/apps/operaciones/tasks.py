@@ -1,19 +1,50 @@
 from celery import shared_task
+from .idempotencia import purgar_solicitudes_vencidas
 from .models import Transaccion
+from .service import expirar_transacciones_pendientes as expirar_pendientes
+from .transiciones import TransicionInvalida, transicionar
 import logging
 
 logger = logging.getLogger(__name__)
 
+@shared_task
+def expirar_transacciones_pendientes():
+    logger.info("Iniciando barrido de transacciones pendientes vencidas...")
+
+    canceladas = expirar_pendientes()
+
+    logger.info(f"Se cancelaron {canceladas} transacciones pendientes vencidas")
+
+    return canceladas
+
+
+@shared_task
+def purgar_solicitudes_idempotentes():
+    borradas = purgar_solicitudes_vencidas()
+
+    logger.info(f"Se eliminaron {borradas} claves de idempotencia vencidas")
+
+    return borradas
+
+
 @shared_task
 def expire_transaction_task(transaction_id):
+    """
+    Expiración individual de una transacción.
+
+    Ya no se programa: las transacciones vencidas las cancela
+    ``expirar_transacciones_pendientes``. Se conserva para consumir los
+    mensajes con countdown que aún estén en la cola.
+    """
     try:
         transaccion = Transaccion.objects.get(id=transaction_id)
 
         if transaccion.estado == "pendiente":
-            transaccion.estado = "cancelada"
-            transaccion.save()
+            transicionar(transaccion, "cancelada")
             logger.info(f"Transacción {transaction_id} expiró, cancelada automáticamente.")
         else:
             logger.info(f"Transacción {transaction_id} ya fue pagada o ya se canceló.")
+    except TransicionInvalida:
+        logger.info(f"Transacción {transaction_id} cambió de estado antes de expirar.")
     except Transaccion.DoesNotExist:
-        logger.warning(f"La transacción {transaction_id} no existe.")
\ No newline at end of file
+        logger.warning(f"La transacción {transaction_id} no existe.")
@@ -0,0 +1,114 @@
+"""
+Máquina de estados de las transacciones.
+
+Todo cambio de ``Transaccion.estado`` pasa por ``transicionar``, que lo
+aplica con un único ``UPDATE ... WHERE id = ? AND estado = ?`` (compare-and-set)
+y, si la fila cambió, emite el evento ``transaccion_transicionada``. Los
+efectos secundarios (factura, stock, ganancia) se suscriben a ese evento en
+lugar de reaccionar a cada ``post_save`` de la transacción.
+
+La excepción es el barrido de pendientes vencidas
+(``expirar_transacciones_pendientes``), que cancela en lote y libera el
+stock por su cuenta sin emitir un evento por fila.
+"""
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Transaccion
+
+# Estado destino -> estados desde los que se puede llegar a él
+TRANSICIONES = {
+    'en_proceso': frozenset({'pendiente'}),
+    'completada': frozenset({'pendiente', 'en_proceso'}),
+    'cancelada': frozenset({'pendiente', 'en_proceso'}),
+    'fallida': frozenset({'pendiente', 'en_proceso'}),
+}
+
+# Estados que cierran la transacción y registran su fecha de fin
+ESTADOS_FINALES = frozenset({'completada', 'cancelada', 'fallida'})
+
+
+@dataclass(frozen=True)
+class TransicionTransaccion:
+    """
+    Evento emitido tras un cambio de estado confirmado en la base de datos.
+
+    Atributos:
+        transaccion: Instancia ya actualizada con el nuevo estado.
+        estado_anterior: Estado desde el que se transicionó.
+        estado_nuevo: Estado actual de la transacción.
+    """
+    transaccion: Transaccion
+    estado_anterior: str
+    estado_nuevo: str
+
+
+# Argumentos: evento (TransicionTransaccion)
+transaccion_transicionada = Signal()
+
+
+class TransicionInvalida(Exception):
+    """La transacción no está (o ya no está) en un estado desde el que se permite la transición."""
+
+    def __init__(self, transaccion, estado_nuevo, mensaje=None):
+        self.transaccion_id = transaccion.pk
+        self.estado_actual = transaccion.estado
+        self.estado_nuevo = estado_nuevo
+        super().__init__(mensaje or (
+            f"No se puede pasar la transacción {transaccion.pk} "
+            f"de '{transaccion.estado}' a '{estado_nuevo}'."))
+
+
+def puede_transicionar(transaccion, estado_nuevo) -> bool:
+    """Indica si el estado actual (en memoria) permite pasar a ``estado_nuevo``."""
+    return transaccion.estado in TRANSICIONES.get(estado_nuevo, ())
+
+
+@transaction.atomic
+def transicionar(transaccion, estado_nuevo, mensaje=None, **campos) -> TransicionTransaccion:
+    """
+    Cambia el estado de la transacción si nadie lo cambió desde que se leyó.
+
+    El estado esperado es el que la instancia tiene en memoria, que además
+    debe ser un origen permitido en ``TRANSICIONES``. La actualización sólo
+    escribe el estado, ``updated_at``, ``fecha_fin`` para los estados finales
+    y los ``campos`` indicados, sin disparar ``post_save``.
+
+    Args:
+        transaccion: Instancia de Transaccion leída previamente.
+        estado_nuevo: Estado destino.
+        mensaje: Mensaje opcional para la excepción si la transición no procede.
+        **campos: Otros campos a guardar en la misma sentencia.
+
+    Returns:
+        TransicionTransaccion: El evento emitido.
+
+    Raises:
+        TransicionInvalida: Si el estado no permite la transición o cambió
+            concurrentemente.
+    """
+    estado_anterior = transaccion.estado
+    if not puede_transicionar(transaccion, estado_nuevo):
+        raise TransicionInvalida(transaccion, estado_nuevo, mensaje)
+
+    ahora = timezone.now()
+    valores = {'estado': estado_nuevo, 'updated_at': ahora, **campos}
+    if estado_nuevo in ESTADOS_FINALES:
+        valores.setdefault('fecha_fin', ahora)
+
+    actualizadas = Transaccion.objects.filter(
+        pk=transaccion.pk, estado=estado_anterior
+    ).update(**valores)
+    if not actualizadas:
+        transaccion.refresh_from_db(fields=['estado'])
+        raise TransicionInvalida(transaccion, estado_nuevo, mensaje)
+
+    for campo, valor in valores.items():
+        setattr(transaccion, campo, valor)
+
+    evento = TransicionTransaccion(transaccion, estado_anterior, estado_nuevo)
+    transaccion_transicionada.send(sender=Transaccion, evento=evento)
+    return evento
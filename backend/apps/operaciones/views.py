@@ -8,11 +8,16 @@ financieros (`MetodoFinanciero`) y sus implementaciones específicas
 """
 # imports (arriba, junto a los demás)
 # NUEVO: simulador de pagos
-from apps.stock.enums import TipoMovimiento, EstadoMovimiento
+from apps.stock.enums import TipoMovimiento
 from .pyments import APROBADO, componenteSimuladorPagosCobros, completar_pago_stripe, guardar_tarjeta_stripe
+import uuid
+from datetime import datetime, time, timedelta
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 from django.db import transaction as db_transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import viewsets, status, filters, permissions
 from rest_framework.decorators import action, api_view, permission_classes
@@ -22,23 +27,33 @@ from rest_framework.response import Response
 from apps.cotizaciones.service import TasaService
 from apps.metodos_financieros.models import MetodoFinanciero, TipoMetodoFinanciero
 from apps.pagos.models import Pagos
-from apps.stock.models import MovimientoStock
 from apps.stock.serializers import MovimientoStockSerializer
 from apps.tauser.models import Tauser
 from globalexchange.configuration import config
+from globalexchange.pagination import KeysetPagination
 from apps.clientes.models import Cliente
-from apps.divisas.models import LimiteConfig
+from apps.clientes.service import (
+    MENSAJES_LIMITE,
+    liberar_gasto,
+    limite_excedido,
+    obtener_gastos,
+    reservar_gasto,
+)
+from apps.ganancias.export_utils import EXPORT_CHUNK_SIZE, stream_csv
 
+from .idempotencia import idempotente
 from .models import Transaccion
+from .transiciones import TransicionInvalida, puede_transicionar, transicionar
 from .serializers import (
     TransaccionDetalleSerializer,
+    TransaccionListadoSerializer,
     TransaccionSerializer,
     OperacionSerializer
 )
 
 from .service import (
     calcular_operacion,
-    calcular_operacion,
+    cotizar_transaccion,
     inferir_op_perspectiva_casa,
     _get_tasa_activa,
 )
@@ -83,34 +98,19 @@ def operacion_privada(request):
                 detalle_metodo_id=data.get("detalle_metodo_id", None)
             )
 
-            # Validar limites diarios/mensuales en divisa base
-            limite_cfg = LimiteConfig.get_solo()
-            limite_mensual = limite_cfg.limite_mensual
-            limite_diario = limite_cfg.limite_diario
-
             # Determinar el monto en divisa base segun la perspectiva
             if data.get("op_perspectiva_casa") == "compra":
                 monto_base = Decimal(str(resultado["monto_destino"]))
             else:
                 monto_base = Decimal(str(resultado["monto_origen"]))
 
-            # Validar limite mensual primero
-            if limite_mensual is not None:
-                total_mensual = (cliente.gasto_mensual or Decimal("0")) + monto_base
-                if total_mensual > limite_mensual:
-                    return Response(
-                        {"error": "Límite mensual alcanzado para este cliente."},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-            # Luego validar limite diario
-            if limite_diario is not None:
-                total_diario = (cliente.gasto_diario or Decimal("0")) + monto_base
-                if total_diario > limite_diario:
-                    return Response(
-                        {"error": "Límite diario alcanzado para este cliente."},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+            # Validar limites diarios/mensuales en divisa base
+            limite = limite_excedido(obtener_gastos(cliente.pk), monto_base)
+            if limite:
+                return Response(
+                    {"error": MENSAJES_LIMITE[limite]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
             return Response(resultado, status=status.HTTP_200_OK)
         except Exception as e:
@@ -206,6 +206,17 @@ def stripe_webhook(request):
     return Response(data=None, status=status.HTTP_200_OK)
 
 
+class TransaccionCursorPagination(KeysetPagination):
+    """
+    Paginación por cursor del listado de transacciones, ordenado por
+    (created_at descendente, id ascendente).
+    """
+    ordenamiento = (
+        ('-created_at', parse_datetime),
+        ('id', int),
+    )
+
+
 class TransaccionViewSet(viewsets.ModelViewSet):
     queryset = Transaccion.objects.select_related(
         'id_user', 'cliente', 'divisa_origen', 'divisa_destino',
@@ -219,12 +230,73 @@ class TransaccionViewSet(viewsets.ModelViewSet):
     ordering_fields = ['fecha_inicio', 'fecha_fin',
                        'monto_origen', 'monto_destino', 'created_at']
     ordering = ['-created_at']
+    pagination_class = TransaccionCursorPagination
 
     def get_serializer_class(self):
         if self.action == 'create':
             return TransaccionSerializer
+        if self.action == 'list':
+            return TransaccionListadoSerializer
         return TransaccionDetalleSerializer
 
+    def list(self, request, *args, **kwargs):
+        """
+        GET /api/operaciones/transacciones/
+
+        Listado compacto de transacciones, paginado por cursor y ordenado de
+        la más reciente a la más antigua. Sólo incluye códigos y nombres de
+        las relaciones; el detalle completo se obtiene con retrieve.
+
+        Query params:
+        - estado, operacion, cliente: Filtros exactos (opcionales)
+        - fecha_inicio, fecha_fin: Fecha de creación (YYYY-MM-DD, opcionales)
+        - search: Búsqueda por nombre de cliente
+        - page_size: Filas por página (por defecto 50, máximo 500)
+        - cursor: Valor 'cursor' de la página anterior
+
+        Response:
+        {
+            "next": "http://.../transacciones/?cursor=...",
+            "cursor": "WyIyMDI1LTAxLTE1VDEwOjMwOjAwKzAwOjAwIiwgMTIzXQ==",
+            "results": [
+                {
+                    "id": 123,
+                    "operacion": "venta",
+                    "estado": "completada",
+                    "cliente_nombre": "Juan Pérez",
+                    "divisa_origen_codigo": "USD",
+                    "divisa_destino_codigo": "PYG",
+                    ...
+                }
+            ]
+        }
+        """
+        queryset = self._filtrar_por_parametros(
+            self.filter_queryset(self.get_queryset()), request.query_params)
+        # El orden del cursor reemplaza al de OrderingFilter
+        filas = queryset.order_by('-created_at', 'id').values(
+            'id',
+            'operacion',
+            'estado',
+            'monto_origen',
+            'monto_destino',
+            'tasa_aplicada',
+            'created_at',
+            'fecha_fin',
+            'factura_emitida',
+            'cliente',
+            cliente_nombre=F('cliente__nombre'),
+            divisa_origen_codigo=F('divisa_origen__codigo'),
+            divisa_destino_codigo=F('divisa_destino__codigo'),
+            metodo_financiero_nombre=F('metodo_financiero__nombre'),
+            tauser_codigo=F('tauser__codigo'),
+            operador_username=F('id_user__username'),
+        )
+        page = self.paginate_queryset(filas)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @idempotente
     def create(self, request, *args, **kwargs):
         """
         Método create personalizado para manejar correctamente los métodos financieros.
@@ -289,39 +361,39 @@ class TransaccionViewSet(viewsets.ModelViewSet):
             status=status.HTTP_405_METHOD_NOT_ALLOWED
         )
 
+    def perform_update(self, serializer):
+        """
+        Guarda sólo los campos editados y aplica el cambio de estado con
+        ``transicionar``.
+
+        No se usa ``serializer.save()``: su ``instance.save()`` reescribiría
+        el estado leído por ``get_object`` y desharía un cambio concurrente
+        (``completar``, ``cancelar`` o el barrido de pendientes vencidas).
+        Con cambio de estado, los campos se guardan en el mismo
+        compare-and-set.
+        """
+        campos = dict(serializer.validated_data)
+        estado = campos.pop('estado', None)
+        transaccion = serializer.instance
+        with db_transaction.atomic():
+            if estado and estado != transaccion.estado:
+                try:
+                    transicionar(transaccion, estado, **campos)
+                except TransicionInvalida as e:
+                    raise ValidationError({'estado': str(e)})
+            elif campos:
+                for campo, valor in campos.items():
+                    setattr(transaccion, campo, valor)
+                transaccion.save(update_fields=[*campos, 'updated_at'])
+
     @action(detail=True, methods=['patch'])
     def completar(self, request, pk=None):
         """Marcar transacción como completada"""
         transaccion = self.get_object()
-        if transaccion.estado != 'pendiente' and transaccion.estado != 'en_proceso':
-            return Response(
-                {'error': 'Solo se pueden completar transacciones pendientes o en proceso'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        estado_finalizado = EstadoMovimiento.FINALIZADO
-
-        with db_transaction.atomic():
-            transaccion.estado = 'completada'
-            transaccion.fecha_fin = timezone.now()
-            transaccion.save(
-                update_fields=['estado', 'fecha_fin', 'updated_at'])
-
-            if estado_finalizado:
-                MovimientoStock.objects.filter(transaccion=transaccion).update(
-                    estado=estado_finalizado
-                )
-
-            # Registrar ganancia automáticamente al completar transacción
-            from apps.ganancias.service import GananciaService
-            try:
-                GananciaService.registrar_ganancia(transaccion)
-            except Exception as e:
-                # Log error pero no fallar la transacción
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(
-                    f"Error al registrar ganancia para transacción {transaccion.id}: {str(e)}")
+        try:
+            transicionar(transaccion, 'completada', 'Solo se pueden completar transacciones pendientes o en proceso')
+        except TransicionInvalida as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(transaccion)
         return Response(serializer.data)
@@ -330,15 +402,10 @@ class TransaccionViewSet(viewsets.ModelViewSet):
     def cancelar(self, request, pk=None):
         """Cancelar transacción"""
         transaccion = self.get_object()
-        if transaccion.estado == 'completada':
-            return Response(
-                {'error': 'No se puede cancelar una transacción completada'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        transaccion.estado = 'cancelada'
-        transaccion.fecha_fin = timezone.now()
-        transaccion.save()
+        try:
+            transicionar(transaccion, 'cancelada', 'Solo se pueden cancelar transacciones pendientes o en proceso')
+        except TransicionInvalida as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(transaccion)
         return Response(serializer.data)
@@ -413,6 +480,87 @@ class TransaccionViewSet(viewsets.ModelViewSet):
                 'fallidas': queryset.filter(estado='fallida').count(),
             })
 
+    # Columnas del CSV de transacciones: (encabezado, campo)
+    COLUMNAS_CSV = (
+        ('id', 'id'),
+        ('creada', 'created_at'),
+        ('finalizada', 'fecha_fin'),
+        ('estado', 'estado'),
+        ('operacion', 'operacion'),
+        ('cliente', 'cliente__nombre'),
+        ('divisa_origen', 'divisa_origen__codigo'),
+        ('divisa_destino', 'divisa_destino__codigo'),
+        ('monto_origen', 'monto_origen'),
+        ('monto_destino', 'monto_destino'),
+        ('tasa_aplicada', 'tasa_aplicada'),
+        ('metodo_financiero', 'metodo_financiero__nombre'),
+        ('tauser', 'tauser__codigo'),
+        ('operador', 'id_user__username'),
+    )
+
+    @action(detail=False, methods=['get'])
+    def export_csv(self, request):
+        """
+        Exporta las transacciones a CSV, transmitiéndolas desde el cursor.
+
+        Acepta los mismos parámetros de búsqueda y orden que el listado, más
+        los filtros 'estado', 'operacion', 'cliente', 'fecha_inicio' y
+        'fecha_fin' (YYYY-MM-DD, sobre la fecha de creación). Con
+        'comprimir=true' el archivo se envía comprimido con gzip (.csv.gz).
+
+        Ejemplo de uso:
+        - /api/transacciones/export_csv/?estado=completada&fecha_inicio=2025-01-01
+        """
+        queryset = self._filtrar_por_parametros(
+            self.filter_queryset(self.get_queryset()), request.query_params)
+        filas = queryset.values_list(
+            *(campo for _, campo in self.COLUMNAS_CSV)
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+        comprimir = request.query_params.get('comprimir', '').lower() == 'true'
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"transacciones_{timestamp}.{'csv.gz' if comprimir else 'csv'}"
+
+        response = StreamingHttpResponse(
+            stream_csv([encabezado for encabezado, _ in self.COLUMNAS_CSV],
+                       filas, comprimir=comprimir),
+            content_type='application/gzip' if comprimir else 'text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def _filtrar_por_parametros(self, queryset, params):
+        """
+        Aplica los filtros 'estado', 'operacion', 'cliente', 'fecha_inicio' y
+        'fecha_fin' (YYYY-MM-DD, sobre la fecha de creación) del listado.
+        """
+        for campo in ('estado', 'operacion'):
+            valor = params.get(campo)
+            if valor:
+                queryset = queryset.filter(**{campo: valor})
+
+        cliente = params.get('cliente')
+        if cliente:
+            try:
+                cliente = uuid.UUID(cliente)
+            except ValueError:
+                raise ValidationError({'cliente': 'Identificador de cliente inválido.'})
+            queryset = queryset.filter(cliente=cliente)
+
+        # Límites semiabiertos en la zona horaria local: comparar created_at
+        # directamente (sin convertirlo a fecha) permite usar su índice
+        for param, lookup, dias in (('fecha_inicio', 'created_at__gte', 0),
+                                    ('fecha_fin', 'created_at__lt', 1)):
+            valor = params.get(param)
+            if valor:
+                fecha = parse_date(valor)
+                if not fecha:
+                    raise ValidationError({param: 'Formato de fecha inválido. Use YYYY-MM-DD.'})
+                limite = timezone.make_aware(
+                    datetime.combine(fecha + timedelta(days=dias), time.min))
+                queryset = queryset.filter(**{lookup: limite})
+        return queryset
+
     def _get_tauser(self, tauser_id):
         try:
             return Tauser.objects.get(pk=tauser_id)
@@ -526,23 +674,10 @@ class TransaccionViewSet(viewsets.ModelViewSet):
         Recalcula la tasa vigente y el monto_destino actual usando la misma lógica que la operacion:
         - Cliente 'venta'  => Casa COMPRA => monto_destino = monto * tc
         - Cliente 'compra' => Casa VENDE  => monto_destino = monto / tc
-        """
-
-        resultado = calcular_operacion(
-            cliente_id=transaccion.cliente.id,
-            divisa_origen_id=transaccion.divisa_origen.id,
-            divisa_destino_id=transaccion.divisa_destino.id,
-            monto=transaccion.monto_origen,
-            metodo_id=transaccion.metodo_financiero.id if transaccion.metodo_financiero else None,
-            detalle_metodo_id=transaccion.metodo_financiero_detalle.id if transaccion.metodo_financiero_detalle else None,
-            op_perspectiva_casa=transaccion.operacion
-        )
 
-        tc_final = resultado['tc_final']
-        monto_destino = resultado['monto_destino']
-        precio_base = resultado['precio_base']
-
-        return tc_final, monto_destino, precio_base
+        El resultado se cachea por versión de tasa, comisiones y categoría.
+        """
+        return cotizar_transaccion(transaccion)
 
     def _build_reconfirm_payload(self, transaccion: Transaccion):
         tc_actual, monto_destino_actual, precio_base = self._recalcular_tc_y_monto(
@@ -627,6 +762,7 @@ class TransaccionViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['patch'], url_path='confirmar-pago')
+    @idempotente
     def confirmar_pago(self, request, pk=None):
         """
         Body esperado:
@@ -637,7 +773,7 @@ class TransaccionViewSet(viewsets.ModelViewSet):
         """
         transaccion = self.get_object()  # <-- IMPORTANTE: definir t en el scope
 
-        if transaccion.estado not in ('pendiente', 'en_proceso'):
+        if not puede_transicionar(transaccion, 'en_proceso'):
             return Response({'error': 'La transacción no está en un estado confirmable.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
@@ -664,19 +800,34 @@ class TransaccionViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_409_CONFLICT)
 
         # Si no cambió, o cambió y el cliente acepta, aplicamos posible nueva tasa
+        nueva_tasa = {}
         if cambio and acepta_cambio:
-            transaccion.tasa_aplicada = tc_actual
-            transaccion.monto_destino = monto_destino_actual
-            transaccion.precio_base = precio_base
+            nueva_tasa = {
+                'tasa_aplicada': tc_actual,
+                'monto_destino': monto_destino_actual,
+                'precio_base': precio_base,
+            }
+            for campo, valor in nueva_tasa.items():
+                setattr(transaccion, campo, valor)
+
+        # 1) Reservar el monto dentro de los límites del cliente, antes del pago
+        monto = transaccion.monto_origen if transaccion.operacion == "venta" else transaccion.monto_destino
+        fecha_gasto = timezone.localdate()
+        limite = reservar_gasto(transaccion.cliente_id, monto, fecha_gasto)
+        if limite:
+            return Response({'error': MENSAJES_LIMITE[limite]},
+                            status=status.HTTP_400_BAD_REQUEST)
 
         # 2) Simular pago/cobro en el procesador (dummy)
         pago = componenteSimuladorPagosCobros(transaccion)
 
         if pago.codigo != APROBADO:
-            # Simular rechazo → marcamos como fallida
-            transaccion.estado = 'fallida'
-            transaccion.fecha_fin = timezone.now()
-            transaccion.save()
+            # Simular rechazo → liberamos la reserva y marcamos como fallida
+            liberar_gasto(transaccion.cliente_id, monto, fecha_gasto)
+            try:
+                transicionar(transaccion, 'fallida', **nueva_tasa)
+            except TransicionInvalida as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             serializer = self.get_serializer(transaccion)
             data = dict(serializer.data)
@@ -687,14 +838,14 @@ class TransaccionViewSet(viewsets.ModelViewSet):
             return Response(data, status=status.HTTP_402_PAYMENT_REQUIRED)
 
         # Aprobado → pasar a EN PROCESO
-        cliente = transaccion.cliente
-        transaccion.estado = 'en_proceso'
-        monto = transaccion.monto_origen if transaccion.operacion == "venta" else transaccion.monto_destino
-        cliente.gasto_diario += monto
-        cliente.gasto_mensual += monto
-        cliente.save()
-        transaccion.save()
-        self._registrar_pago_operacion(transaccion)
+        try:
+            with db_transaction.atomic():
+                transicionar(transaccion, 'en_proceso', **nueva_tasa)
+                self._registrar_pago_operacion(transaccion)
+        except TransicionInvalida as e:
+            # Otro proceso cambió el estado mientras se procesaba el pago
+            liberar_gasto(transaccion.cliente_id, monto, fecha_gasto)
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
 
         serializer = self.get_serializer(transaccion)
         data = dict(serializer.data)
@@ -704,6 +855,7 @@ class TransaccionViewSet(viewsets.ModelViewSet):
         return Response(data, status=status.HTTP_200_OK)
 
     @action(methods=['POST'], detail=True)
+    @idempotente
     def crear_checkout_stripe(self, request, pk=None):
         transaccion = self.get_object()  # <-- IMPORTANTE: definir t en el scope
         cliente = transaccion.cliente
@@ -740,7 +892,18 @@ class TransaccionViewSet(viewsets.ModelViewSet):
             transaccion.monto_destino = monto_destino_actual
             transaccion.precio_base = precio_base
 
-        transaccion.save()
+        # Rechazar antes de crear la sesión si el pago excedería los límites;
+        # la reserva definitiva se hace al completarse el pago
+        monto = transaccion.monto_origen
+        limite = limite_excedido(obtener_gastos(cliente.pk), monto)
+        if limite:
+            return Response({'error': MENSAJES_LIMITE[limite]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Sin reescribir el estado: el barrido de pendientes vencidas pudo
+        # cancelarla mientras tanto
+        transaccion.save(update_fields=['tasa_aplicada', 'monto_destino',
+                                        'precio_base', 'updated_at'])
         DOMAIN = config.DEV_URL if config.DJANGO_DEBUG else config.PROD_URL
 
         try:
@@ -850,17 +1013,19 @@ class TransaccionViewSet(viewsets.ModelViewSet):
                 fields_to_update.extend(
                     ['tasa_aplicada', 'monto_destino', 'precio_base'])
 
-        with db_transaction.atomic():
-            self._registrar_movimiento_entclt(transaccion, tauser, detalles)
-            self._registrar_pagos_compra(transaccion)
-
-            if transaccion.estado == 'pendiente':
-                transaccion.estado = 'en_proceso'
-                fields_to_update.append('estado')
-
-            if fields_to_update:
-                fields_to_update.append('updated_at')
-                transaccion.save(update_fields=fields_to_update)
+        try:
+            with db_transaction.atomic():
+                self._registrar_movimiento_entclt(transaccion, tauser, detalles)
+                self._registrar_pagos_compra(transaccion)
+
+                if transaccion.estado == 'pendiente':
+                    transicionar(transaccion, 'en_proceso', **{
+                        campo: getattr(transaccion, campo) for campo in fields_to_update})
+                elif fields_to_update:
+                    fields_to_update.append('updated_at')
+                    transaccion.save(update_fields=fields_to_update)
+        except TransicionInvalida as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
 
         serializer = self.get_serializer(transaccion)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -9,4 +9,9 @@ class TipoMovimiento(StrEnum):
 class EstadoMovimiento(StrEnum):
     EN_PROCESO = auto()
     FINALIZADO = auto()
-    CANCELADO = auto()
\ No newline at end of file
+    CANCELADO = auto()
+
+class MotivoAsiento(StrEnum):
+    MOVIMIENTO = auto()
+    CANCELACION = auto()
+    AJUSTE = auto()
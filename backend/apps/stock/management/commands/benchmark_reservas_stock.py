@@ -0,0 +1,174 @@
+"""
+Comando para medir reservas de stock concurrentes sobre un mismo tauser.
+
+Crea una base de datos de prueba temporal, la puebla con un tauser y
+transacciones de venta sintéticas y lanza las reservas SALCLT desde N hilos.
+Nunca escribe en la base de datos configurada.
+
+Uso:
+    python manage.py benchmark_reservas_stock [--hilos 1 4 8 16] [--reservas 400]
+"""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+
+from apps.clientes.models import CategoriaCliente, Cliente
+from apps.divisas.models import Denominacion, Divisa
+from apps.operaciones.models import Transaccion
+from apps.stock.enums import TipoMovimiento
+from apps.stock.models import StockDivisaCasa, StockDivisaTauser
+from apps.stock.serializers import MovimientoStockSerializer
+from apps.tauser.models import Tauser
+from apps.usuarios.models import User
+
+# Cada reserva de 170 usa un billete de 100, uno de 50 y uno de 20
+DENOMINACIONES = (100, 50, 20)
+MONTO_RESERVA = Decimal('170.00')
+
+
+@dataclass
+class ResultadoReservas:
+    """Resultado de una ronda de reservas concurrentes."""
+    hilos: int
+    segundos: float
+    completadas: int = 0
+    rechazadas: int = 0
+    errores: list = field(default_factory=list)
+    esperas: list = field(default_factory=list)
+
+    @property
+    def por_segundo(self) -> float:
+        return (self.completadas + self.rechazadas) / self.segundos
+
+    @property
+    def p50(self) -> float:
+        return statistics.median(self.esperas) if self.esperas else 0.0
+
+    @property
+    def p95(self) -> float:
+        if len(self.esperas) < 2:
+            return max(self.esperas, default=0.0)
+        return statistics.quantiles(self.esperas, n=20, method="inclusive")[-1]
+
+
+def preparar_reservas(cantidad, indice=0):
+    """
+    Crea un tauser con stock para ``cantidad`` reservas y otras tantas
+    transacciones de venta pendientes, sin disparar sus señales.
+    """
+    usuario, _ = User.objects.get_or_create(username='benchmark-reservas')
+    categoria, _ = CategoriaCliente.objects.get_or_create(nombre='Benchmark')
+    cliente, _ = Cliente.objects.get_or_create(
+        cedula='0000000', defaults={
+            'nombre': 'Cliente benchmark', 'correo': 'benchmark@example.com',
+            'telefono': '0000000', 'direccion': '-', 'id_categoria': categoria,
+        })
+    divisa, _ = Divisa.objects.get_or_create(
+        codigo='USD', defaults={'nombre': 'Dólar estadounidense', 'simbolo': '$'})
+    tauser = Tauser.objects.create(
+        codigo=f'BENCH{indice}', nombre=f'Benchmark {indice}', direccion='-',
+        ciudad='-', departamento='-',
+        latitud=Decimal('-25.2637'), longitud=Decimal('-57.5759'))
+
+    for valor in DENOMINACIONES:
+        denominacion, _ = Denominacion.objects.get_or_create(denominacion=valor, divisa=divisa)
+        StockDivisaCasa.objects.get_or_create(denominacion=denominacion, defaults={'stock': 0})
+        StockDivisaTauser.objects.create(tauser=tauser, denominacion=denominacion, stock=cantidad)
+
+    transacciones = Transaccion.objects.bulk_create([
+        Transaccion(
+            id_user=usuario, cliente=cliente, operacion='venta',
+            tasa_aplicada=Decimal('1.0'), tasa_inicial=Decimal('1.0'),
+            divisa_origen=divisa, divisa_destino=divisa,
+            monto_origen=MONTO_RESERVA, monto_destino=MONTO_RESERVA,
+            tauser=tauser, estado='pendiente',
+        )
+        for _ in range(cantidad)
+    ])
+    return tauser, divisa, transacciones
+
+
+def medir_reservas(tauser, divisa, transacciones, hilos) -> ResultadoReservas:
+    """
+    Reserva el stock de cada transacción desde ``hilos`` hilos a la vez.
+
+    La espera de cada reserva incluye el tiempo bloqueada por las demás sobre
+    el stock del tauser. Las excepciones (por ejemplo un deadlock) se
+    registran en ``errores`` en lugar de interrumpir la ronda.
+    """
+    resultado = ResultadoReservas(hilos=hilos, segundos=0.0)
+    candado = threading.Lock()
+
+    def reservar(transaccion):
+        inicio = time.perf_counter()
+        try:
+            serializer = MovimientoStockSerializer(data={
+                "tipo_movimiento": TipoMovimiento.SALCLT,
+                "tauser": tauser.id,
+                "transaccion": transaccion.id,
+                "divisa": divisa.id,
+            })
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            completada = True
+        except ValidationError:
+            completada = False
+        except Exception as e:
+            with candado:
+                resultado.errores.append(e)
+            return
+        finally:
+            connection.close()
+
+        espera = time.perf_counter() - inicio
+        with candado:
+            resultado.esperas.append(espera)
+            if completada:
+                resultado.completadas += 1
+            else:
+                resultado.rechazadas += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        list(executor.map(reservar, transacciones))
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+class Command(BaseCommand):
+    help = "Mide reservas de stock por segundo y la espera p95 con N hilos concurrentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos', type=int, nargs='+', default=[1, 4, 8, 16],
+            help='Cantidades de hilos a medir')
+        parser.add_argument(
+            '--reservas', type=int, default=400,
+            help='Reservas por ronda')
+
+    def handle(self, *args, **options):
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for indice, hilos in enumerate(options['hilos']):
+                tauser, divisa, transacciones = preparar_reservas(options['reservas'], indice)
+                resultado = medir_reservas(tauser, divisa, transacciones, hilos)
+                self.stdout.write(
+                    f"{hilos:>3} hilos: {resultado.por_segundo:8.1f} reservas/s, "
+                    f"espera p50 {resultado.p50 * 1e3:7.1f} ms, "
+                    f"p95 {resultado.p95 * 1e3:7.1f} ms, "
+                    f"{resultado.completadas} completadas, "
+                    f"{resultado.rechazadas} rechazadas, "
+                    f"{len(resultado.errores)} errores"
+                )
+                for error in resultado.errores[:3]:
+                    self.stderr.write(f"    {type(error).__name__}: {error}")
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:24
+
+import apps.stock.enums
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def abrir_libro_stock(apps, schema_editor):
+    """Registra el stock vigente como asiento de apertura del libro."""
+    AsientoStock = apps.get_model('stock', 'AsientoStock')
+    StockDivisaTauser = apps.get_model('stock', 'StockDivisaTauser')
+    StockDivisaCasa = apps.get_model('stock', 'StockDivisaCasa')
+
+    ahora = django.utils.timezone.now()
+    asientos = [
+        AsientoStock(tauser_id=s.tauser_id, denominacion_id=s.denominacion_id,
+                     cantidad=s.stock, motivo='ajuste', fecha=ahora)
+        for s in StockDivisaTauser.objects.exclude(stock=0).iterator()
+    ]
+    asientos += [
+        AsientoStock(tauser_id=None, denominacion_id=s.denominacion_id,
+                     cantidad=s.stock, motivo='ajuste', fecha=ahora)
+        for s in StockDivisaCasa.objects.exclude(stock=0).iterator()
+    ]
+    AsientoStock.objects.bulk_create(asientos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('divisas', '0009_alter_limiteconfig_limite_diario_and_more'),
+        ('stock', '0003_alter_movimientostock_estado_and_more'),
+        ('tauser', '0003_alter_tauser_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('motivo', models.CharField(choices=[(apps.stock.enums.MotivoAsiento['MOVIMIENTO'], 'Movimiento de stock'), (apps.stock.enums.MotivoAsiento['CANCELACION'], 'Cancelación de movimiento de stock'), (apps.stock.enums.MotivoAsiento['AJUSTE'], 'Ajuste de conciliación')], max_length=20)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('denominacion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='divisas.denominacion')),
+                ('movimiento_stock', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='stock.movimientostock')),
+                ('tauser', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='tauser.tauser')),
+            ],
+            options={
+                'verbose_name': 'Asiento de Stock',
+                'verbose_name_plural': 'Asientos de Stock',
+                'indexes': [models.Index(fields=['tauser', 'fecha'], name='idx_asiento_tauser_fecha')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField()),
+                ('fecha', models.DateTimeField()),
+                ('denominacion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='divisas.denominacion')),
+                ('tauser', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='tauser.tauser')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Stock',
+                'verbose_name_plural': 'Snapshots de Stock',
+                'indexes': [models.Index(fields=['tauser', 'fecha'], name='idx_snapshot_tauser_fecha')],
+            },
+        ),
+        migrations.RunPython(abrir_libro_stock, migrations.RunPython.noop),
+    ]
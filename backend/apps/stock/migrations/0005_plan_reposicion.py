@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:30
+
+import apps.stock.enums
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('divisas', '0009_alter_limiteconfig_limite_diario_and_more'),
+        ('stock', '0004_libro_stock'),
+        ('tauser', '0003_alter_tauser_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanReposicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_movimiento', models.CharField(choices=[(apps.stock.enums.TipoMovimiento['SALCLT'], 'Salida de stock para el cliente'), (apps.stock.enums.TipoMovimiento['ENTCLT'], 'Entrada de stock del cliente'), (apps.stock.enums.TipoMovimiento['SALCS'], 'Salida de stock para la casa'), (apps.stock.enums.TipoMovimiento['ENTCS'], 'Entrada de stock para la casa')], max_length=20)),
+                ('cantidad', models.IntegerField()),
+                ('stock_actual', models.IntegerField()),
+                ('stock_objetivo', models.IntegerField()),
+                ('demanda_diaria', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('denominacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='divisas.denominacion')),
+                ('tauser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tauser.tauser')),
+            ],
+            options={
+                'verbose_name': 'Plan de Reposición',
+                'verbose_name_plural': 'Planes de Reposición',
+                'ordering': ['fecha', 'tauser', 'denominacion'],
+                'unique_together': {('fecha', 'tauser', 'denominacion')},
+            },
+        ),
+    ]
@@ -1,8 +1,9 @@
 from django.db import models
+from django.utils import timezone
 from apps.divisas.models import Denominacion, Divisa
 from apps.tauser.models import Tauser
 from apps.operaciones.models import Transaccion
-from apps.stock.enums import EstadoMovimiento as estados, TipoMovimiento as tipos
+from apps.stock.enums import EstadoMovimiento as estados, TipoMovimiento as tipos, MotivoAsiento as motivos
 
 TIPO_CHOICES = [
     (tipos.SALCLT, "Salida de stock para el cliente"),
@@ -17,6 +18,12 @@ ESTADO_CHOICES = [
     (estados.CANCELADO, "Movimiento de stock cancelado"),
 ]
 
+MOTIVO_CHOICES = [
+    (motivos.MOVIMIENTO, "Movimiento de stock"),
+    (motivos.CANCELACION, "Cancelación de movimiento de stock"),
+    (motivos.AJUSTE, "Ajuste de conciliación"),
+]
+
 TIPOS = [tipo[0] for tipo in TIPO_CHOICES]
 ESTADOS = [estado[0] for estado in ESTADO_CHOICES]
 class StockDivisaCasa(models.Model):
@@ -63,3 +70,72 @@ class MovimientoStockDetalle(models.Model):
     movimiento_stock = models.ForeignKey(
         MovimientoStock, on_delete=models.CASCADE)
     denominacion = models.ForeignKey(Denominacion, on_delete=models.PROTECT)
+
+
+class AsientoStock(models.Model):
+    """
+    Entrada inmutable del libro de stock.
+
+    Cada cambio en los contadores de stock registra aquí su variación con
+    signo. Un asiento sin tauser corresponde al stock de la casa.
+    """
+    tauser = models.ForeignKey(Tauser, null=True, on_delete=models.PROTECT)
+    denominacion = models.ForeignKey(Denominacion, on_delete=models.PROTECT)
+    cantidad = models.IntegerField()
+    motivo = models.CharField(max_length=20, choices=MOTIVO_CHOICES)
+    movimiento_stock = models.ForeignKey(
+        MovimientoStock, null=True, on_delete=models.PROTECT)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Asiento de Stock"
+        verbose_name_plural = "Asientos de Stock"
+        indexes = [
+            models.Index(fields=['tauser', 'fecha'],
+                         name='idx_asiento_tauser_fecha'),
+        ]
+
+
+class SnapshotStock(models.Model):
+    """
+    Foto periódica del stock de un tauser (o de la casa) por denominación.
+
+    El stock a una fecha se obtiene partiendo del último snapshot anterior
+    y sumando los asientos posteriores.
+    """
+    tauser = models.ForeignKey(Tauser, null=True, on_delete=models.PROTECT)
+    denominacion = models.ForeignKey(Denominacion, on_delete=models.PROTECT)
+    stock = models.IntegerField()
+    fecha = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Snapshot de Stock"
+        verbose_name_plural = "Snapshots de Stock"
+        indexes = [
+            models.Index(fields=['tauser', 'fecha'],
+                         name='idx_snapshot_tauser_fecha'),
+        ]
+
+
+class PlanReposicion(models.Model):
+    """
+    Transferencia propuesta entre la casa y un tauser para una denominación.
+
+    Cada ejecución del planificador reemplaza el plan del día. ENTCS lleva
+    billetes de la casa al tauser y SALCS los devuelve a la casa.
+    """
+    fecha = models.DateField()
+    tauser = models.ForeignKey(Tauser, on_delete=models.CASCADE)
+    denominacion = models.ForeignKey(Denominacion, on_delete=models.CASCADE)
+    tipo_movimiento = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    cantidad = models.IntegerField()
+    stock_actual = models.IntegerField()
+    stock_objetivo = models.IntegerField()
+    demanda_diaria = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Plan de Reposición"
+        verbose_name_plural = "Planes de Reposición"
+        unique_together = [['fecha', 'tauser', 'denominacion']]
+        ordering = ['fecha', 'tauser', 'denominacion']
@@ -4,11 +4,13 @@ from django.db.models import F
 from decimal import Decimal
 
 from .models import (
+    AsientoStock,
     MovimientoStock,
     MovimientoStockDetalle,
     StockDivisaCasa,
     StockDivisaTauser,
 )
+from .service import bloquear_stock, nuevo_asiento
 from apps.divisas.models import Denominacion
 from apps.divisas.serializers import DivisaSerializer, DenominacionSerializer
 from apps.operaciones.models import Transaccion
@@ -120,6 +122,13 @@ class MovimientoStockSerializer(serializers.ModelSerializer):
         detalles_data = validated_data.pop("detalles", [])
         codigo_tipo = validated_data["tipo_movimiento"]
         tauser = validated_data["tauser"]
+        divisa = validated_data["divisa"]
+
+        # Serializar contra otros movimientos sobre los mismos stocks
+        pares = [(tauser.pk, divisa.pk)]
+        if codigo_tipo in ("ENTCS", "SALCS"):
+            pares.append((None, divisa.pk))
+        bloquear_stock(pares)
 
         movimiento = MovimientoStock.objects.create(**validated_data)
         regla = self._get_regla_stock(codigo_tipo, tauser)
@@ -189,8 +198,10 @@ class MovimientoStockSerializer(serializers.ModelSerializer):
         Crea los detalles y actualiza el stock según la regla.
         
         Utiliza actualizaciones atómicas con F() expressions para prevenir race conditions
-        y garantizar la integridad del stock en operaciones concurrentes.
+        y garantizar la integridad del stock en operaciones concurrentes. Cada
+        variación se registra además como asiento en el libro de stock.
         """
+        asientos = []
         for det in detalles_data:
             denominacion = det["denominacion"]
             cantidad = det["cantidad"]
@@ -218,6 +229,7 @@ class MovimientoStockSerializer(serializers.ModelSerializer):
                     )
                 
                 stock_origen.refresh_from_db()
+                asientos.append(nuevo_asiento(stock_origen, -cantidad, movimiento))
 
             # Sumar al destino usando actualización atómica
             if regla["incrementa"]:
@@ -226,6 +238,9 @@ class MovimientoStockSerializer(serializers.ModelSerializer):
                 stock_destino.__class__.objects.filter(
                     id=stock_destino.id
                 ).update(stock=F('stock') + cantidad)
+                asientos.append(nuevo_asiento(stock_destino, cantidad, movimiento))
+
+        AsientoStock.objects.bulk_create(asientos)
 
     def _procesar_salida_cliente(self, movimiento, tauser, transaccion):
         """Calcula las denominaciones automáticamente para una salida al cliente."""
@@ -244,6 +259,7 @@ class MovimientoStockSerializer(serializers.ModelSerializer):
         except Transaccion.DoesNotExist:
             raise serializers.ValidationError(f"No existe la transacción {transaccion}")
 
+        asientos = []
         for stock_item in denominaciones:
             valor = stock_item.denominacion.denominacion
 
@@ -275,10 +291,13 @@ class MovimientoStockSerializer(serializers.ModelSerializer):
                     )
                 
                 stock_item.refresh_from_db()
+                asientos.append(nuevo_asiento(stock_item, -cantidad_a_usar, movimiento))
                 monto_restante -= Decimal(cantidad_a_usar) * valor
 
         if monto_restante > 0:
             raise serializers.ValidationError(
                 f"No hay suficiente stock para cubrir el monto total de {monto}."
-            )            
+            )
+
+        AsientoStock.objects.bulk_create(asientos)            
         
@@ -0,0 +1,489 @@
+"""
+Service layer para operaciones sobre el stock de tausers y de la casa.
+
+Agrupa las operaciones que deben resolverse en SQL sobre conjuntos de
+movimientos y la gestión del libro de stock (asientos y snapshots).
+"""
+import hashlib
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, F, Max, Sum
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+
+from .enums import EstadoMovimiento, MotivoAsiento, TipoMovimiento
+from .models import (
+    AsientoStock,
+    MovimientoStock,
+    MovimientoStockDetalle,
+    PlanReposicion,
+    SnapshotStock,
+    StockDivisaCasa,
+    StockDivisaTauser,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _clave_bloqueo(tauser_id, divisa_id) -> int:
+    """Convierte un par (tauser, divisa) en la clave bigint de un advisory lock."""
+    texto = f"stock:{tauser_id or 'casa'}:{divisa_id}".encode()
+    return int.from_bytes(hashlib.blake2b(texto, digest_size=8).digest(), "big", signed=True)
+
+
+def bloquear_stock(pares) -> None:
+    """
+    Toma advisory locks de transacción sobre el stock de cada (tauser, divisa).
+
+    Los locks se adquieren siempre en el mismo orden (por clave), de modo que
+    dos operaciones que compiten por los mismos stocks se serializan sin
+    riesgo de deadlock. Se liberan automáticamente al terminar la transacción,
+    por lo que debe llamarse dentro de un bloque atómico.
+
+    Args:
+        pares: Iterable de (tauser_id, divisa_id). Un tauser_id None
+            corresponde al stock de la casa.
+    """
+    claves = sorted({_clave_bloqueo(tauser_id, divisa_id) for tauser_id, divisa_id in pares})
+    if not claves:
+        return
+
+    with connection.cursor() as cursor:
+        for clave in claves:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [clave])
+
+
+@transaction.atomic
+def restaurar_stock_movimientos(movimiento_ids) -> int:
+    """
+    Devuelve al stock de cada tauser las cantidades de los movimientos indicados.
+
+    Ejecuta un único ``UPDATE ... FROM`` que suma, por (tauser, denominación),
+    las cantidades de los detalles de todos los movimientos, y registra en la
+    misma sentencia los asientos de cancelación del libro de stock. El
+    incremento se realiza en la base de datos, por lo que cancelaciones
+    concurrentes no pierden actualizaciones.
+
+    Args:
+        movimiento_ids: Iterable con los IDs de MovimientoStock a restaurar.
+
+    Returns:
+        int: Cantidad de filas de StockDivisaTauser actualizadas.
+    """
+    movimiento_ids = list(movimiento_ids)
+    if not movimiento_ids:
+        return 0
+
+    bloquear_stock(
+        MovimientoStock.objects.filter(id__in=movimiento_ids)
+        .values_list('tauser_id', 'divisa_id')
+        .distinct()
+    )
+
+    stock_table = StockDivisaTauser._meta.db_table
+    detalle_table = MovimientoStockDetalle._meta.db_table
+    movimiento_table = MovimientoStock._meta.db_table
+    asiento_table = AsientoStock._meta.db_table
+
+    sql = f"""
+        WITH por_movimiento AS (
+            SELECT d.movimiento_stock_id, m.tauser_id, d.denominacion_id,
+                   SUM(d.cantidad) AS cantidad
+            FROM {detalle_table} d
+            JOIN {movimiento_table} m ON m.id = d.movimiento_stock_id
+            WHERE d.movimiento_stock_id = ANY(%s)
+            GROUP BY d.movimiento_stock_id, m.tauser_id, d.denominacion_id
+        ),
+        detalles AS (
+            SELECT tauser_id, denominacion_id, SUM(cantidad) AS cantidad
+            FROM por_movimiento
+            GROUP BY tauser_id, denominacion_id
+        ),
+        actualizados AS (
+            UPDATE {stock_table} AS s
+            SET stock = s.stock + detalles.cantidad
+            FROM detalles
+            WHERE s.tauser_id = detalles.tauser_id
+              AND s.denominacion_id = detalles.denominacion_id
+            RETURNING s.tauser_id, s.denominacion_id
+        ),
+        asientos AS (
+            INSERT INTO {asiento_table}
+                (tauser_id, denominacion_id, cantidad, motivo, movimiento_stock_id, fecha)
+            SELECT p.tauser_id, p.denominacion_id, p.cantidad, %s, p.movimiento_stock_id, %s
+            FROM por_movimiento p
+            JOIN actualizados a
+                ON a.tauser_id = p.tauser_id
+               AND a.denominacion_id = p.denominacion_id
+        )
+        SELECT detalles.tauser_id, detalles.denominacion_id,
+               actualizados.denominacion_id IS NOT NULL
+        FROM detalles
+        LEFT JOIN actualizados
+            ON actualizados.tauser_id = detalles.tauser_id
+           AND actualizados.denominacion_id = detalles.denominacion_id
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            movimiento_ids,
+            str(MotivoAsiento.CANCELACION),
+            timezone.now(),
+        ])
+        filas = cursor.fetchall()
+
+    actualizados = 0
+    for tauser_id, denominacion_id, actualizado in filas:
+        if actualizado:
+            actualizados += 1
+            continue
+        logger.error(
+            f"No existe stock para denominación {denominacion_id} en el tauser {tauser_id}")
+
+    return actualizados
+
+
+
+def nuevo_asiento(stock, cantidad: int, movimiento=None, motivo=MotivoAsiento.MOVIMIENTO) -> AsientoStock:
+    """
+    Construye (sin guardar) el asiento correspondiente a una variación de stock.
+
+    Args:
+        stock: Instancia de StockDivisaTauser o StockDivisaCasa afectada.
+        cantidad: Variación con signo aplicada al contador.
+        movimiento: MovimientoStock que originó la variación (opcional).
+        motivo: Motivo del asiento.
+    """
+    return AsientoStock(
+        tauser_id=getattr(stock, "tauser_id", None),
+        denominacion_id=stock.denominacion_id,
+        cantidad=cantidad,
+        motivo=motivo,
+        movimiento_stock=movimiento,
+    )
+
+
+def stock_a_fecha(tauser_id=None, fecha=None) -> dict:
+    """
+    Calcula el stock por denominación de un tauser (o de la casa) a una fecha.
+
+    Parte del último snapshot anterior o igual a la fecha y suma los asientos
+    posteriores hasta la fecha indicada, sin tocar los contadores de stock.
+
+    Args:
+        tauser_id: ID del tauser. None corresponde al stock de la casa.
+        fecha: Fecha de corte. Por defecto, el momento actual.
+
+    Returns:
+        dict {denominacion_id: stock}
+    """
+    fecha = fecha or timezone.now()
+
+    snapshot_fecha = (
+        SnapshotStock.objects
+        .filter(tauser_id=tauser_id, fecha__lte=fecha)
+        .aggregate(ultima=Max('fecha'))['ultima']
+    )
+
+    stock = {}
+    asientos = AsientoStock.objects.filter(tauser_id=tauser_id, fecha__lte=fecha)
+    if snapshot_fecha:
+        stock = dict(
+            SnapshotStock.objects
+            .filter(tauser_id=tauser_id, fecha=snapshot_fecha)
+            .values_list('denominacion_id', 'stock')
+        )
+        asientos = asientos.filter(fecha__gt=snapshot_fecha)
+
+    variaciones = (
+        asientos.values('denominacion_id')
+        .annotate(total=Sum('cantidad'))
+        .values_list('denominacion_id', 'total')
+    )
+    for denominacion_id, total in variaciones:
+        stock[denominacion_id] = stock.get(denominacion_id, 0) + total
+
+    return stock
+
+
+@transaction.atomic
+def generar_snapshots(fecha=None, margen=timedelta(minutes=5)) -> int:
+    """
+    Genera snapshots del stock de la casa y de cada tauser con asientos nuevos.
+
+    La fecha de corte se retrasa en ``margen`` para que las transacciones en
+    curso terminen de registrar sus asientos antes de consolidarlos.
+
+    Returns:
+        int: Cantidad de snapshots (tauser o casa) generados.
+    """
+    corte = (fecha or timezone.now()) - margen
+
+    ultimos = dict(
+        SnapshotStock.objects.values('tauser_id')
+        .annotate(ultima=Max('fecha'))
+        .values_list('tauser_id', 'ultima')
+    )
+    con_asientos = (
+        AsientoStock.objects.filter(fecha__lte=corte)
+        .values_list('tauser_id', flat=True)
+        .distinct()
+    )
+
+    generados = 0
+    for tauser_id in con_asientos:
+        ultima = ultimos.get(tauser_id)
+        if ultima and not AsientoStock.objects.filter(
+                tauser_id=tauser_id, fecha__gt=ultima, fecha__lte=corte).exists():
+            continue
+
+        SnapshotStock.objects.bulk_create([
+            SnapshotStock(tauser_id=tauser_id, denominacion_id=denominacion_id,
+                          stock=cantidad, fecha=corte)
+            for denominacion_id, cantidad in stock_a_fecha(tauser_id, corte).items()
+        ])
+        generados += 1
+
+    return generados
+
+
+@transaction.atomic
+def conciliar_stock(ajustar: bool = False) -> list:
+    """
+    Compara los contadores de stock con el saldo del libro.
+
+    Args:
+        ajustar: Si es True, registra asientos de ajuste por cada diferencia
+            para que el libro vuelva a coincidir con los contadores.
+
+    Returns:
+        list de dicts con tauser_id, denominacion_id, contador, libro y diferencia.
+    """
+    saldos = {
+        (tauser_id, denominacion_id): total
+        for tauser_id, denominacion_id, total in (
+            AsientoStock.objects.values('tauser_id', 'denominacion_id')
+            .annotate(total=Sum('cantidad'))
+            .values_list('tauser_id', 'denominacion_id', 'total')
+        )
+    }
+
+    contadores = {
+        (tauser_id, denominacion_id): stock
+        for tauser_id, denominacion_id, stock in
+        StockDivisaTauser.objects.values_list('tauser_id', 'denominacion_id', 'stock')
+    }
+    contadores.update({
+        (None, denominacion_id): stock
+        for denominacion_id, stock in
+        StockDivisaCasa.objects.values_list('denominacion_id', 'stock')
+    })
+
+    diferencias = []
+    for clave in contadores.keys() | saldos.keys():
+        contador = contadores.get(clave, 0)
+        libro = saldos.get(clave, 0)
+        if contador != libro:
+            diferencias.append({
+                "tauser_id": clave[0],
+                "denominacion_id": clave[1],
+                "contador": contador,
+                "libro": libro,
+                "diferencia": contador - libro,
+            })
+
+    if ajustar and diferencias:
+        AsientoStock.objects.bulk_create([
+            AsientoStock(
+                tauser_id=d["tauser_id"],
+                denominacion_id=d["denominacion_id"],
+                cantidad=d["diferencia"],
+                motivo=MotivoAsiento.AJUSTE,
+            )
+            for d in diferencias
+        ])
+
+    return diferencias
+
+
+def _monto_stock():
+    """Expresión SQL del monto representado por un registro de stock."""
+    return Sum(Cast('denominacion__denominacion', BigIntegerField()) * F('stock'))
+
+
+def totales_por_divisa(queryset, *agrupar_por) -> list:
+    """
+    Agrega en SQL el monto total (denominación × stock) por divisa.
+
+    Args:
+        queryset: QuerySet de StockDivisaTauser o StockDivisaCasa.
+        *agrupar_por: Campos adicionales de agrupación (ej. 'tauser_id').
+
+    Returns:
+        list de dicts con divisa_id, divisa_codigo, divisa_nombre, monto y
+        los campos de agrupación solicitados.
+    """
+    return list(
+        queryset
+        .values(
+            *agrupar_por,
+            divisa_id=F('denominacion__divisa_id'),
+            divisa_codigo=F('denominacion__divisa__codigo'),
+            divisa_nombre=F('denominacion__divisa__nombre'),
+        )
+        .annotate(monto=_monto_stock())
+        .order_by(*agrupar_por, 'divisa_codigo')
+    )
+
+
+def detalle_por_denominacion(queryset, *campos) -> list:
+    """Proyecta el stock por denominación sin instanciar modelos."""
+    return list(
+        queryset
+        .values(
+            *campos,
+            'denominacion_id',
+            stock_id=F('id'),
+            denominacion_valor=F('denominacion__denominacion'),
+            divisa_id=F('denominacion__divisa_id'),
+            divisa_codigo=F('denominacion__divisa__codigo'),
+            divisa_nombre=F('denominacion__divisa__nombre'),
+            cantidad=F('stock'),
+        )
+        .order_by(*campos, 'divisa_codigo', '-denominacion__denominacion')
+    )
+
+
+def _suavizado_exponencial(serie, alfa: float) -> float:
+    """Pronóstico de un paso por suavizado exponencial simple, iniciado en la media."""
+    nivel = sum(serie) / len(serie)
+    for valor in serie:
+        nivel = alfa * valor + (1 - alfa) * nivel
+    return nivel
+
+
+def demanda_diaria_por_denominacion(desde, hasta) -> dict:
+    """
+    Agrupa en SQL las salidas a clientes por (tauser, denominación, día).
+
+    Returns:
+        dict {(tauser_id, denominacion_id): {fecha: cantidad}}
+    """
+    filas = (
+        MovimientoStockDetalle.objects
+        .filter(
+            movimiento_stock__tipo_movimiento=TipoMovimiento.SALCLT,
+            movimiento_stock__fecha__gte=desde,
+            movimiento_stock__fecha__lt=hasta,
+        )
+        .exclude(movimiento_stock__estado=EstadoMovimiento.CANCELADO)
+        .values(
+            'denominacion_id',
+            tauser_id=F('movimiento_stock__tauser_id'),
+            dia=TruncDate('movimiento_stock__fecha'),
+        )
+        .annotate(cantidad=Sum('cantidad'))
+        .values_list('tauser_id', 'denominacion_id', 'dia', 'cantidad')
+    )
+
+    demanda = defaultdict(dict)
+    for tauser_id, denominacion_id, dia, cantidad in filas:
+        demanda[(tauser_id, denominacion_id)][dia] = cantidad
+    return demanda
+
+
+@transaction.atomic
+def planificar_reposicion(fecha=None, dias_historia: int = 28, dias_cobertura: int = 3,
+                          factor_maximo: float = 2.0, alfa: float = 0.3) -> list:
+    """
+    Genera el plan de reposición de efectivo de toda la red de tausers.
+
+    Para cada (tauser, denominación) con salidas a clientes en la ventana de
+    historia se pronostica la demanda diaria por suavizado exponencial sobre
+    buckets diarios (los días sin movimientos cuentan como cero). El stock
+    objetivo cubre ``dias_cobertura`` días de demanda:
+
+    - Si el stock está por debajo del objetivo se propone un ENTCS desde la
+      casa. El stock de la casa se asigna primero a los tausers con menos
+      días de cobertura.
+    - Si supera ``factor_maximo`` veces el objetivo se propone un SALCS del
+      excedente hacia la casa.
+
+    Las denominaciones que sólo reciben depósitos (demanda cero) devuelven
+    a la casa todo su stock. El plan del día se reemplaza en cada ejecución.
+
+    Returns:
+        list de PlanReposicion creados.
+    """
+    ahora = timezone.localtime(fecha) if fecha else timezone.localtime()
+    hoy = ahora.date()
+    desde = hoy - timedelta(days=dias_historia)
+    dias = [desde + timedelta(days=i) for i in range(dias_historia)]
+
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hoy, time.min))
+    historial = demanda_diaria_por_denominacion(inicio, fin)
+
+    pares_con_stock = {
+        (tauser_id, denominacion_id): stock
+        for tauser_id, denominacion_id, stock in
+        StockDivisaTauser.objects.values_list('tauser_id', 'denominacion_id', 'stock')
+    }
+    pares_con_depositos = set(
+        MovimientoStockDetalle.objects
+        .filter(
+            movimiento_stock__tipo_movimiento=TipoMovimiento.ENTCLT,
+            movimiento_stock__fecha__gte=inicio,
+            movimiento_stock__fecha__lt=fin,
+        )
+        .exclude(movimiento_stock__estado=EstadoMovimiento.CANCELADO)
+        .values_list('movimiento_stock__tauser_id', 'denominacion_id')
+        .distinct()
+    )
+    disponible_casa = dict(
+        StockDivisaCasa.objects.values_list('denominacion_id', 'stock'))
+
+    planes = []
+    faltantes = []
+    for par in historial.keys() | pares_con_depositos:
+        tauser_id, denominacion_id = par
+        stock = pares_con_stock.get(par, 0)
+        serie = [historial.get(par, {}).get(dia, 0) for dia in dias]
+        demanda = max(_suavizado_exponencial(serie, alfa), 0.0)
+        objetivo = math.ceil(demanda * dias_cobertura)
+
+        plan = PlanReposicion(
+            fecha=hoy,
+            tauser_id=tauser_id,
+            denominacion_id=denominacion_id,
+            stock_actual=stock,
+            stock_objetivo=objetivo,
+            demanda_diaria=round(demanda, 2),
+        )
+        if stock < objetivo:
+            plan.tipo_movimiento = TipoMovimiento.ENTCS
+            plan.cantidad = objetivo - stock
+            faltantes.append((stock / demanda, plan))
+        elif stock > objetivo * factor_maximo:
+            plan.tipo_movimiento = TipoMovimiento.SALCS
+            plan.cantidad = stock - objetivo
+            planes.append(plan)
+
+    faltantes.sort(key=lambda item: item[0])
+    for _, plan in faltantes:
+        asignable = min(plan.cantidad, disponible_casa.get(plan.denominacion_id, 0))
+        if asignable <= 0:
+            logger.warning(
+                f"La casa no tiene stock de la denominación {plan.denominacion_id} "
+                f"para reponer al tauser {plan.tauser_id}")
+            continue
+        disponible_casa[plan.denominacion_id] -= asignable
+        plan.cantidad = asignable
+        planes.append(plan)
+
+    PlanReposicion.objects.filter(fecha=hoy).delete()
+    return PlanReposicion.objects.bulk_create(planes)
@@ -0,0 +1,27 @@
+from celery import shared_task
+
+from .service import generar_snapshots, planificar_reposicion
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def generar_snapshots_stock():
+    logger.info("Iniciando generación de snapshots de stock...")
+
+    generados = generar_snapshots()
+
+    logger.info(f"Se generaron snapshots de stock para {generados} tausers/casa")
+
+    return generados
+
+
+@shared_task
+def planificar_reposicion_stock():
+    logger.info("Iniciando planificación de reposición de stock...")
+
+    planes = planificar_reposicion()
+
+    logger.info(f"Se propusieron {len(planes)} transferencias de stock")
+
+    return len(planes)
@@ -2,6 +2,7 @@ from collections import OrderedDict
 from decimal import Decimal
 from datetime import datetime, time
 
+from django.db.models import F, Max
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime, parse_date
 from rest_framework import viewsets, status, permissions
@@ -10,6 +11,8 @@ from rest_framework.decorators import action
 
 from . import serializers
 from . import models
+from .service import detalle_por_denominacion, stock_a_fecha, totales_por_divisa
+from apps.divisas.models import Denominacion
 from apps.tauser.models import Tauser
 from apps.tauser.serializers import TauserSerializer
 
@@ -81,6 +84,9 @@ class MovimientoStockViewset(viewsets.ModelViewSet):
     def resumen(self, request):
         """
         Retorna el stock disponible tanto en la casa como en un Tauser específico.
+
+        Los totales por divisa se agregan en la base de datos. El detalle por
+        denominación se incluye por defecto y puede omitirse con 'detalle=false'.
         """
         tauser_id = request.query_params.get('tauser')
         if not tauser_id:
@@ -96,23 +102,157 @@ class MovimientoStockViewset(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        tauser_stock = (
-            models.StockDivisaTauser.objects
-            .filter(tauser_id=tauser_id)
-            .select_related('denominacion__divisa', 'tauser')
-            .all()
-        )
-        
-        casa_stock = models.StockDivisaCasa.objects.all(
-        ).select_related('denominacion__divisa')
+        incluir_detalle = self._bool_param(request.query_params.get('detalle'), True)
+        tauser_stock = models.StockDivisaTauser.objects.filter(tauser_id=tauser_id)
+        casa_stock = models.StockDivisaCasa.objects.all()
 
         response_data = {
             "tauser": self._serialize_stock(
-                tauser_stock, tauser_record),
-            "casa": self._serialize_stock(casa_stock),
+                tauser_stock, tauser_record, incluir_detalle),
+            "casa": self._serialize_stock(casa_stock, detalle=incluir_detalle),
         }
         return Response(response_data)
 
+    @action(detail=False, methods=['get'], url_path='resumen-red')
+    def resumen_red(self, request):
+        """
+        Retorna la posición de efectivo por divisa de todos los Tausers y de la
+        casa, agregada en una sola consulta por tabla de stock.
+
+        Parámetros opcionales: 'divisa' para filtrar y 'detalle=true' para
+        incluir el desglose por denominación de cada Tauser.
+        """
+        divisa_id = request.query_params.get('divisa')
+        incluir_detalle = self._bool_param(request.query_params.get('detalle'), False)
+
+        tauser_stock = models.StockDivisaTauser.objects.all()
+        casa_stock = models.StockDivisaCasa.objects.all()
+        if divisa_id:
+            tauser_stock = tauser_stock.filter(denominacion__divisa_id=divisa_id)
+            casa_stock = casa_stock.filter(denominacion__divisa_id=divisa_id)
+
+        tausers = OrderedDict()
+        red = OrderedDict()
+        for fila in totales_por_divisa(
+                tauser_stock, 'tauser_id', 'tauser__codigo', 'tauser__nombre'):
+            tauser = tausers.setdefault(fila.pop('tauser_id'), {
+                "tauser_codigo": fila.pop('tauser__codigo'),
+                "tauser_nombre": fila.pop('tauser__nombre'),
+                "totales": [],
+            })
+            tauser["totales"].append({**fila, "monto": str(fila["monto"])})
+            self._acumular_total(red, fila)
+
+        if incluir_detalle:
+            for fila in detalle_por_denominacion(tauser_stock, 'tauser_id'):
+                tauser = tausers.get(fila.pop('tauser_id'))
+                if tauser is not None:
+                    tauser.setdefault("detalle", []).append(fila)
+
+        casa = self._serialize_stock(casa_stock, detalle=False)
+        for fila in casa["totales"]:
+            self._acumular_total(red, fila)
+
+        return Response({
+            "tausers": [
+                {"tauser_id": tauser_id, **info}
+                for tauser_id, info in tausers.items()
+            ],
+            "casa": casa,
+            "totales": [
+                {**info, "monto": str(info["monto"])}
+                for info in red.values()
+            ],
+        })
+
+    @action(detail=False, methods=['get'], url_path='stock-historico')
+    def stock_historico(self, request):
+        """
+        Retorna el stock por denominación de un Tauser (o de la casa si no se
+        indica 'tauser') a la fecha indicada, calculado desde el libro de stock.
+        """
+        tauser_id = request.query_params.get('tauser')
+        tauser_record = None
+        if tauser_id:
+            tauser_record = Tauser.objects.filter(id=tauser_id).first()
+            if not tauser_record:
+                return Response(
+                    {"detail": "El Tauser especificado no existe."},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        fecha_param = request.query_params.get('fecha')
+        fecha = self._parse_datetime_param(fecha_param, end=True)
+        if fecha_param and not fecha:
+            return Response(
+                {"detail": "El parámetro 'fecha' no tiene un formato válido."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        fecha = fecha or timezone.now()
+
+        stock = stock_a_fecha(tauser_record.id if tauser_record else None, fecha)
+        denominaciones = (
+            Denominacion.objects
+            .filter(id__in=stock.keys())
+            .select_related('divisa')
+            .order_by('divisa__codigo', '-denominacion')
+        )
+
+        detalle = [
+            {
+                "denominacion_id": denominacion.id,
+                "denominacion_valor": denominacion.denominacion,
+                "divisa_id": denominacion.divisa.id,
+                "divisa_codigo": denominacion.divisa.codigo,
+                "cantidad": stock[denominacion.id],
+            }
+            for denominacion in denominaciones
+        ]
+
+        payload = {"fecha": fecha, "detalle": detalle}
+        if tauser_record:
+            payload["tauser_info"] = TauserSerializer(tauser_record).data
+        return Response(payload)
+
+    @action(detail=False, methods=['get'], url_path='plan-reposicion')
+    def plan_reposicion(self, request):
+        """
+        Retorna el último plan de reposición generado (o el de la fecha
+        indicada), opcionalmente filtrado por 'tauser'.
+        """
+        fecha_param = request.query_params.get('fecha')
+        fecha = parse_date(fecha_param) if fecha_param else None
+        if fecha_param and not fecha:
+            return Response(
+                {"detail": "El parámetro 'fecha' no tiene un formato válido."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        planes = models.PlanReposicion.objects.all()
+        fecha = fecha or planes.aggregate(ultima=Max('fecha'))['ultima']
+
+        planes = planes.filter(fecha=fecha)
+        tauser_id = request.query_params.get('tauser')
+        if tauser_id:
+            planes = planes.filter(tauser_id=tauser_id)
+
+        return Response({
+            "fecha": fecha,
+            "transferencias": list(planes.values(
+                'tauser_id',
+                'denominacion_id',
+                'tipo_movimiento',
+                'cantidad',
+                'stock_actual',
+                'stock_objetivo',
+                'demanda_diaria',
+                tauser_codigo=F('tauser__codigo'),
+                denominacion_valor=F('denominacion__denominacion'),
+                divisa_id=F('denominacion__divisa_id'),
+                divisa_codigo=F('denominacion__divisa__codigo'),
+            )),
+        })
+
     @action(detail=True, methods=['get'])
     def detalles(self, request, pk=None):
         """
@@ -152,45 +292,31 @@ class MovimientoStockViewset(viewsets.ModelViewSet):
 
         return dt
 
-    def _serialize_stock(self, queryset, tauser=None):
-        detalle = []
-        totales = OrderedDict()
+    def _bool_param(self, value, default):
+        if value is None:
+            return default
+        return value.strip().lower() in ('1', 'true', 'si', 'yes')
 
-        for item in queryset:
-            denominacion = item.denominacion
-            divisa = denominacion.divisa
-            detalle.append({
-                "stock_id": item.id,
-                "denominacion_id": denominacion.id,
-                "denominacion_valor": denominacion.denominacion,
-                "divisa_id": divisa.id,
-                "divisa_codigo": divisa.codigo,
-                "divisa_nombre": divisa.nombre,
-                "cantidad": item.stock,
-            })
-
-            if divisa.id not in totales:
-                totales[divisa.id] = {
-                    "divisa_id": divisa.id,
-                    "divisa_codigo": divisa.codigo,
-                    "divisa_nombre": divisa.nombre,
-                    "monto": Decimal('0')
-                }
-
-            totales[divisa.id]["monto"] += Decimal(
-                str(denominacion.denominacion)) * Decimal(item.stock)
+    def _acumular_total(self, totales, fila):
+        total = totales.setdefault(fila["divisa_id"], {
+            "divisa_id": fila["divisa_id"],
+            "divisa_codigo": fila["divisa_codigo"],
+            "divisa_nombre": fila["divisa_nombre"],
+            "monto": Decimal('0'),
+        })
+        total["monto"] += Decimal(str(fila["monto"]))
 
+    def _serialize_stock(self, queryset, tauser=None, detalle=True):
         payload = {
-            "detalle": detalle,
             "totales": [
-                {
-                    **info,
-                    "monto": str(info["monto"])
-                }
-                for info in totales.values()
+                {**fila, "monto": str(fila["monto"])}
+                for fila in totales_por_divisa(queryset)
             ]
         }
 
+        if detalle:
+            payload["detalle"] = detalle_por_denominacion(queryset)
+
         if tauser:
             payload["tauser_info"] = TauserSerializer(tauser).data
 
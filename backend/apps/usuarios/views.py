@@ -14,6 +14,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from apps.clientes.models import Cliente
 from apps.clientes.serializers import ClienteSerializer
+from apps.clientes.service import anotar_gastos
 from django.contrib.auth.models import Group
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -128,7 +129,7 @@ class UserViewSet(viewsets.ModelViewSet):
             Response: Lista de clientes asignados al usuario.
         """
         usuario = self.get_object()
-        clientes = usuario.clientes.filter(is_active=True)
+        clientes = anotar_gastos(usuario.clientes.filter(is_active=True))
         serializer = ClienteSerializer(clientes, many=True)
         return Response(serializer.data)
 
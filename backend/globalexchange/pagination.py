@@ -0,0 +1,115 @@
+"""
+Paginación compartida por las APIs del proyecto.
+"""
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre un queryset de ``values()``.
+
+    Las subclases definen ``ordenamiento``: pares (campo, conversión) con los
+    campos del ORDER BY del queryset, con '-' si son descendentes, y la
+    función que convierte el valor guardado en el cursor a su tipo. El último
+    campo debe ser único. Cada página continúa desde la última fila de la
+    anterior, de modo que su costo no depende de la posición en el listado.
+
+    Respuesta: {"next": url o null, "cursor": str o null, "results": [...]}
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    ordenamiento = ()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.cursor_siguiente = None
+
+        posicion = self.decode_cursor(request)
+        if posicion:
+            queryset = self.filtrar_desde(queryset, posicion)
+
+        filas = list(queryset[:self.page_size + 1])
+        if len(filas) > self.page_size:
+            filas = filas[:self.page_size]
+            ultima = filas[-1]
+            self.cursor_siguiente = self.encode_cursor(
+                [ultima[campo.lstrip('-')] for campo, _ in self.ordenamiento])
+        return filas
+
+    def filtrar_desde(self, queryset, posicion):
+        """Filas posteriores a ``posicion`` según ``ordenamiento``."""
+        primero = self.ordenamiento[0][0]
+        # El filtro sobre el primer campo acota el rango recorrido del índice
+        queryset = queryset.filter(**{
+            f"{primero.lstrip('-')}__{'lte' if primero.startswith('-') else 'gte'}": posicion[0]
+        })
+
+        condicion = Q()
+        iguales = {}
+        for (campo, _), valor in zip(self.ordenamiento, posicion):
+            nombre = campo.lstrip('-')
+            comparacion = 'lt' if campo.startswith('-') else 'gt'
+            condicion |= Q(**iguales, **{f'{nombre}__{comparacion}': valor})
+            iguales[nombre] = valor
+        return queryset.filter(condicion)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, valores):
+        contenido = json.dumps([
+            valor.isoformat() if hasattr(valor, 'isoformat')
+            else str(valor) if isinstance(valor, Decimal)
+            else valor
+            for valor in valores
+        ])
+        return base64.urlsafe_b64encode(contenido.encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(valores, list) or len(valores) != len(self.ordenamiento):
+                raise ValueError
+            posicion = []
+            for (_, convertir), valor in zip(self.ordenamiento, valores):
+                convertido = convertir(valor)
+                if convertido is None:
+                    raise ValueError
+                posicion.append(convertido)
+            return posicion
+        except (TypeError, ValueError, InvalidOperation):
+            raise NotFound("Cursor inválido")
+
+    def get_next_link(self):
+        if not self.cursor_siguiente:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.cursor_siguiente
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'cursor': self.cursor_siguiente,
+            'results': data,
+        })
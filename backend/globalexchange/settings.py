@@ -210,12 +210,20 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
 CELERY_BEAT_SCHEDULE = {
-    'reiniciar-limites-diarios': {
-        'task': 'apps.clientes.tasks.resetear_limite_diario',
-        'schedule': crontab(hour=6, minute=6)
+    'generar-snapshots-stock': {
+        'task': 'apps.stock.tasks.generar_snapshots_stock',
+        'schedule': crontab(minute=15)
     },
-    'reiniciar-limites-mensuales': {
-        'task': 'apps.clientes.tasks.resetear_limite_mensual',
-        'schedule': crontab(hour=6, minute=0, day_of_month=1)
+    'planificar-reposicion-stock': {
+        'task': 'apps.stock.tasks.planificar_reposicion_stock',
+        'schedule': crontab(hour=5, minute=30)
+    },
+    'expirar-transacciones-pendientes': {
+        'task': 'apps.operaciones.tasks.expirar_transacciones_pendientes',
+        'schedule': crontab(minute='*/5')
+    },
+    'purgar-solicitudes-idempotentes': {
+        'task': 'apps.operaciones.tasks.purgar_solicitudes_idempotentes',
+        'schedule': crontab(minute=40)
     }
 }
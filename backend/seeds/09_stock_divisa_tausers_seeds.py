@@ -2,6 +2,7 @@ from collections import defaultdict
 
 from apps.divisas.models import Denominacion
 from apps.stock.models import StockDivisaTauser
+from apps.stock.service import conciliar_stock
 from apps.tauser.models import Tauser
 
 
@@ -66,5 +67,8 @@ def run():
             print(f"   - Stock seeded for Tauser {tauser.codigo} in {currency_code}.")
 
     print(f">> Stock entries created: {total_created}, updated: {total_updated}.")
+
+    ajustes = conciliar_stock(ajustar=True)
+    print(f">> Stock ledger adjusted for {len(ajustes)} entries.")
     print(">> Tauser denomination stock seeding completed.")
 
@@ -14,6 +14,7 @@ from apps.usuarios.models import User
 from apps.divisas.models import Divisa
 from apps.clientes.models import Cliente
 from apps.ganancias.models import Ganancia
+from apps.ganancias.service import GananciaService
 from apps.operaciones.models import Transaccion
 import os
 import sys
@@ -222,6 +223,9 @@ def run():
     print(f"✔ Creadas {transacciones_creadas} transacciones completadas")
     print(f"✔ Generadas {ganancias_creadas} ganancias")
 
+    filas_resumen = GananciaService.reconstruir_ganancia_diaria()
+    print(f"✔ Resumen diario de ganancias reconstruido ({filas_resumen} filas)")
+
     # Estadísticas
     total_ganancia = Ganancia.objects.aggregate(
         total=models.Sum('ganancia_neta')
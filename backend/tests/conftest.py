@@ -0,0 +1,103 @@
+"""
+Fixtures compartidas por los tests de stock y de operaciones.
+"""
+import pytest
+from decimal import Decimal
+
+from apps.clientes.models import Cliente, CategoriaCliente
+from apps.divisas.models import Denominacion, Divisa
+from apps.operaciones.models import Transaccion
+from apps.stock.enums import TipoMovimiento, EstadoMovimiento
+from apps.stock.models import StockDivisaCasa, StockDivisaTauser
+from apps.tauser.models import Tauser
+from apps.usuarios.models import User
+
+
+@pytest.fixture
+def setup_data(db):
+    """Tauser con 10 billetes de 100, 50 y 20 USD y 50 de cada uno en la casa."""
+    # Crear objetos base
+    user = User.objects.create_user(username="test", password="test")
+    categoria = CategoriaCliente.objects.create(nombre="Test")
+    cliente = Cliente.objects.create(
+        nombre="Cliente Test",
+        cedula="1234567",
+        correo="cliente@test.com",
+        telefono="0981000000",
+        direccion="Av. Principal 123",
+        is_active=True,
+        id_categoria=categoria
+    )
+    
+    tauser = Tauser.objects.create(
+        codigo="CASA",
+        nombre="Casa Central",
+        direccion="Av. Principal 123",
+        ciudad="Asunción",
+        departamento="Central",
+        latitud=Decimal("-25.2637"),
+        longitud=Decimal("-57.5759"),
+    )
+
+    divisa = Divisa.objects.create(
+        codigo="USD",
+        nombre="Dólar estadounidense",
+        simbolo="$",
+        is_active=True,
+        max_digitos=30,
+        precision=10,
+        es_base=False
+    )
+
+    # Crear denominaciones de USD
+    denom_100 = Denominacion.objects.create(denominacion=100, divisa=divisa)
+    denom_50 = Denominacion.objects.create(denominacion=50, divisa=divisa)
+    denom_20 = Denominacion.objects.create(denominacion=20, divisa=divisa)
+
+    # Crear tipos de movimiento
+    ent_clt = TipoMovimiento.ENTCLT
+    ent_cs = TipoMovimiento.ENTCS
+    sal_clt = TipoMovimiento.SALCLT
+    sal_cs = TipoMovimiento.SALCS
+
+    estado_inicial = EstadoMovimiento.EN_PROCESO
+
+    # Crear stock inicial
+    StockDivisaCasa.objects.create(denominacion=denom_100, stock=50)
+    StockDivisaCasa.objects.create(denominacion=denom_50, stock=50)
+    StockDivisaCasa.objects.create(denominacion=denom_20, stock=50)
+
+    StockDivisaTauser.objects.create(tauser=tauser, denominacion=denom_100, stock=10)
+    StockDivisaTauser.objects.create(tauser=tauser, denominacion=denom_50, stock=10)
+    StockDivisaTauser.objects.create(tauser=tauser, denominacion=denom_20, stock=10)
+
+    return {
+        "tauser": tauser,
+        "denominaciones": [denom_100, denom_50, denom_20],
+        "tipos": {"ENTCLT": ent_clt, "ENTCS": ent_cs, "SALCLT": sal_clt, "SALCS": sal_cs},
+        "estado": estado_inicial,
+        "divisa": divisa,
+        "user": user,
+        "cliente": cliente
+    }
+
+
+@pytest.fixture
+def crear_venta(setup_data):
+    """Crea transacciones de venta pendientes sobre el tauser de ``setup_data``."""
+    def crear(monto, **campos):
+        datos = {
+            'id_user': setup_data["user"],
+            'cliente': setup_data["cliente"],
+            'operacion': 'venta',
+            'tasa_aplicada': Decimal('1.0'),
+            'tasa_inicial': Decimal('1.0'),
+            'divisa_origen': setup_data["divisa"],
+            'divisa_destino': setup_data["divisa"],
+            'monto_origen': monto,
+            'monto_destino': monto,
+            'tauser': setup_data["tauser"],
+            'estado': 'pendiente',
+        }
+        return Transaccion.objects.create(**{**datos, **campos})
+    return crear
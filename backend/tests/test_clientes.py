@@ -0,0 +1,193 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from apps.clientes.models import CategoriaCliente, Cliente, GastoDiarioCliente
+from apps.clientes.service import (
+    LIMITE_DIARIO,
+    LIMITE_MENSUAL,
+    liberar_gasto,
+    obtener_gastos,
+    registrar_gasto,
+    reservar_gasto,
+)
+from apps.divisas.models import LimiteConfig
+
+pytestmark = pytest.mark.django_db
+
+# -------------------- Fixtures --------------------
+
+@pytest.fixture
+def api_client(django_user_model):
+    """Cliente API autenticado para probar endpoints"""
+    user = django_user_model.objects.create_superuser(
+        username="admin_test",
+        password="admin_password",
+        email="admin@test.com"
+    )
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+@pytest.fixture
+def cliente():
+    """Cliente ya creado en la base de datos"""
+    categoria = CategoriaCliente.objects.create(nombre="TEST_CATEGORIA")
+    return Cliente.objects.create(
+        nombre="Cliente Test",
+        cedula="1234567",
+        correo="cliente@test.com",
+        telefono="0981000000",
+        direccion="Av. Principal 123",
+        id_categoria=categoria
+    )
+
+# -------------------- Gasto diario --------------------
+
+class TestGastoDiarioCliente:
+    """Pruebas del registro de gasto por cliente y día"""
+
+    def test_registrar_gasto_acumula_por_dia(self, cliente):
+        """Los gastos del mismo día se suman en un único registro"""
+        hoy = date(2025, 3, 15)
+        registrar_gasto(cliente.pk, Decimal("100"), fecha=hoy)
+        registrar_gasto(cliente.pk, Decimal("50.5"), fecha=hoy)
+        registrar_gasto(cliente.pk, Decimal("30"), fecha=date(2025, 3, 1))
+        registrar_gasto(cliente.pk, Decimal("999"), fecha=date(2025, 2, 28))
+
+        assert GastoDiarioCliente.objects.filter(cliente=cliente, fecha=hoy).count() == 1
+
+        with CaptureQueriesContext(connection) as consultas:
+            gastos = obtener_gastos(cliente.pk, fecha=hoy)
+        assert len(consultas.captured_queries) == 1
+        assert gastos == {"diario": Decimal("150.5"), "mensual": Decimal("180.5")}
+
+        # Al día siguiente el gasto diario arranca en cero sin reiniciar nada
+        gastos = obtener_gastos(cliente.pk, fecha=date(2025, 3, 16))
+        assert gastos == {"diario": Decimal("0"), "mensual": Decimal("180.5")}
+
+        # Y en un mes nuevo también el mensual
+        assert obtener_gastos(cliente.pk, fecha=date(2025, 4, 1))["mensual"] == Decimal("0")
+
+    def test_cliente_expone_gastos(self, api_client, cliente):
+        """El detalle y el listado del cliente incluyen el gasto actual"""
+        registrar_gasto(cliente.pk, Decimal("75"))
+        registrar_gasto(cliente.pk, Decimal("25"), fecha=timezone.localdate().replace(day=1))
+
+        response = api_client.get(reverse("clientes-detail", args=[cliente.pk]))
+        assert response.status_code == status.HTTP_200_OK
+        mensual = "100.0000000000"
+        if timezone.localdate().day == 1:
+            assert response.data["gasto_diario"] == mensual
+        else:
+            assert response.data["gasto_diario"] == "75.0000000000"
+        assert response.data["gasto_mensual"] == mensual
+
+        response = api_client.get(reverse("clientes-list"), {"all": "true"})
+        assert response.data[0]["gasto_mensual"] == mensual
+
+
+    def test_historial_sin_consulta_de_gasto_por_fila(self, api_client, cliente):
+        """El cliente anidado en el historial toma el gasto de una sola consulta"""
+        from apps.divisas.models import Divisa
+        from apps.metodos_financieros.models import MetodoFinanciero
+        from apps.operaciones.models import Transaccion
+        from apps.tauser.models import Tauser
+        from apps.usuarios.models import User
+
+        registrar_gasto(cliente.pk, Decimal("75"))
+        operador = User.objects.create_user(username="operador", password="1234")
+        base = Divisa.objects.create(codigo="PYG", nombre="Guaraní", simbolo="G", es_base=True)
+        usd = Divisa.objects.create(codigo="USD", nombre="Dólar", simbolo="$")
+        metodo = MetodoFinanciero.objects.create(nombre="EFECTIVO")
+        tauser = Tauser.objects.create(
+            codigo="TAU001", nombre="Terminal", direccion="-", ciudad="-",
+            departamento="-", latitud=Decimal("0"), longitud=Decimal("0"))
+        for _ in range(4):
+            Transaccion.objects.create(
+                id_user=operador, cliente=cliente, operacion="compra",
+                tasa_aplicada=Decimal("7200"), tasa_inicial=Decimal("7200"),
+                divisa_origen=usd, divisa_destino=base,
+                monto_origen=Decimal("10"), monto_destino=Decimal("72000"),
+                metodo_financiero=metodo, tauser=tauser)
+
+        url = reverse("clientes-get-transacciones", args=[cliente.pk])
+        with CaptureQueriesContext(connection) as consultas:
+            response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 4
+        assert {t["cliente_detalle"]["gasto_mensual"] for t in response.data} == {"75.0000000000"}
+        # La del cliente del endpoint y la del prefetch, sin importar las filas
+        assert len([q for q in consultas.captured_queries
+                    if "clientes_gastodiariocliente" in q["sql"]]) == 2
+
+    def test_listado_sin_anotar_registra_error(self, cliente, caplog):
+        """Un listado sin anotar_gastos devuelve el gasto real y lo registra como error"""
+        from apps.clientes.serializers import ClienteSerializer
+
+        registrar_gasto(cliente.pk, Decimal("75"))
+        with caplog.at_level("ERROR", logger="apps.clientes.serializers"):
+            data = ClienteSerializer(Cliente.objects.all(), many=True).data
+        assert data[0]["gasto_mensual"] == "75.0000000000"
+        assert len(caplog.records) == 1
+        assert "anotar_gastos" in caplog.records[0].getMessage()
+
+
+class TestReservaGasto:
+    """Pruebas de la reserva de gasto condicionada a los límites"""
+
+    @pytest.fixture(autouse=True)
+    def limites(self):
+        cfg = LimiteConfig.get_solo()
+        cfg.limite_diario = Decimal("100")
+        cfg.limite_mensual = Decimal("150")
+        cfg.save()
+
+    def test_reservar_gasto_respeta_limites(self, cliente):
+        """Sólo se registra el gasto que entra en los límites"""
+        dia = date(2025, 3, 15)
+        assert reservar_gasto(cliente.pk, Decimal("60"), dia) is None
+        assert reservar_gasto(cliente.pk, Decimal("50"), dia) == LIMITE_DIARIO
+        assert reservar_gasto(cliente.pk, Decimal("40"), dia) is None
+        assert obtener_gastos(cliente.pk, dia)["diario"] == Decimal("100")
+
+        siguiente = date(2025, 3, 16)
+        assert reservar_gasto(cliente.pk, Decimal("60"), siguiente) == LIMITE_MENSUAL
+        assert reservar_gasto(cliente.pk, Decimal("50"), siguiente) is None
+
+        # Un pago rechazado libera su reserva
+        liberar_gasto(cliente.pk, Decimal("50"), siguiente)
+        assert obtener_gastos(cliente.pk, siguiente) == {
+            "diario": Decimal("0"), "mensual": Decimal("100")}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_reservas_concurrentes_no_exceden_limite(cliente):
+    """Reservas en paralelo del mismo cliente no superan el límite mensual"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    cfg = LimiteConfig.get_solo()
+    cfg.limite_diario = None
+    cfg.limite_mensual = Decimal("100")
+    cfg.save()
+    inicio_mes = timezone.localdate().replace(day=1)
+    dias = [inicio_mes.replace(day=d) for d in range(1, 5)]
+
+    def reservar(indice):
+        try:
+            return reservar_gasto(cliente.pk, Decimal("30"), dias[indice % len(dias)])
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        resultados = list(pool.map(reservar, range(12)))
+
+    assert resultados.count(None) == 3
+    total = sum(GastoDiarioCliente.objects.values_list("monto", flat=True))
+    assert total == Decimal("90")
@@ -449,3 +449,137 @@ def test_crud_flow_con_permisos(api, usd_divisa):
     t = Tasa.objects.get(pk=tasa_id)
     assert t.activo is False
     assert Tasa.objects.filter(pk=tasa_id).exists()
+
+
+@pytest.mark.django_db
+def test_previsualizar_cambio_sobre_pendientes(api, usd_divisa):
+    from apps.clientes.models import CategoriaCliente, Cliente
+    from apps.metodos_financieros.models import (
+        Banco, CuentaBancaria, MetodoFinanciero, MetodoFinancieroDetalle,
+    )
+    from apps.operaciones.models import Transaccion
+    from apps.operaciones.service import calcular_operacion
+    from apps.tauser.models import Tauser
+
+    base = Divisa.objects.create(codigo="PYG", nombre="Guaraní", simbolo="G", es_base=True)
+    tasa = Tasa.objects.create(
+        divisa=usd_divisa, precioBase=Decimal("7300"),
+        comisionBaseCompra=Decimal("100"), comisionBaseVenta=Decimal("150"),
+    )
+    categoria = CategoriaCliente.objects.create(nombre="Minorista", descuento=0)
+    cliente = Cliente.objects.create(
+        nombre="Cliente", correo="cliente@test.com", telefono="0981", id_categoria=categoria)
+    efectivo = MetodoFinanciero.objects.create(nombre="EFECTIVO")
+    transferencia = MetodoFinanciero.objects.create(
+        nombre="TRANSFERENCIA_BANCARIA", comision_cobro_porcentaje=Decimal("5"))
+    detalle = MetodoFinancieroDetalle.objects.create(
+        cliente=cliente, metodo_financiero=transferencia, alias="Cuenta")
+    CuentaBancaria.objects.create(
+        metodo_financiero_detalle=detalle,
+        banco=Banco.objects.create(
+            nombre="Banco", cvu="0" * 22, comision_venta=Decimal("2"),
+            comision_personalizada_venta=True),
+        numero_cuenta="1", titular="Cliente", cbu_cvu="0" * 22,
+    )
+    tauser = Tauser.objects.create(
+        codigo="T1", nombre="Terminal", direccion="-", ciudad="-", departamento="-",
+        latitud=Decimal("0"), longitud=Decimal("0"))
+    operador = User.objects.create_user(username="operador", password="1234")
+
+    def crear(operacion, origen, destino, monto_origen, monto_destino, tc, estado="pendiente", **extra):
+        return Transaccion.objects.create(
+            id_user=operador, cliente=cliente, operacion=operacion,
+            tasa_aplicada=tc, tasa_inicial=tc, divisa_origen=origen, divisa_destino=destino,
+            monto_origen=monto_origen, monto_destino=monto_destino, tauser=tauser,
+            estado=estado, **extra)
+
+    crear("compra", usd_divisa, base, Decimal("100"), Decimal("720000"),
+                   Decimal("7200"), metodo_financiero=efectivo)
+    venta = crear("venta", base, usd_divisa, Decimal("759900"), Decimal("100"), Decimal("7599"),
+                  metodo_financiero=transferencia, metodo_financiero_detalle=detalle)
+    crear("compra", usd_divisa, base, Decimal("100"), Decimal("720000"), Decimal("7200"),
+          estado="completada", metodo_financiero=efectivo)
+
+    # La proyección en lote reproduce la tasa de calcular_operacion (comisión del banco)
+    actual = calcular_operacion(
+        divisa_origen_id=base.id, divisa_destino_id=usd_divisa.id, monto=Decimal("100"),
+        op_perspectiva_casa="venta", detalle_metodo_id=detalle.id, cliente_id=cliente.id)
+    assert actual["tc_final"] == venta.tasa_aplicada
+
+    url = reverse("cotizaciones-previsualizar-cambio", kwargs={"pk": tasa.pk})
+    usuario = make_user_with_perms("view_tasa")
+    api.force_authenticate(user=usuario)
+    assert api.post(url, {"precioBase": "7400"}, format="json").status_code == 403
+
+    usuario.user_permissions.add(Permission.objects.get(codename="change_tasa"))
+    api.force_authenticate(user=User.objects.get(pk=usuario.pk))
+    resp = api.post(url, {"precioBase": "7400"}, format="json")
+    assert resp.status_code == 200
+    assert resp.data["pendientes"] == 2
+    assert resp.data["afectadas"] == 2
+    # compra: 100 * 7300 = +10000; venta: 100 * 7701 = -10200
+    assert Decimal(resp.data["delta_total_base"]) == Decimal("-200")
+    assert resp.data["peor_delta_cliente"] == {"transaccion_id": venta.id, "delta": "-10200.00"}
+
+    tasa.refresh_from_db()
+    assert tasa.precioBase == Decimal("7300")
+    assert HistorialTasa.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_actualizar_lote_notifica_una_vez_por_suscriptor(api, usd_divisa):
+    from django.core import mail
+    from apps.notificaciones.models import NotificacionCambioTasa, NotificacionTasaUsuario
+
+    Divisa.objects.create(codigo="PYG", nombre="Guaraní", simbolo="G", es_base=True)
+    brl = Divisa.objects.create(codigo="BRL", nombre="Real", simbolo="R")
+    tasa_usd = Tasa.objects.create(divisa=usd_divisa, precioBase=Decimal("7300"),
+                                   comisionBaseCompra=Decimal("100"), comisionBaseVenta=Decimal("150"))
+    tasa_brl = Tasa.objects.create(divisa=brl, precioBase=Decimal("1400"),
+                                   comisionBaseCompra=Decimal("20"), comisionBaseVenta=Decimal("30"))
+
+    suscriptor = User.objects.create_user(
+        username="suscriptor", password="1234", email="suscriptor@test.com", email_verified=True)
+    preferencia = NotificacionTasaUsuario.objects.create(usuario=suscriptor, is_active=True)
+    preferencia.divisas_suscritas.add(usd_divisa, brl)
+    solo_usd = User.objects.create_user(
+        username="solo_usd", password="1234", email="solo_usd@test.com", email_verified=True)
+    NotificacionTasaUsuario.objects.create(usuario=solo_usd, is_active=True).divisas_suscritas.add(usd_divisa)
+
+    url = reverse("cotizaciones-actualizar-lote")
+    body = {"tasas": [
+        {"id": tasa_usd.id, "precioBase": "7400"},
+        {"id": tasa_brl.id, "comisionBaseVenta": "40"},
+    ]}
+    usuario = make_user_with_perms("view_tasa")
+    api.force_authenticate(user=usuario)
+    assert api.post(url, body, format="json").status_code == 403
+
+    usuario.user_permissions.add(Permission.objects.get(codename="change_tasa"))
+    api.force_authenticate(user=User.objects.get(pk=usuario.pk))
+    resp = api.post(url, {"tasas": [{"id": tasa_usd.id}, {"id": 0}]}, format="json")
+    assert resp.status_code == 400
+    resp = api.post(url, {"tasas": [{"id": tasa_usd.id}, {"id": tasa_usd.id}]}, format="json")
+    assert resp.status_code == 400
+
+    mail.outbox.clear()
+    resp = api.post(url, body, format="json")
+    assert resp.status_code == 200, resp.data
+    assert [t["id"] for t in resp.data] == [tasa_usd.id, tasa_brl.id]
+
+    tasa_usd.refresh_from_db()
+    tasa_brl.refresh_from_db()
+    assert tasa_usd.precioBase == Decimal("7400")
+    assert tasa_brl.comisionBaseVenta == Decimal("40")
+    assert tasa_usd.fechaActualizacion == tasa_brl.fechaActualizacion
+    assert HistorialTasa.objects.count() == 2
+
+    # Un email combinado para quien sigue ambas divisas y otro sólo con USD
+    asuntos = {tuple(m.to): m.subject for m in mail.outbox}
+    assert len(mail.outbox) == 2
+    assert asuntos[("suscriptor@test.com",)] == "Cambios en las tasas de USD, BRL"
+    assert asuntos[("solo_usd@test.com",)] == "Cambio en la tasa de USD"
+
+    # Los toasts siguen siendo uno por divisa
+    assert NotificacionCambioTasa.objects.filter(usuario=suscriptor).count() == 2
+    assert NotificacionCambioTasa.objects.filter(usuario=solo_usd).count() == 1
@@ -5,11 +5,22 @@ Tests centrados en los endpoints principales sin fixtures complejos.
 import pytest
 from decimal import Decimal
 from datetime import date
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
 
+@pytest.fixture(autouse=True)
+def cache_reportes_limpia():
+    """
+    Cada test arranca sin reportes cacheados: dentro de la transacción del
+    test no hay commits, por lo que la versión de los datos no cambia.
+    """
+    from django.core.cache import cache
+    cache.clear()
+
+
 @pytest.fixture
 def api_client(db, django_user_model):
     """Cliente autenticado como admin."""
@@ -75,14 +86,14 @@ def test_evolucion_temporal_sin_datos(api_client):
 
 
 def test_listado_transacciones_sin_datos(api_client):
-    """Test listado_transacciones sin datos (últimos 30 días)."""
+    """Test listado_transacciones sin datos."""
     url = reverse('ganancia-listado-transacciones')
     response = api_client.get(url)
 
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
-    assert isinstance(data, list)
-    assert len(data) == 0
+    assert data['results'] == []
+    assert data['next'] is None
 
 
 def test_estadisticas_sin_datos(api_client):
@@ -188,7 +199,7 @@ def test_listado_transacciones_con_rango_fechas(api_client):
 
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
-    assert isinstance(data, list)
+    assert isinstance(data['results'], list)
 
 
 def test_por_metodo_endpoint(api_client):
@@ -274,3 +285,484 @@ def test_comparativa_operaciones_sin_autenticacion():
 
     assert response.status_code in [
         status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN]
+
+
+# ===========================================
+# Tests con datos (resumen diario)
+# ===========================================
+
+@pytest.fixture
+def ganancias_registradas(api_client):
+    """Registra ganancias de tres transacciones completadas."""
+    from apps.clientes.models import Cliente, CategoriaCliente
+    from apps.divisas.models import Divisa
+    from apps.operaciones.models import Transaccion
+    from apps.tauser.models import Tauser
+    from apps.usuarios.models import User
+    from apps.ganancias.service import GananciaService
+
+    user = User.objects.get(username="admin")
+    categoria = CategoriaCliente.objects.create(nombre="Test")
+    cliente = Cliente.objects.create(
+        nombre="Cliente Test", cedula="1234567", correo="cliente@test.com",
+        telefono="0981000000", direccion="Av. Principal 123",
+        is_active=True, id_categoria=categoria,
+    )
+    tauser = Tauser.objects.create(
+        codigo="T1", nombre="Tauser 1", direccion="Av. Principal 123",
+        ciudad="Asunción", departamento="Central",
+        latitud=Decimal("-25.2637"), longitud=Decimal("-57.5759"),
+    )
+    pyg = Divisa.objects.create(codigo="PYG", nombre="Guaraní", simbolo="G",
+                                is_active=True, max_digitos=30, precision=0, es_base=True)
+    usd = Divisa.objects.create(codigo="USD", nombre="Dólar", simbolo="$",
+                                is_active=True, max_digitos=30, precision=2, es_base=False)
+
+    operaciones = [
+        ('venta', Decimal('7500'), Decimal('100')),
+        ('venta', Decimal('7400'), Decimal('50')),
+        ('compra', Decimal('7250'), Decimal('200')),
+    ]
+    transacciones = Transaccion.objects.bulk_create([
+        Transaccion(
+            id_user=user, cliente=cliente, operacion=operacion,
+            tasa_aplicada=tasa, tasa_inicial=tasa, precio_base=Decimal('7300'),
+            divisa_origen=usd if operacion == 'compra' else pyg,
+            divisa_destino=pyg if operacion == 'compra' else usd,
+            monto_origen=monto if operacion == 'compra' else monto * tasa,
+            monto_destino=monto * tasa if operacion == 'compra' else monto,
+            fecha_fin=timezone.now(), tauser=tauser, estado='completada',
+        )
+        for operacion, tasa, monto in operaciones
+    ])
+    return [GananciaService.registrar_ganancia(t) for t in transacciones]
+
+
+def test_reportes_leen_resumen_diario(api_client, ganancias_registradas):
+    """Los reportes agregados coinciden con las ganancias registradas."""
+    from apps.ganancias.models import GananciaDiaria
+    from apps.ganancias.service import GananciaService
+
+    assert GananciaDiaria.objects.count() == 2
+
+    data = api_client.get(reverse('ganancia-estadisticas')).json()
+    assert Decimal(data['total_ganancia']) == Decimal('35000')
+    assert data['total_operaciones'] == 3
+    assert data['operaciones_venta'] == 2
+    assert Decimal(data['ganancia_maxima']) == Decimal('20000')
+    assert Decimal(data['ganancia_minima']) == Decimal('5000')
+
+    data = api_client.get(reverse('ganancia-comparativa-operaciones')).json()
+    assert data['venta']['cantidad_operaciones'] == 2
+    assert Decimal(data['venta']['total_ganancia']) == Decimal('25000')
+
+    data = api_client.get(reverse('ganancia-por-divisa')).json()
+    assert data[0]['divisa_codigo'] == 'USD'
+    assert Decimal(data[0]['monto_total_operado']) == Decimal('350')
+
+    GananciaDiaria.objects.all().delete()
+    assert GananciaService.reconstruir_ganancia_diaria() == 2
+    data = api_client.get(reverse('ganancia-reporte-general')).json()
+    assert data['cantidad_operaciones'] == 3
+    assert Decimal(data['ganancia_promedio']) == Decimal('11666.67')
+
+
+def test_listado_transacciones_paginado_por_cursor(api_client, ganancias_registradas):
+    """El listado se recorre por cursor sin límite de rango de fechas."""
+    from apps.ganancias.models import Ganancia
+
+    Ganancia.objects.filter(id=ganancias_registradas[0].id).update(fecha=date(2020, 1, 1))
+
+    url = reverse('ganancia-listado-transacciones')
+    primera = api_client.get(url, {'page_size': 2}).json()
+    assert len(primera['results']) == 2
+    assert primera['next'] is not None
+
+    segunda = api_client.get(url, {'page_size': 2, 'cursor': primera['cursor']}).json()
+    assert segunda['next'] is None
+    assert [fila['fecha'] for fila in segunda['results']] == ['2020-01-01']
+
+    ids = {fila['transaccion_id'] for fila in primera['results'] + segunda['results']}
+    assert ids == {ganancia.transaccion_id for ganancia in ganancias_registradas}
+
+    response = api_client.get(url, {'cursor': 'no-es-un-cursor'})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_export_excel_transacciones_streaming(api_client, ganancias_registradas):
+    """El Excel de transacciones se transmite sin límite de 30 días."""
+    from io import BytesIO
+    from openpyxl import load_workbook
+    from apps.ganancias.models import Ganancia
+
+    Ganancia.objects.filter(id=ganancias_registradas[0].id).update(fecha=date(2020, 1, 1))
+
+    url = reverse('ganancia-export-excel')
+    response = api_client.get(url, {'reporte': 'transacciones'})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.streaming
+    ws = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+    filas = list(ws.iter_rows(min_row=5, values_only=True))
+    assert len(filas) == 3
+    assert filas[-1][1] == '2020-01-01'
+
+
+def test_export_csv_transacciones_gzip(api_client, ganancias_registradas):
+    """El CSV se transmite por bloques y puede comprimirse al vuelo."""
+    import csv
+    import gzip
+    import io
+    from apps.ganancias import export_utils
+
+    url = reverse('ganancia-export-csv')
+    response = api_client.get(url, {'operacion': 'venta'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.streaming
+    filas = list(csv.reader(io.StringIO(
+        b''.join(response.streaming_content).decode('utf-8-sig'))))
+    assert filas[0][0] == 'id_transaccion'
+    assert len(filas) == 3
+    assert {fila[4] for fila in filas[1:]} == {'venta'}
+
+    response = api_client.get(url, {'comprimir': 'true'})
+    assert response['Content-Type'] == 'application/gzip'
+    filas = list(csv.reader(io.StringIO(
+        gzip.decompress(b''.join(response.streaming_content)).decode('utf-8-sig'))))
+    assert len(filas) == 4
+    assert sum(Decimal(fila[8]) for fila in filas[1:]) == Decimal('35000')
+
+    # El listado de transacciones comparte el mismo generador
+    response = api_client.get(reverse('transaccion-export-csv'),
+                              {'operacion': 'compra', 'comprimir': 'true'})
+    assert response.status_code == status.HTTP_200_OK
+    filas = list(csv.reader(io.StringIO(
+        gzip.decompress(b''.join(response.streaming_content)).decode('utf-8-sig'))))
+    assert filas[0][:4] == ['id', 'creada', 'finalizada', 'estado']
+    assert len(filas) == 2
+    assert filas[1][8] == '200.00'
+
+    # Con bloques pequeños el flujo comprimido sigue siendo un único gzip válido
+    bloques = list(export_utils.stream_csv(
+        ['n'], ([i] for i in range(5000)), comprimir=True))
+    assert gzip.decompress(b''.join(bloques)).decode('utf-8-sig').count('\n') == 5001
+
+
+def test_exportacion_en_segundo_plano(api_client, ganancias_registradas, settings, tmp_path):
+    """Las exportaciones idénticas en curso se reutilizan y el archivo se verifica por hash."""
+    import hashlib
+    from apps.ganancias.models import ExportacionReporte
+    from apps.ganancias.reportes import procesar_exportacion
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    url = reverse('ganancia-exportaciones')
+    payload = {'formato': 'excel', 'reporte': 'transacciones', 'operacion': ''}
+
+    primera = api_client.post(url, payload, format='json')
+    segunda = api_client.post(url, {**payload, 'operacion': None}, format='json')
+    assert primera.status_code == status.HTTP_202_ACCEPTED
+    assert segunda.status_code == status.HTTP_200_OK
+    assert primera.json()['id'] == segunda.json()['id']
+
+    exportacion = procesar_exportacion(primera.json()['id'])
+    assert exportacion.estado == ExportacionReporte.ESTADO_COMPLETADO
+    assert exportacion.filas_totales == 3
+    assert exportacion.filas_procesadas == 3
+
+    # Una tarea reentregada no vuelve a generar el archivo
+    repetida = procesar_exportacion(exportacion.id)
+    assert repetida.archivo.name == exportacion.archivo.name
+    assert repetida.finished_at == exportacion.finished_at
+
+    data = api_client.get(
+        reverse('ganancia-estado-exportacion', args=[exportacion.id])).json()
+    assert data['progreso'] == 100
+    assert data['url_descarga'].endswith(f'/exportaciones/{exportacion.id}/descargar/')
+
+    response = api_client.get(
+        reverse('ganancia-descargar-exportacion', args=[exportacion.id]))
+    assert response.status_code == status.HTTP_200_OK
+    contenido = b''.join(response.streaming_content)
+    assert hashlib.sha256(contenido).hexdigest() == exportacion.hash_contenido
+    assert response['ETag'] == f'"{exportacion.hash_contenido}"'
+
+    # Una vez finalizada, la misma solicitud genera un trabajo nuevo
+    tercera = api_client.post(url, payload, format='json')
+    assert tercera.status_code == status.HTTP_202_ACCEPTED
+    assert tercera.json()['id'] != exportacion.id
+
+
+def test_exportacion_por_usuario_y_trabajos_colgados(api_client, django_user_model, settings, tmp_path):
+    """Cada usuario tiene su propio trabajo y uno sin avances deja de bloquear."""
+    from datetime import timedelta
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from apps.ganancias.models import ExportacionReporte
+    from apps.ganancias.reportes import EXPORTACION_SIN_AVANCE
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    url = reverse('ganancia-exportaciones')
+    payload = {'formato': 'pdf', 'reporte': 'general'}
+
+    primera = api_client.post(url, payload, format='json')
+    assert primera.status_code == status.HTTP_202_ACCEPTED
+
+    otro = APIClient()
+    otro.force_authenticate(user=django_user_model.objects.create_superuser(
+        username="otro", password="otropass", email="otro@test.com"))
+    ajena = otro.post(url, payload, format='json')
+    assert ajena.status_code == status.HTTP_202_ACCEPTED
+    assert ajena.json()['id'] != primera.json()['id']
+    assert otro.get(reverse('ganancia-estado-exportacion',
+                            args=[ajena.json()['id']])).status_code == status.HTTP_200_OK
+
+    # El worker murió: sin avances, el trabajo se da por fallido
+    ExportacionReporte.objects.filter(id=primera.json()['id']).update(
+        updated_at=timezone.now() - EXPORTACION_SIN_AVANCE - timedelta(minutes=1))
+    estado = api_client.get(
+        reverse('ganancia-estado-exportacion', args=[primera.json()['id']])).json()
+    assert estado['estado'] == ExportacionReporte.ESTADO_ERROR
+
+    reintento = api_client.post(url, payload, format='json')
+    assert reintento.status_code == status.HTTP_202_ACCEPTED
+    assert reintento.json()['id'] != primera.json()['id']
+
+
+def test_procesar_exportacion_respeta_trabajos_vencidos(api_client, monkeypatch, settings, tmp_path):
+    """Tomar el trabajo renueva updated_at y uno vencido durante el render no se completa."""
+    from datetime import timedelta
+    from django.utils import timezone
+    from apps.ganancias import reportes
+    from apps.ganancias.models import ExportacionReporte
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    url = reverse('ganancia-exportaciones')
+    creadas = [
+        api_client.post(url, {'formato': 'pdf', 'reporte': reporte}, format='json').json()['id']
+        for reporte in ('general', 'evolucion')
+    ]
+
+    # Esperó en la cola más que el lapso sin avances: al tomarlo se renueva
+    hace_una_hora = timezone.now() - timedelta(hours=1)
+    ExportacionReporte.objects.filter(id=creadas[0]).update(updated_at=hace_una_hora)
+    generar = reportes.generar_exportacion
+
+    def generar_y_verificar(*args, **kwargs):
+        assert reportes.vencer_exportaciones_colgadas() == 0
+        return generar(*args, **kwargs)
+
+    monkeypatch.setattr(reportes, 'generar_exportacion', generar_y_verificar)
+    completada = reportes.procesar_exportacion(creadas[0])
+    assert completada.estado == ExportacionReporte.ESTADO_COMPLETADO
+    assert completada.updated_at > hace_una_hora
+
+    # Se dio por fallido mientras se generaba: el resultado se descarta
+    def generar_y_vencer(*args, **kwargs):
+        ExportacionReporte.objects.filter(id=creadas[1]).update(
+            updated_at=hace_una_hora)
+        assert reportes.vencer_exportaciones_colgadas() == 1
+        return generar(*args, **kwargs)
+
+    monkeypatch.setattr(reportes, 'generar_exportacion', generar_y_vencer)
+    vencida = reportes.procesar_exportacion(creadas[1])
+    assert vencida.estado == ExportacionReporte.ESTADO_ERROR
+    assert vencida.error
+    assert not vencida.archivo
+    # Sólo queda el archivo del trabajo completado
+    assert len(list(tmp_path.rglob('*.pdf'))) == 1
+
+
+def test_export_pdf_transacciones_por_bloques():
+    """El PDF de transacciones se arma con bloques de una página con encabezado."""
+    import re
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.platypus import SimpleDocTemplate
+    from apps.ganancias.export_utils import (
+        _tabla_pdf_por_bloques,
+        export_transacciones_to_pdf,
+    )
+    from apps.ganancias.management.commands.benchmark_export_pdf import filas_sinteticas
+
+    headers = ['ID', 'Monto']
+    doc = SimpleDocTemplate(None, pagesize=landscape(letter))
+    filas = ([str(i), '1'] for i in range(250))
+    bloques = list(_tabla_pdf_por_bloques(doc, headers, filas, [50, 50], fuente=7))
+
+    assert len(bloques) > 1
+    assert all(bloque._cellvalues[0] == headers for bloque in bloques)
+    assert len({len(bloque._cellvalues) for bloque in bloques[:-1]}) == 1
+    assert sum(len(bloque._cellvalues) - 1 for bloque in bloques) == 250
+
+    archivo = export_transacciones_to_pdf(filas_sinteticas(250))
+    contenido = archivo.read()
+    assert contenido.startswith(b'%PDF')
+    paginas = len(re.findall(rb'/Type /Page\b(?!s)', contenido))
+    assert len(bloques) <= paginas <= len(bloques) + 1
+
+
+def test_metricas_resumen_una_consulta_memoizada(api_client, ganancias_registradas,
+                                                 django_capture_on_commit_callbacks):
+    """Dashboard y exportación comparten un único recorrido del resumen."""
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from apps.ganancias.service import GananciaService
+
+    pendiente = ganancias_registradas[-1]
+    pendiente.delete()
+    GananciaService.reconstruir_ganancia_diaria()
+
+    cache.clear()
+    with CaptureQueriesContext(connection) as consultas:
+        estadisticas = api_client.get(reverse('ganancia-estadisticas')).json()
+        api_client.get(reverse('ganancia-reporte-general'))
+        comparativa = api_client.get(reverse('ganancia-comparativa-operaciones')).json()
+        response = api_client.get(reverse('ganancia-export-excel'), {'reporte': 'general'})
+        b''.join(response.streaming_content)
+
+    resumen = [q for q in consultas.captured_queries
+               if 'ganancias_gananciadiaria' in q['sql'] and 'MAX(id)' not in q['sql']]
+    assert len(resumen) == 1
+    assert estadisticas['total_operaciones'] == 2
+    assert comparativa['venta']['cantidad_operaciones'] == 2
+
+    # Una nueva ganancia cambia la marca de agua e invalida las métricas
+    with django_capture_on_commit_callbacks(execute=True):
+        GananciaService.registrar_ganancia(pendiente.transaccion)
+    estadisticas = api_client.get(reverse('ganancia-estadisticas')).json()
+    assert estadisticas['total_operaciones'] == 3
+
+
+def test_cache_reportes_por_marca_de_agua(api_client, ganancias_registradas,
+                                         django_capture_on_commit_callbacks):
+    """Los reportes se sirven de cache hasta que cambian los datos."""
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from apps.ganancias.cache import ReporteCache
+    from apps.ganancias.models import Ganancia
+    from apps.ganancias.service import GananciaService
+
+    pendiente = ganancias_registradas[-1]
+    pendiente.delete()
+    GananciaService.reconstruir_ganancia_diaria()
+    cache.clear()
+    ReporteCache.reiniciar_estadisticas()
+
+    url = reverse('ganancia-por-divisa')
+    primera = api_client.get(url).json()
+    with CaptureQueriesContext(connection) as consultas:
+        segunda = api_client.get(url).json()
+    assert segunda == primera
+    # Un acierto sólo consulta la marca de agua
+    assert [q for q in consultas.captured_queries
+            if 'ganancias_gananciadiaria' in q['sql']
+            and 'MAX(id)' not in q['sql']] == []
+
+    stats = api_client.get(reverse('ganancia-cache-reportes')).json()
+    assert stats['aciertos'] == 1
+    assert stats['fallos'] == 1
+    assert stats['tasa_aciertos'] == 0.5
+
+    # La versión cambia recién al confirmarse la transacción
+    marca = ReporteCache.watermark()
+    with django_capture_on_commit_callbacks(execute=True):
+        GananciaService.registrar_ganancia(pendiente.transaccion)
+        assert ReporteCache.watermark() == marca
+    assert ReporteCache.watermark() != marca
+    tercera = api_client.get(url).json()
+    assert tercera != primera
+
+    # Una ganancia de id menor confirmada más tarde, una eliminación o un
+    # recálculo en el lugar también invalidan la cache
+    for cambio in (
+        lambda: Ganancia.objects.filter(id=ganancias_registradas[0].id).delete(),
+        lambda: GananciaService.reconstruir_ganancia_diaria(),
+    ):
+        marca = ReporteCache.watermark()
+        with django_capture_on_commit_callbacks(execute=True):
+            cambio()
+        assert ReporteCache.watermark() != marca
+
+
+def test_backfill_ganancias(ganancias_registradas):
+    """El backfill registra las ganancias faltantes y recalcula las existentes."""
+    from io import StringIO
+    from django.core.management import call_command
+    from apps.ganancias.management.commands.backfill_ganancias import dividir_rango
+    from apps.ganancias.models import Ganancia, GananciaDiaria
+    from apps.ganancias.service import GananciaService
+    from apps.operaciones.models import Transaccion
+
+    Ganancia.objects.filter(
+        id__in=[g.id for g in ganancias_registradas[:2]]).delete()
+    assert GananciaService.transacciones_sin_ganancia().count() == 2
+
+    def backfill(*args):
+        salida = StringIO()
+        call_command('backfill_ganancias', *args, stdout=salida)
+        return salida.getvalue().strip()
+
+    assert backfill('--batch-size', '1') == "Ganancias creadas: 2, actualizadas: 0."
+    assert Ganancia.objects.count() == 3
+    assert GananciaService.transacciones_sin_ganancia().count() == 0
+    total = sum(r.total_ganancia for r in GananciaDiaria.objects.all())
+    assert total == Decimal('35000')
+
+    # Una segunda corrida no duplica registros
+    assert backfill() == "Ganancias creadas: 0, actualizadas: 0."
+    assert Ganancia.objects.count() == 3
+
+    # Las filas que ya tienen ganancia (p. ej. registradas en paralelo) no se cuentan
+    existente = Ganancia.objects.get(id=ganancias_registradas[2].id)
+    existente.id = None
+    assert GananciaService._insertar_ganancias([existente]) == 0
+
+    transaccion = ganancias_registradas[2].transaccion
+    Transaccion.objects.filter(id=transaccion.id).update(precio_base=Decimal('7300.5'))
+    assert backfill('--recalcular') == "Ganancias creadas: 0, actualizadas: 1."
+    ganancia = Ganancia.objects.get(transaccion=transaccion)
+    assert ganancia.ganancia_neta == Decimal('10100')
+    total = sum(r.total_ganancia for r in GananciaDiaria.objects.all())
+    assert total == Decimal('35100')
+
+    # Un valor con más decimales que la columna no se reescribe en cada corrida
+    Transaccion.objects.filter(id=transaccion.id).update(precio_base=Decimal('7300.123457'))
+    assert backfill('--recalcular') == "Ganancias creadas: 0, actualizadas: 1."
+    assert backfill('--recalcular') == "Ganancias creadas: 0, actualizadas: 0."
+
+    assert dividir_rango(date(2025, 1, 1), date(2025, 1, 10), 3) == [
+        (date(2025, 1, 1), date(2025, 1, 4)),
+        (date(2025, 1, 5), date(2025, 1, 7)),
+        (date(2025, 1, 8), date(2025, 1, 10)),
+    ]
+
+
+def test_analitica_margen(api_client, ganancias_registradas):
+    """La analítica de márgenes coincide con las propiedades del modelo."""
+    from apps.ganancias.models import Ganancia
+
+    url = reverse('ganancia-analitica-margen')
+    response = api_client.get(url, {'intervalos': 4})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+
+    margenes = sorted(float(g.porcentaje_margen) for g in Ganancia.objects.all())
+    distribucion = data['distribucion']
+    assert len(distribucion) == 4
+    assert sum(item['cantidad'] for item in distribucion) == 3
+    assert distribucion[0]['desde'] == pytest.approx(margenes[0], abs=1e-4)
+    assert distribucion[-1]['hasta'] == pytest.approx(margenes[-1], abs=1e-4)
+
+    [usd] = data['percentiles_por_divisa']
+    assert usd['divisa_codigo'] == 'USD'
+    assert usd['cantidad'] == 3
+    assert usd['p50'] == pytest.approx(margenes[1], abs=1e-4)
+
+    spread = {fila['operacion']: fila for fila in data['spread']}
+    assert spread['venta']['cantidad'] == 2
+    assert spread['venta']['spread_promedio'] == pytest.approx(150)
+    assert float(spread['compra']['spread_minimo']) == -50
+
+    response = api_client.get(url, {'intervalos': 'x'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
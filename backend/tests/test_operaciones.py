@@ -240,8 +240,97 @@ class TestTransaccionViewSet:
         response = client.get(url)
 
         assert response.status_code == status.HTTP_200_OK
-        # Sin paginación, devuelve lista directa
-        assert isinstance(response.data, list)
+        # Listado paginado por cursor
+        assert isinstance(response.data['results'], list)
+        assert 'cursor' in response.data
+
+    def test_listado_transacciones_por_cursor(self, authenticated_client, operador_usuario,
+                                              cliente_test, divisa_usd, metodo_efectivo,
+                                              tauser_test):
+        """El listado compacto se pagina por cursor, incluso con fechas de creación repetidas"""
+        client, user = authenticated_client
+        divisa_base = Divisa.objects.create(codigo="PYG", nombre="Guaraní", simbolo="G", es_base=True)
+        ids = [
+            Transaccion.objects.create(
+                id_user=operador_usuario, cliente=cliente_test, operacion='compra',
+                tasa_aplicada=Decimal('7200.00'), tasa_inicial=Decimal('7200.00'),
+                divisa_origen=divisa_usd, divisa_destino=divisa_base,
+                monto_origen=Decimal('100.00'), monto_destino=Decimal('720000.00'),
+                metodo_financiero=metodo_efectivo, tauser=tauser_test,
+            ).id
+            for _ in range(3)
+        ]
+        # Dos transacciones con la misma fecha de creación: desempata el id
+        Transaccion.objects.filter(id__in=ids[:2]).update(
+            created_at=Transaccion.objects.get(id=ids[0]).created_at)
+
+        url = reverse('transaccion-list')
+        primera = client.get(url, {'page_size': 2})
+        assert primera.status_code == status.HTTP_200_OK
+        assert len(primera.data['results']) == 2
+        assert primera.data['cursor']
+        fila = primera.data['results'][0]
+        assert fila['divisa_origen_codigo'] == 'USD'
+        assert fila['cliente_nombre'] == 'Cliente Test'
+        assert 'cliente_detalle' not in fila
+
+        segunda = client.get(url, {'page_size': 2, 'cursor': primera.data['cursor']})
+        assert segunda.data['next'] is None
+        vistos = [f['id'] for f in primera.data['results'] + segunda.data['results']]
+        assert sorted(vistos) == ids
+
+        assert client.get(url, {'cursor': 'invalido'}).status_code == status.HTTP_404_NOT_FOUND
+        assert client.get(url, {'cliente': 'no-es-uuid'}).status_code == status.HTTP_400_BAD_REQUEST
+        filtrado = client.get(url, {'cliente': str(cliente_test.id)})
+        assert len(filtrado.data['results']) == 3
+
+        # El detalle completo sigue disponible en retrieve
+        detalle = client.get(reverse('transaccion-detail', args=[ids[0]]))
+        assert 'cliente_detalle' in detalle.data
+
+    def test_filtro_por_fechas_de_creacion(self, authenticated_client, operador_usuario,
+                                           cliente_test, divisa_usd, metodo_efectivo,
+                                           tauser_test):
+        """Las fechas se filtran como límites semiabiertos sobre created_at, en hora local"""
+        from datetime import datetime
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+
+        client, user = authenticated_client
+        divisa_base = Divisa.objects.create(codigo="PYG", nombre="Guaraní", simbolo="G", es_base=True)
+        creaciones = {
+            'antes': datetime(2025, 2, 28, 23, 59),
+            'inicio': datetime(2025, 3, 1, 0, 0),
+            'fin': datetime(2025, 3, 9, 23, 59),
+            'despues': datetime(2025, 3, 10, 0, 0),
+        }
+        ids = {}
+        for nombre, creada in creaciones.items():
+            transaccion = Transaccion.objects.create(
+                id_user=operador_usuario, cliente=cliente_test, operacion='compra',
+                tasa_aplicada=Decimal('7200.00'), tasa_inicial=Decimal('7200.00'),
+                divisa_origen=divisa_usd, divisa_destino=divisa_base,
+                monto_origen=Decimal('100.00'), monto_destino=Decimal('720000.00'),
+                metodo_financiero=metodo_efectivo, tauser=tauser_test,
+            )
+            Transaccion.objects.filter(id=transaccion.id).update(
+                created_at=timezone.make_aware(creada))
+            ids[nombre] = transaccion.id
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.get(reverse('transaccion-list'),
+                                  {'fecha_inicio': '2025-03-01', 'fecha_fin': '2025-03-09'})
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(f['id'] for f in response.data['results']) == sorted(
+            [ids['inicio'], ids['fin']])
+        # created_at se compara sin convertirlo a fecha, para usar su índice
+        sql = next(q['sql'] for q in consultas.captured_queries
+                   if 'operaciones_transaccion' in q['sql'] and '"created_at" >=' in q['sql'])
+        assert 'AT TIME ZONE' not in sql
+
+        assert client.get(reverse('transaccion-list'),
+                          {'fecha_fin': '09/03/2025'}).status_code == status.HTTP_400_BAD_REQUEST
 
     def test_list_transacciones_unauthenticated(self, api_client):
         """Prueba listar transacciones sin autenticación"""
@@ -772,3 +861,415 @@ class TestTransaccionAcciones:
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert 'error' in response.data
+
+
+# ========== TESTS DE COTIZACIÓN DE RECONFIRMACIÓN ==========
+
+class TestCotizacionReconfirmacion:
+    """La cotización se recalcula sólo cuando cambia alguno de sus insumos"""
+
+    def test_cotizacion_cacheada_por_version(self, operador_usuario, cliente_test, divisa_usd,
+                                             tasa_usd, metodo_efectivo, tauser_test):
+        from unittest import mock
+        from django.core.cache import cache
+        from apps.operaciones import service
+
+        cache.clear()
+        divisa_base = Divisa.objects.create(codigo="PYG", nombre="Guaraní", simbolo="G", es_base=True)
+        transaccion = Transaccion.objects.create(
+            id_user=operador_usuario,
+            cliente=cliente_test,
+            operacion='compra',
+            tasa_aplicada=Decimal('7200.00'),
+            tasa_inicial=Decimal('7200.00'),
+            divisa_origen=divisa_usd,
+            divisa_destino=divisa_base,
+            monto_origen=Decimal('100.00'),
+            monto_destino=Decimal('720000.00'),
+            metodo_financiero=metodo_efectivo,
+            tauser=tauser_test
+        )
+
+        with mock.patch.object(service, 'calcular_operacion',
+                               wraps=service.calcular_operacion) as calcular:
+            primera = service.cotizar_transaccion(transaccion)
+            assert service.cotizar_transaccion(transaccion) == primera
+            assert calcular.call_count == 1
+
+            # Un cambio de tasa cambia la versión y fuerza el recálculo
+            tasa_usd.precioBase = Decimal('7300.00')
+            tasa_usd.save()
+            segunda = service.cotizar_transaccion(transaccion)
+            assert calcular.call_count == 2
+            assert segunda[0] > primera[0]
+
+            # También un cambio en el descuento de la categoría del cliente
+            categoria = cliente_test.id_categoria
+            categoria.descuento = Decimal('20')
+            categoria.save()
+            service.cotizar_transaccion(transaccion)
+            assert calcular.call_count == 3
+
+# ========== TESTS DE PLANES DE CONSULTA ==========
+
+class TestIndicesTransaccion:
+    """Verifica con EXPLAIN que las consultas frecuentes usan sus índices"""
+
+    @pytest.fixture
+    def transacciones_sembradas(self, operador_usuario, categoria_cliente, divisa_usd,
+                                metodo_efectivo, tauser_test):
+        from django.db import connection
+
+        divisas = [divisa_usd] + [
+            Divisa.objects.create(codigo=f"D{i:02d}", nombre=f"Divisa {i}", simbolo="$")
+            for i in range(19)
+        ]
+        clientes = [
+            Cliente.objects.create(
+                nombre=f'Cliente {i}',
+                is_persona_fisica=True,
+                id_categoria=categoria_cliente,
+                correo=f'cliente{i}@test.com',
+                telefono='123456789',
+                direccion='Dirección test',
+                cedula=f'9000{i:03d}'
+            )
+            for i in range(20)
+        ]
+        estados = ['completada'] * 8 + ['cancelada', 'pendiente']
+        Transaccion.objects.bulk_create([
+            Transaccion(
+                id_user=operador_usuario,
+                cliente=clientes[i % len(clientes)],
+                operacion='compra' if i % 2 else 'venta',
+                tasa_aplicada=Decimal('7250.00'),
+                tasa_inicial=Decimal('7250.00'),
+                divisa_origen=divisas[i % len(divisas)],
+                divisa_destino=divisas[(i // len(divisas)) % len(divisas)],
+                monto_origen=Decimal('100.00'),
+                monto_destino=Decimal('90.00'),
+                metodo_financiero=metodo_efectivo,
+                tauser=tauser_test,
+                estado=estados[(i // 7) % len(estados)]
+            )
+            for i in range(10000)
+        ])
+        tabla = Transaccion._meta.db_table
+        with connection.cursor() as cursor:
+            # Fechas de creación distintas y sin relación con el orden físico,
+            # como tras las actualizaciones de estado de un historial real
+            cursor.execute(
+                f"UPDATE {tabla} SET created_at = "
+                f"now() - ((id * 7919) % 43201) * interval '1 minute'")
+            cursor.execute(f"ANALYZE {tabla}")
+            # Con tan pocas filas el planificador prefiere recorrer la tabla;
+            # se desalienta para comprobar que el índice sirve a la consulta
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        return clientes
+
+    def test_historial_cliente_por_estado(self, transacciones_sembradas):
+        plan = Transaccion.objects.filter(
+            cliente=transacciones_sembradas[0], estado='cancelada').explain()
+        assert 'idx_transaccion_cliente_estado' in plan
+
+    def test_pendientes_por_divisa(self, transacciones_sembradas, divisa_usd):
+        from django.db.models import Q
+
+        plan = Transaccion.objects.filter(
+            Q(divisa_origen=divisa_usd) | Q(divisa_destino=divisa_usd),
+            estado='pendiente'
+        ).order_by().explain()
+        assert 'idx_transaccion_pend_origen' in plan
+        assert 'idx_transaccion_pend_destino' in plan
+
+    def test_pendientes_vencidas(self, transacciones_sembradas):
+        from datetime import timedelta
+        from django.db import connection
+        from django.utils import timezone
+
+        # El lote debe salir ordenado del índice, sin ordenar todas las pendientes
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_sort = off")
+        # Misma forma que el lote de expirar_transacciones_pendientes
+        plan = Transaccion.objects.filter(
+            estado='pendiente',
+            created_at__lt=timezone.now() - timedelta(hours=24)
+        ).order_by('created_at')[:500].explain()
+        assert 'idx_transaccion_pendiente' in plan
+
+    def test_listado_por_cursor(self, transacciones_sembradas):
+        plan = Transaccion.objects.order_by('-created_at', 'id')[:51].explain()
+        assert 'idx_transaccion_creada' in plan
+        assert 'Sort' not in plan
+
+
+# ========== TESTS DE IDEMPOTENCIA ==========
+
+class TestIdempotencia:
+    """Pruebas de la cabecera Idempotency-Key"""
+
+    @pytest.fixture
+    def payload(self, operador_usuario, cliente_test, divisa_usd, metodo_efectivo, tauser_test):
+        divisa_ars = Divisa.objects.create(codigo="ARS", nombre="Peso Argentino", simbolo="$")
+        return {
+            'id_user': operador_usuario.id,
+            'cliente': str(cliente_test.id),
+            'operacion': 'compra',
+            'tasa_aplicada': '7250.00',
+            'tasa_inicial': '7250.00',
+            'divisa_origen': divisa_ars.id,
+            'divisa_destino': divisa_usd.id,
+            'monto_origen': '725000.00',
+            'monto_destino': '100.00',
+            'metodo_financiero': metodo_efectivo.id,
+            'tauser': str(tauser_test.id),
+            'estado': 'pendiente'
+        }
+
+    def test_reintento_devuelve_respuesta_guardada(self, authenticated_client, payload):
+        client, user = authenticated_client
+        url = reverse('transaccion-list')
+
+        primera = client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='kiosco-1')
+        segunda = client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='kiosco-1')
+
+        assert primera.status_code == status.HTTP_201_CREATED
+        assert segunda.status_code == status.HTTP_201_CREATED
+        assert segunda['Idempotent-Replayed'] == 'true'
+        assert segunda.json()['id'] == primera.data['id']
+        assert Transaccion.objects.count() == 1
+
+        # Sin la cabecera cada solicitud se ejecuta
+        assert client.post(url, payload, format='json').status_code == status.HTTP_201_CREATED
+        assert Transaccion.objects.count() == 2
+
+    def test_misma_clave_con_otro_cuerpo(self, authenticated_client, payload):
+        client, user = authenticated_client
+        url = reverse('transaccion-list')
+
+        client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='kiosco-2')
+        payload['monto_destino'] = '200.00'
+        response = client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='kiosco-2')
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert Transaccion.objects.count() == 1
+
+    def test_clave_vencida_se_reutiliza(self, authenticated_client, payload):
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.operaciones.idempotencia import purgar_solicitudes_vencidas
+        from apps.operaciones.models import SolicitudIdempotente
+
+        client, user = authenticated_client
+        url = reverse('transaccion-list')
+
+        client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='kiosco-3')
+        SolicitudIdempotente.objects.update(expira_en=timezone.now() - timedelta(seconds=1))
+        response = client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='kiosco-3')
+
+        assert 'Idempotent-Replayed' not in response
+        assert Transaccion.objects.count() == 2
+        assert purgar_solicitudes_vencidas() == 0
+        SolicitudIdempotente.objects.update(expira_en=timezone.now() - timedelta(seconds=1))
+        assert purgar_solicitudes_vencidas() == 1
+
+    def test_reserva_abandonada_se_retoma(self, authenticated_client, payload):
+        from django.utils import timezone
+        from apps.operaciones.idempotencia import IDEMPOTENCIA_LEASE
+        from apps.operaciones.models import SolicitudIdempotente
+
+        client, user = authenticated_client
+        url = reverse('transaccion-list')
+
+        # Reserva en curso de un proceso que murió sin responder
+        client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='kiosco-4')
+        SolicitudIdempotente.objects.update(estado_http=None, respuesta=None)
+        huella = SolicitudIdempotente.objects.get().hash_solicitud
+
+        response = client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='kiosco-4')
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+        SolicitudIdempotente.objects.update(
+            created_at=timezone.now() - IDEMPOTENCIA_LEASE)
+        response = client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='kiosco-4')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert 'Idempotent-Replayed' not in response
+        registro = SolicitudIdempotente.objects.get()
+        assert registro.hash_solicitud == huella
+        assert registro.estado_http == status.HTTP_201_CREATED
+        assert Transaccion.objects.count() == 2
+
+
+class TestExpiracionPendientes:
+    """Pruebas del barrido de transacciones pendientes vencidas"""
+
+    def test_expirar_transacciones_pendientes_libera_stock(self, setup_data, crear_venta):
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.operaciones.service import expirar_transacciones_pendientes
+        from apps.stock.enums import EstadoMovimiento
+        from apps.stock.models import MovimientoStock, StockDivisaTauser
+
+        tauser = setup_data["tauser"]
+        vencidas = [crear_venta(Decimal('170.00')) for _ in range(3)]
+        vigente = crear_venta(Decimal('170.00'))
+        pagada = crear_venta(Decimal('20.00'))
+        Transaccion.objects.filter(id=pagada.id).update(estado='en_proceso')
+
+        hace_dos_dias = timezone.now() - timedelta(days=2)
+        Transaccion.objects.filter(
+            id__in=[t.id for t in vencidas] + [pagada.id]).update(created_at=hace_dos_dias)
+
+        # Cuatro reservas de 170 y una de 20 sobre 10 billetes de cada denominación
+        assert StockDivisaTauser.objects.get(
+            tauser=tauser, denominacion=setup_data["denominaciones"][2]).stock == 5
+
+        antes = timezone.now()
+        assert expirar_transacciones_pendientes(batch_size=2) == 3
+
+        estados = dict(Transaccion.objects.values_list('id', 'estado'))
+        assert {estados[t.id] for t in vencidas} == {'cancelada'}
+        assert estados[vigente.id] == 'pendiente'
+        assert estados[pagada.id] == 'en_proceso'
+        fin = dict(Transaccion.objects.values_list('id', 'fecha_fin'))
+        assert all(fin[t.id] >= antes for t in vencidas)
+        assert fin[vigente.id] is None
+        assert set(
+            MovimientoStock.objects.filter(transaccion__in=vencidas).values_list('estado', flat=True)
+        ) == {EstadoMovimiento.CANCELADO}
+
+        esperado = {d.id: 9 for d in setup_data["denominaciones"]}
+        esperado[setup_data["denominaciones"][2].id] = 8
+        for stock in StockDivisaTauser.objects.filter(tauser=tauser):
+            assert stock.stock == esperado[stock.denominacion_id]
+
+        # Un segundo barrido no encuentra nada más para cancelar
+        assert expirar_transacciones_pendientes() == 0
+
+    def test_tarea_expirar_transacciones_pendientes(self, settings, crear_venta):
+        from datetime import timedelta
+        from celery.schedules import crontab
+        from django.utils import timezone
+        from apps.operaciones.service import TTL_TRANSACCION_PENDIENTE
+        from apps.operaciones.tasks import expirar_transacciones_pendientes
+
+        vencida = crear_venta(Decimal('170.00'))
+        vigente = crear_venta(Decimal('170.00'))
+        Transaccion.objects.filter(id=vencida.id).update(
+            created_at=timezone.now() - TTL_TRANSACCION_PENDIENTE - timedelta(minutes=1))
+
+        assert expirar_transacciones_pendientes.apply().get() == 1
+        vencida.refresh_from_db()
+        vigente.refresh_from_db()
+        assert vencida.estado == 'cancelada'
+        assert vigente.estado == 'pendiente'
+
+        # Celery beat la ejecuta cada cinco minutos
+        entrada = settings.CELERY_BEAT_SCHEDULE['expirar-transacciones-pendientes']
+        assert entrada['task'] == expirar_transacciones_pendientes.name
+        assert entrada['schedule'] == crontab(minute='*/5')
+
+
+class TestTransicionesTransaccion:
+    """Pruebas de la máquina de estados y sus efectos secundarios"""
+
+    def test_transicion_cancelada_libera_stock_una_vez(self, setup_data, crear_venta):
+        from apps.operaciones.transiciones import (
+            TransicionInvalida,
+            transaccion_transicionada,
+            transicionar,
+        )
+        from apps.stock.models import StockDivisaTauser
+
+        tauser = setup_data["tauser"]
+        transaccion = crear_venta(Decimal('170.00'))
+        obsoleta = Transaccion.objects.get(pk=transaccion.pk)
+
+        eventos = []
+        def escuchar(sender, evento, **kwargs):
+            eventos.append(evento)
+        transaccion_transicionada.connect(escuchar)
+        try:
+            transicionar(transaccion, 'cancelada')
+        finally:
+            transaccion_transicionada.disconnect(escuchar)
+
+        assert [(e.estado_anterior, e.estado_nuevo) for e in eventos] == [('pendiente', 'cancelada')]
+        assert transaccion.fecha_fin is not None
+        for stock in StockDivisaTauser.objects.filter(tauser=tauser):
+            assert stock.stock == 10
+
+        # Una instancia leída antes del cambio no puede volver a transicionar
+        with pytest.raises(TransicionInvalida):
+            transicionar(obsoleta, 'en_proceso')
+        assert obsoleta.estado == 'cancelada'
+        with pytest.raises(TransicionInvalida):
+            transicionar(transaccion, 'cancelada')
+
+        # Guardar otros campos ya no repite los efectos del estado
+        transaccion.factura_emitida = True
+        transaccion.save()
+        for stock in StockDivisaTauser.objects.filter(tauser=tauser):
+            assert stock.stock == 10
+
+    def test_transicion_completada_registra_ganancia_y_cierra_stock(
+            self, monkeypatch, setup_data, crear_venta):
+        from apps.ganancias.models import Ganancia
+        from apps.operaciones import signals
+        from apps.operaciones.transiciones import transicionar
+        from apps.stock.enums import EstadoMovimiento
+        from apps.stock.models import MovimientoStock, StockDivisaTauser
+
+        # La facturación electrónica es un servicio externo
+        monkeypatch.setattr(signals, 'generar_factura_al_pagar', lambda transaccion: None)
+
+        guarani = Divisa.objects.create(codigo="PYG", nombre="Guaraní", simbolo="G", es_base=True)
+        transaccion = crear_venta(
+            Decimal('170.00'), divisa_origen=guarani, monto_origen=Decimal('1275000.00'),
+            tasa_aplicada=Decimal('7500.00'), tasa_inicial=Decimal('7500.00'),
+            precio_base=Decimal('7300.00'))
+        assert MovimientoStock.objects.get(transaccion=transaccion).estado == EstadoMovimiento.EN_PROCESO
+
+        transicionar(transaccion, 'completada')
+
+        assert MovimientoStock.objects.get(transaccion=transaccion).estado == EstadoMovimiento.FINALIZADO
+        for stock in StockDivisaTauser.objects.filter(tauser=setup_data["tauser"]):
+            assert stock.stock == 9
+        ganancia = Ganancia.objects.get(transaccion=transaccion)
+        assert ganancia.ganancia_neta == Decimal('34000.00')
+        assert ganancia.fecha == transaccion.fecha_fin.date()
+
+    def test_edicion_no_deshace_un_cambio_de_estado_concurrente(
+            self, monkeypatch, authenticated_client, setup_data, crear_venta):
+        from apps.operaciones.views import TransaccionViewSet
+        from apps.stock.models import StockDivisaTauser
+
+        client, user = authenticated_client
+        transaccion = crear_venta(Decimal('170.00'))
+        url = reverse('transaccion-detail', args=[transaccion.id])
+        get_object = TransaccionViewSet.get_object
+
+        def leer_y_cancelar(self):
+            # El barrido de pendientes la cancela después de leerla
+            instancia = get_object(self)
+            Transaccion.objects.filter(pk=instancia.pk).update(estado='cancelada')
+            return instancia
+
+        monkeypatch.setattr(TransaccionViewSet, 'get_object', leer_y_cancelar)
+
+        response = client.patch(url, {'tasa_aplicada': '1.5'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        transaccion.refresh_from_db()
+        assert transaccion.estado == 'cancelada'
+        assert transaccion.tasa_aplicada == Decimal('1.5')
+
+        Transaccion.objects.filter(pk=transaccion.pk).update(estado='pendiente')
+        response = client.patch(url, {'estado': 'completada', 'tasa_aplicada': '2.0'}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        transaccion.refresh_from_db()
+        assert transaccion.estado == 'cancelada'
+        assert transaccion.tasa_aplicada == Decimal('1.5')
+        # La reserva sigue tomada: ningún efecto de 'completada' se ejecutó
+        for stock in StockDivisaTauser.objects.filter(tauser=setup_data["tauser"]):
+            assert stock.stock == 9
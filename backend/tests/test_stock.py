@@ -3,86 +3,23 @@ from decimal import Decimal
 from apps.stock.serializers import MovimientoStockSerializer
 from apps.stock.enums import TipoMovimiento, EstadoMovimiento
 from apps.stock.models import (
+    AsientoStock,
     MovimientoStock,
     MovimientoStockDetalle,
+    PlanReposicion,
     StockDivisaCasa,
     StockDivisaTauser
 )
-from apps.divisas.models import Denominacion, Divisa
-from apps.tauser.models import Tauser
+from apps.stock.service import (
+    conciliar_stock,
+    generar_snapshots,
+    planificar_reposicion,
+    stock_a_fecha,
+)
 
 from apps.usuarios.models import User
-from apps.clientes.models import Cliente, CategoriaCliente
 from apps.operaciones.models import Transaccion
 
-@pytest.fixture
-def setup_data(db):
-    # Crear objetos base
-    user = User.objects.create_user(username="test", password="test")
-    categoria = CategoriaCliente.objects.create(nombre="Test")
-    cliente = Cliente.objects.create(
-        nombre="Cliente Test",
-        cedula="1234567",
-        correo="cliente@test.com",
-        telefono="0981000000",
-        direccion="Av. Principal 123",
-        is_active=True,
-        id_categoria=categoria
-    )
-    
-    tauser = Tauser.objects.create(
-        codigo="CASA",
-        nombre="Casa Central",
-        direccion="Av. Principal 123",
-        ciudad="Asunción",
-        departamento="Central",
-        latitud=Decimal("-25.2637"),
-        longitud=Decimal("-57.5759"),
-    )
-
-    divisa = Divisa.objects.create(
-        codigo="USD",
-        nombre="Dólar estadounidense",
-        simbolo="$",
-        is_active=True,
-        max_digitos=30,
-        precision=10,
-        es_base=False
-    )
-
-    # Crear denominaciones de USD
-    denom_100 = Denominacion.objects.create(denominacion=100, divisa=divisa)
-    denom_50 = Denominacion.objects.create(denominacion=50, divisa=divisa)
-    denom_20 = Denominacion.objects.create(denominacion=20, divisa=divisa)
-
-    # Crear tipos de movimiento
-    ent_clt = TipoMovimiento.ENTCLT
-    ent_cs = TipoMovimiento.ENTCS
-    sal_clt = TipoMovimiento.SALCLT
-    sal_cs = TipoMovimiento.SALCS
-
-    estado_inicial = EstadoMovimiento.EN_PROCESO
-
-    # Crear stock inicial
-    StockDivisaCasa.objects.create(denominacion=denom_100, stock=50)
-    StockDivisaCasa.objects.create(denominacion=denom_50, stock=50)
-    StockDivisaCasa.objects.create(denominacion=denom_20, stock=50)
-
-    StockDivisaTauser.objects.create(tauser=tauser, denominacion=denom_100, stock=10)
-    StockDivisaTauser.objects.create(tauser=tauser, denominacion=denom_50, stock=10)
-    StockDivisaTauser.objects.create(tauser=tauser, denominacion=denom_20, stock=10)
-
-    return {
-        "tauser": tauser,
-        "denominaciones": [denom_100, denom_50, denom_20],
-        "tipos": {"ENTCLT": ent_clt, "ENTCS": ent_cs, "SALCLT": sal_clt, "SALCS": sal_cs},
-        "estado": estado_inicial,
-        "divisa": divisa,
-        "user": user,
-        "cliente": cliente
-    }
-
-
 def crear_transaccion(user, cliente, divisa, tauser, monto):
     return Transaccion.objects.create(
         id_user=user,
@@ -237,3 +174,244 @@ def test_create_movimiento_salcs(db, setup_data):
 
 
 
+
+def test_cancelar_movimiento_restaura_stock(db, setup_data):
+    tauser = setup_data["tauser"]
+    denom_100, denom_50, denom_20 = setup_data["denominaciones"]
+    divisa = setup_data["divisa"]
+
+    data = {
+        "tipo_movimiento": setup_data["tipos"]["SALCS"],
+        "tauser": tauser.id,
+        "divisa": divisa.id,
+        "estado": setup_data["estado"],
+        "detalles": [
+            {"denominacion": denom_100.id, "cantidad": 3},
+            {"denominacion": denom_20.id, "cantidad": 2},
+        ],
+    }
+    serializer = MovimientoStockSerializer(data=data)
+    assert serializer.is_valid(), serializer.errors
+    movimiento = serializer.save()
+
+    movimiento.estado = EstadoMovimiento.CANCELADO
+    movimiento.save()
+
+    esperado = {denom_100.id: 10, denom_50.id: 10, denom_20.id: 10}
+    for stock in StockDivisaTauser.objects.filter(tauser=tauser):
+        assert stock.stock == esperado[stock.denominacion_id]
+
+
+def test_resumen_stock_agregado_en_sql(db, setup_data):
+    from rest_framework.test import APIClient
+
+    tauser = setup_data["tauser"]
+    divisa = setup_data["divisa"]
+    client = APIClient()
+    client.force_authenticate(User.objects.create_superuser(username="admin", password="admin"))
+
+    response = client.get("/api/movimiento-stock/resumen/", {"tauser": tauser.id})
+    assert response.status_code == 200
+    assert response.data["tauser"]["totales"] == [{
+        "divisa_id": divisa.id,
+        "divisa_codigo": "USD",
+        "divisa_nombre": divisa.nombre,
+        "monto": "1700",
+    }]
+    assert len(response.data["tauser"]["detalle"]) == 3
+    assert response.data["casa"]["totales"][0]["monto"] == "8500"
+
+    response = client.get("/api/movimiento-stock/resumen/",
+                          {"tauser": tauser.id, "detalle": "false"})
+    assert "detalle" not in response.data["tauser"]
+
+    response = client.get("/api/movimiento-stock/resumen-red/", {"detalle": "true"})
+    assert response.status_code == 200
+    assert response.data["tausers"][0]["tauser_id"] == tauser.id
+    assert response.data["tausers"][0]["totales"][0]["monto"] == "1700"
+    assert len(response.data["tausers"][0]["detalle"]) == 3
+    assert response.data["totales"][0]["monto"] == "10200"
+
+
+def test_planificar_reposicion(db, setup_data):
+    from datetime import timedelta
+    from django.utils import timezone
+
+    tauser = setup_data["tauser"]
+    divisa = setup_data["divisa"]
+    denom_100, denom_50, denom_20 = setup_data["denominaciones"]
+
+    ahora = timezone.now()
+    for dias_atras in range(1, 6):
+        salida = MovimientoStock.objects.create(
+            tipo_movimiento=TipoMovimiento.SALCLT, tauser=tauser, divisa=divisa,
+            monto=600, estado=EstadoMovimiento.FINALIZADO)
+        MovimientoStockDetalle.objects.create(
+            movimiento_stock=salida, denominacion=denom_100, cantidad=6)
+        MovimientoStock.objects.filter(id=salida.id).update(
+            fecha=ahora - timedelta(days=dias_atras))
+
+    deposito = MovimientoStock.objects.create(
+        tipo_movimiento=TipoMovimiento.ENTCLT, tauser=tauser, divisa=divisa,
+        monto=200, estado=EstadoMovimiento.FINALIZADO)
+    MovimientoStockDetalle.objects.create(
+        movimiento_stock=deposito, denominacion=denom_20, cantidad=10)
+    MovimientoStock.objects.filter(id=deposito.id).update(fecha=ahora - timedelta(days=2))
+
+    planes = {p.denominacion_id: p for p in planificar_reposicion(ahora)}
+
+    assert set(planes) == {denom_100.id, denom_20.id}
+    reposicion = planes[denom_100.id]
+    assert reposicion.tipo_movimiento == TipoMovimiento.ENTCS
+    assert reposicion.cantidad == reposicion.stock_objetivo - 10
+    assert planes[denom_20.id].tipo_movimiento == TipoMovimiento.SALCS
+    assert planes[denom_20.id].cantidad == 10
+
+    planificar_reposicion(ahora)
+    assert PlanReposicion.objects.count() == 2
+
+
+def test_libro_stock_reconstruye_stock_a_fecha(db, setup_data):
+    from datetime import timedelta
+    from django.utils import timezone
+
+    tauser = setup_data["tauser"]
+    denom_100, denom_50, denom_20 = setup_data["denominaciones"]
+    conciliar_stock(ajustar=True)
+
+    data = {
+        "tipo_movimiento": setup_data["tipos"]["SALCS"],
+        "tauser": tauser.id,
+        "divisa": setup_data["divisa"].id,
+        "estado": setup_data["estado"],
+        "detalles": [{"denominacion": denom_50.id, "cantidad": 4}],
+    }
+    serializer = MovimientoStockSerializer(data=data)
+    assert serializer.is_valid(), serializer.errors
+    movimiento = serializer.save()
+
+    assert AsientoStock.objects.filter(movimiento_stock=movimiento).count() == 2
+    assert stock_a_fecha(tauser.id)[denom_50.id] == 6
+    assert stock_a_fecha(None)[denom_50.id] == 54
+
+    assert generar_snapshots(margen=timedelta(0)) == 2
+    movimiento.estado = EstadoMovimiento.CANCELADO
+    movimiento.save()
+
+    actual = stock_a_fecha(tauser.id)
+    assert actual == {denom_100.id: 10, denom_50.id: 10, denom_20.id: 10}
+    assert stock_a_fecha(tauser.id, timezone.now() - timedelta(days=1)) == {}
+    assert conciliar_stock() == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_reservas_concurrentes_sin_deadlock(setup_data):
+    """
+    Lanza reservas SALCLT en paralelo sobre el mismo tauser junto con
+    transferencias ENTCS/SALCS que comparten el stock de la casa.
+    Ninguna debe quedar en deadlock ni sobrevender el stock. La medición de
+    throughput y espera está en el comando benchmark_reservas_stock.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import connection
+    from rest_framework.exceptions import ValidationError
+
+    tauser = setup_data["tauser"]
+    divisa = setup_data["divisa"]
+    denom_100, denom_50, denom_20 = setup_data["denominaciones"]
+    conciliar_stock(ajustar=True)
+
+    # Sin señales: la reserva se dispara explícitamente desde los hilos
+    transacciones = Transaccion.objects.bulk_create([
+        Transaccion(
+            id_user=setup_data["user"],
+            cliente=setup_data["cliente"],
+            operacion='venta',
+            tasa_aplicada=Decimal('1.0'),
+            tasa_inicial=Decimal('1.0'),
+            divisa_origen=divisa,
+            divisa_destino=divisa,
+            monto_origen=Decimal('170.00'),
+            monto_destino=Decimal('170.00'),
+            tauser=tauser,
+            estado='pendiente',
+        )
+        for _ in range(16)
+    ])
+
+    def reservar(transaccion):
+        try:
+            serializer = MovimientoStockSerializer(data={
+                "tipo_movimiento": TipoMovimiento.SALCLT,
+                "tauser": tauser.id,
+                "transaccion": transaccion.id,
+                "divisa": divisa.id,
+            })
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return True
+        except ValidationError:
+            return False
+        finally:
+            connection.close()
+
+    def transferir(indice):
+        try:
+            tipo = TipoMovimiento.ENTCS if indice % 2 else TipoMovimiento.SALCS
+            serializer = MovimientoStockSerializer(data={
+                "tipo_movimiento": tipo,
+                "tauser": tauser.id,
+                "divisa": divisa.id,
+                "detalles": [
+                    {"denominacion": denom_20.id, "cantidad": 1},
+                    {"denominacion": denom_100.id, "cantidad": 1},
+                ],
+            })
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return True
+        except ValidationError:
+            return False
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futuros_reservas = [executor.submit(reservar, t) for t in transacciones]
+        futuros_transferencias = [executor.submit(transferir, i) for i in range(8)]
+        futuros = futuros_reservas + futuros_transferencias
+        # Un deadlock o bloqueo no resuelto deja el hilo colgado o con OperationalError
+        errores = [f.exception(timeout=60) for f in futuros]
+    assert [e for e in errores if e is not None] == []
+
+    # Cada reserva terminó: creó su movimiento o fue rechazada por falta de stock
+    reservas = [f.result() for f in futuros_reservas]
+    transferencias = [f.result() for f in futuros_transferencias]
+    assert len(reservas) == len(transacciones)
+    assert all(isinstance(r, bool) for r in reservas + transferencias)
+
+    assert any(reservas)
+    assert MovimientoStock.objects.filter(
+        tipo_movimiento=TipoMovimiento.SALCLT).count() == sum(reservas)
+    for stock in StockDivisaTauser.objects.filter(tauser=tauser):
+        assert stock.stock >= 0
+    assert conciliar_stock() == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_medir_reservas_concurrentes():
+    from apps.stock.management.commands.benchmark_reservas_stock import (
+        medir_reservas,
+        preparar_reservas,
+    )
+
+    tauser, divisa, transacciones = preparar_reservas(12)
+    resultado = medir_reservas(tauser, divisa, transacciones, hilos=4)
+
+    assert resultado.errores == []
+    assert resultado.completadas == 12
+    assert resultado.rechazadas == 0
+    assert len(resultado.esperas) == 12
+    assert resultado.por_segundo > 0
+    assert 0 < resultado.p50 <= resultado.p95 <= max(resultado.esperas)
+    assert set(StockDivisaTauser.objects.filter(
+        tauser=tauser).values_list('stock', flat=True)) == {0}
@@ -1,6 +1,6 @@
 /**
  * Transacciones Report View Component
- * Shows transactions within a 30-day period with filters
+ * Shows transactions page by page (cursor pagination) with filters
  */
 
 import { useState, useEffect } from 'react';
@@ -28,7 +28,9 @@ export const TransaccionesReportView = ({ divisas, metodos }: Props) => {
 
   const [filtros, setFiltros] = useState<FiltrosTransaccionesReport>(getDefaultDates());
   const [data, setData] = useState<GananciaTransaccion[]>([]);
+  const [cursor, setCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
@@ -43,12 +45,6 @@ export const TransaccionesReportView = ({ divisas, metodos }: Props) => {
           const fin = new Date(filtros.fecha_fin);
           const diffDays = Math.ceil((fin.getTime() - inicio.getTime()) / (1000 * 60 * 60 * 24));
           
-          if (diffDays > 30) {
-            setError('El rango de fechas no puede exceder 30 días');
-            setLoading(false);
-            return;
-          }
-          
           if (diffDays < 0) {
             setError('La fecha de inicio debe ser anterior a la fecha de fin');
             setLoading(false);
@@ -57,7 +53,8 @@ export const TransaccionesReportView = ({ divisas, metodos }: Props) => {
         }
         
         const result = await getListadoTransacciones(filtros);
-        setData(result);
+        setData(result.results);
+        setCursor(result.cursor);
       } catch (err: any) {
         console.error('Error fetching transacciones report:', err);
         setError(err.response?.data?.error || 'Error al cargar las transacciones');
@@ -69,6 +66,21 @@ export const TransaccionesReportView = ({ divisas, metodos }: Props) => {
     fetchData();
   }, [JSON.stringify(filtros)]);
 
+  const handleLoadMore = async () => {
+    if (!cursor) return;
+    try {
+      setLoadingMore(true);
+      const result = await getListadoTransacciones(filtros, cursor);
+      setData((prev) => [...prev, ...result.results]);
+      setCursor(result.cursor);
+    } catch (err: any) {
+      console.error('Error fetching transacciones report:', err);
+      setError(err.response?.data?.error || 'Error al cargar las transacciones');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleFilterChange = (key: keyof FiltrosTransaccionesReport, value: any) => {
     setFiltros((prev) => ({
       ...prev,
@@ -103,7 +115,6 @@ export const TransaccionesReportView = ({ divisas, metodos }: Props) => {
           <div className="lg:col-span-2">
             <label className="block text-sm font-medium text-gray-700 mb-1">
               Rango de Fechas <span className="text-red-500">*</span>
-              <span className="text-xs text-gray-500 ml-2">(Máximo 30 días)</span>
             </label>
             <div className="flex space-x-2">
               <input
@@ -201,7 +212,8 @@ export const TransaccionesReportView = ({ divisas, metodos }: Props) => {
           </h3>
           {!loading && !error && (
             <span className="text-sm text-gray-600">
-              {data.length} {data.length === 1 ? 'transacción' : 'transacciones'} encontradas
+              {data.length} {data.length === 1 ? 'transacción' : 'transacciones'}
+              {cursor ? ' cargadas' : ' encontradas'}
             </span>
           )}
         </div>
@@ -291,6 +303,17 @@ export const TransaccionesReportView = ({ divisas, metodos }: Props) => {
                 ))}
               </tbody>
             </table>
+            {cursor && (
+              <div className="flex justify-center mt-4">
+                <button
+                  onClick={handleLoadMore}
+                  disabled={loadingMore}
+                  className="px-4 py-2 bg-gray-900 text-white rounded-lg hover:bg-gray-800 transition-colors disabled:opacity-50"
+                >
+                  {loadingMore ? 'Cargando...' : 'Cargar más'}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
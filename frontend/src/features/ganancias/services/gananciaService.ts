@@ -12,7 +12,7 @@ import type {
   GananciaPorDivisa,
   GananciaPorMetodo,
   GananciaEvolucionTemporal,
-  GananciaTransaccion,
+  GananciaTransaccionesPage,
   EstadisticasGenerales,
   ComparativaOperaciones,
   GananciaFiltros,
@@ -158,20 +158,23 @@ export const getEvolucionTemporal = async (
 
 /**
  * GET /api/ganancias/listado_transacciones/
- * Listado de transacciones en un periodo de hasta 30 días
+ * Listado de transacciones paginado por cursor
  * 
- * Si no se especifican fechas, usa los últimos 30 días por defecto.
- * El rango no puede exceder 30 días.
+ * Para obtener la página siguiente se envía el `cursor` de la respuesta anterior.
  * 
  * Parámetros permitidos: divisa_extranjera, operacion, metodo_financiero, fecha_inicio, fecha_fin
  */
 export const getListadoTransacciones = async (
-  filtros: GananciaFiltros = {}
-): Promise<GananciaTransaccion[]> => {
+  filtros: GananciaFiltros = {},
+  cursor?: string | null
+): Promise<GananciaTransaccionesPage> => {
   const allowedParams = ['divisa_extranjera', 'operacion', 'metodo_financiero', 'fecha_inicio', 'fecha_fin'];
   const params = buildQueryParams(filtros, allowedParams);
+  if (cursor) {
+    params.append('cursor', cursor);
+  }
   
-  const response = await axios.get<GananciaTransaccion[]>(
+  const response = await axios.get<GananciaTransaccionesPage>(
     `${BASE_URL}/listado_transacciones/?${params.toString()}`
   );
   
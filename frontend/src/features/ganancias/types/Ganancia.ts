@@ -74,6 +74,12 @@ export interface GananciaTransaccion {
   metodo_nombre: string | null;
 }
 
+export interface GananciaTransaccionesPage {
+  next: string | null;
+  cursor: string | null;
+  results: GananciaTransaccion[];
+}
+
 export interface EstadisticasGenerales {
   total_ganancia: string;
   total_operaciones: number;